@@ -11,6 +11,15 @@ import os
 
 from django.core.asgi import get_asgi_application
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'catalog_app.settings')
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'catalog_app.settings.production')
+# Serve the anonymous product reads with the native async views (see catalog_app.asgi_urls).
+os.environ.setdefault('CATALOG_ASYNC_READS', '1')
+# Persistent connections are not reused across the threads that serve async requests; use DB_POOL=1 instead.
+os.environ.setdefault('DB_CONN_MAX_AGE', '0')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from products.events import CancelOnDisconnectMiddleware  # noqa: E402  (needs the app registry)
+
+# End the product event streams as soon as their client disconnects.
+application = CancelOnDisconnectMiddleware(django_application, ['/api/v1/products/events/'])
@@ -0,0 +1,15 @@
+"""
+URL configuration used under ASGI: the same routes as ``catalog_app.urls``, with the product
+list and detail reads served by the native async handlers in ``products.async_views``, plus
+the product event stream, which needs a long-lived async connection.
+"""
+from django.urls import path
+
+from products.async_views import product_events, with_async_reads
+
+from catalog_app.urls import urlpatterns as sync_urlpatterns
+
+urlpatterns = [
+    path('api/v1/products/events/', product_events, name='product_events'),
+    *with_async_reads(sync_urlpatterns),
+]
@@ -0,0 +1,95 @@
+"""
+PostgreSQL backend that borrows connections from a psycopg 3 connection pool.
+
+Enable it with ``'ENGINE': 'catalog_app.db.postgresql_pool'`` and an ``OPTIONS['pool']`` dict
+of ``psycopg_pool.ConnectionPool`` arguments (``min_size``, ``max_size``, ``timeout``, ...).
+Without ``OPTIONS['pool']`` it behaves like ``django.db.backends.postgresql``.
+
+Closing a connection, which Django does at the end of every request with ``CONN_MAX_AGE = 0``,
+returns it to the pool instead of disconnecting, so requests reuse a bounded set of server
+connections the way an external pgbouncer would. Pools are per process and per database;
+with ``CONN_HEALTH_CHECKS`` the pool checks a connection before handing it out.
+
+Requires ``psycopg[pool]`` 3.2 or newer.
+"""
+import threading
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.postgresql import base
+from django.db.backends.postgresql.psycopg_any import IsolationLevel, is_psycopg3
+from django.db.utils import NO_DB_ALIAS
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    _pools = {}
+    _pools_lock = threading.Lock()
+
+    @property
+    def pool(self):
+        """
+        Returns the pool of this database, creating it on first use, or None when pooling is off.
+        """
+        options = self.settings_dict['OPTIONS'].get('pool')
+        if not options or self.alias == NO_DB_ALIAS:
+            return None
+        # the test runner renames the database, so pools are keyed by name too
+        key = (self.alias, self.settings_dict['NAME'])
+        with self._pools_lock:
+            pool = self._pools.get(key)
+            if pool is None:
+                pool = self._pools[key] = self.create_pool({} if options is True else options)
+        return pool
+
+    def create_pool(self, options):
+        if not is_psycopg3:
+            raise ImproperlyConfigured('Connection pooling requires psycopg 3.')
+        if self.settings_dict['CONN_MAX_AGE']:
+            raise ImproperlyConfigured('Set CONN_MAX_AGE to 0 when pooling: closed connections go back to the pool.')
+        try:
+            from psycopg_pool import ConnectionPool
+        except ImportError as error:
+            raise ImproperlyConfigured('Error loading psycopg_pool; install psycopg[pool].') from error
+        check = ConnectionPool.check_connection if self.settings_dict['CONN_HEALTH_CHECKS'] else None
+        pool = ConnectionPool(kwargs=self.get_connection_params(), check=check, open=False, **options)
+        pool.open(wait=False)
+        return pool
+
+    @classmethod
+    def close_pools(cls):
+        """
+        Closes every pool of this process, e.g. at worker shutdown.
+        """
+        with cls._pools_lock:
+            pools, cls._pools = list(cls._pools.values()), {}
+        for pool in pools:
+            pool.close()
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        params.pop('pool', None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        pool = self.pool
+        if pool is None:
+            return super().get_new_connection(conn_params)
+        options = self.settings_dict['OPTIONS']
+        try:
+            self.isolation_level = IsolationLevel(options.get('isolation_level', IsolationLevel.READ_COMMITTED))
+        except ValueError:
+            raise ImproperlyConfigured(
+                f"Invalid transaction isolation level {options['isolation_level']} specified. "
+                f"Use one of the psycopg.IsolationLevel values.")
+        connection = pool.getconn()
+        if 'isolation_level' in options:
+            connection.isolation_level = self.isolation_level
+        connection.cursor_factory = (
+            base.ServerBindingCursor if options.get('server_side_binding') is True else base.Cursor)
+        return connection
+
+    def _close(self):
+        if self.connection is None or self.pool is None:
+            return super()._close()
+        with self.wrap_database_errors:
+            # the pool that handed the connection out, even if the database was renamed since
+            self.connection._pool.putconn(self.connection)
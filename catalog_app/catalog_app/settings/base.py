@@ -39,11 +39,14 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'rest_framework',
+    'rest_framework.authtoken',
     'drf_yasg',
     'products'
 ]
 
 MIDDLEWARE = [
+    'products.middleware.PerformanceMiddleware',
+    'products.middleware.ReplicaPinMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -53,7 +56,8 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
-ROOT_URLCONF = 'catalog_app.urls'
+# asgi.py switches to the URLs served by the native async read views.
+ROOT_URLCONF = 'catalog_app.asgi_urls' if os.environ.get('CATALOG_ASYNC_READS') == '1' else 'catalog_app.urls'
 
 TEMPLATES = [
     {
@@ -118,10 +122,117 @@ AUTH_USER_MODEL = 'auth.User'
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.SessionAuthentication',
-        'rest_framework.authentication.TokenAuthentication',
+        'products.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.DjangoModelPermissionsOrAnonReadOnly',
         'rest_framework.permissions.IsAuthenticated',
     ],
-}
\ No newline at end of file
+    # Token buckets per client, see THROTTLING below; view_count limits the anonymous views counted per IP.
+    'DEFAULT_THROTTLE_CLASSES': [
+        'products.throttling.AnonReadThrottle',
+        'products.throttling.UserReadThrottle',
+        'products.throttling.WriteThrottle',
+    ],
+    'DEFAULT_THROTTLE_RATES': {
+        'anon_read': os.environ.get('THROTTLE_ANON_READ', '120/min'),
+        'user_read': os.environ.get('THROTTLE_USER_READ', '1200/min'),
+        'write': os.environ.get('THROTTLE_WRITE', '120/min'),
+        'view_count': os.environ.get('THROTTLE_VIEW_COUNT', '30/min'),
+    },
+    # Clients are told apart by REMOTE_ADDR; set to the number of proxies in front of the app to use X-Forwarded-For.
+    'NUM_PROXIES': int(os.environ.get('NUM_PROXIES', 0)),
+}
+
+# Throttle buckets live in process memory (LocalBucketStore) or, with CacheBucketStore, in CACHES[CACHE_ALIAS].
+THROTTLING = {
+    'ENABLED': True,
+    'BACKEND': os.environ.get('THROTTLE_BACKEND', 'products.throttling.LocalBucketStore'),
+    'MAX_BUCKETS': 100000,
+    'CACHE_ALIAS': 'default',
+}
+
+# Reads of the product and brand views go to REPLICA_ROUTING['REPLICAS'] ({alias: weight}, set from DB_REPLICAS
+# by the settings modules); a client that wrote reads from the primary for PIN_SECONDS.
+DATABASE_ROUTERS = ['products.routers.ReplicaRouter']
+REPLICA_ROUTING = {
+    'REPLICAS': {},
+    'PIN_SECONDS': int(os.environ.get('REPLICA_PIN_SECONDS', 5)),
+    'PIN_COOKIE': 'catalog_primary',
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Serialized product payloads; locmem evicts least recently used entries beyond MAX_ENTRIES.
+    'products': {
+        'BACKEND': os.environ.get('PRODUCT_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('PRODUCT_CACHE_LOCATION', 'products'),
+        'TIMEOUT': int(os.environ.get('PRODUCT_CACHE_TIMEOUT', 300)),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.environ.get('PRODUCT_CACHE_MAX_ENTRIES', 10000)),
+        },
+    },
+    # Authenticated tokens; set a backend shared by the workers (e.g. redis or memcached) to cache them.
+    'tokens': {
+        'BACKEND': os.environ.get('TOKEN_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('TOKEN_CACHE_LOCATION', 'tokens'),
+    },
+}
+
+# Token authentication results (token, user and permission set) cached in CACHES[CACHE] for TIMEOUT seconds.
+# Only a cache shared by the workers is used: with the default locmem backend tokens are read on every request.
+TOKEN_AUTH_CACHE = {
+    'CACHE': 'tokens',
+    'TIMEOUT': int(os.environ.get('TOKEN_AUTH_CACHE_TIMEOUT', 60)),
+}
+
+# Anonymous product views are buffered and written to products.Query in batches.
+VIEW_COUNTER = {
+    'BACKEND': 'products.counters.LocalViewCounter',
+    'FLUSH_INTERVAL': int(os.environ.get('VIEW_COUNTER_FLUSH_INTERVAL', 5)),
+    'FLUSH_SIZE': int(os.environ.get('VIEW_COUNTER_FLUSH_SIZE', 1000)),
+}
+
+# Per-route request metrics, served at /api/v1/metrics/. Server-Timing and slow query logging are for development.
+PERFORMANCE_METRICS = {
+    'SERVER_TIMING': False,
+    'SLOW_QUERY_MS': int(os.environ.get('SLOW_QUERY_MS', 200)),
+    'SLOW_QUERY_SAMPLE_RATE': 0.0,
+}
+
+# Anonymous product queries are appended to minute buckets and rolled up by `manage.py compact_query_buckets`.
+QUERY_ANALYTICS = {
+    'GRACE': 120,
+    'MINUTE_RETENTION': int(os.environ.get('QUERY_ANALYTICS_MINUTE_RETENTION', 2 * 24 * 3600)),
+    'HOUR_RETENTION': int(os.environ.get('QUERY_ANALYTICS_HOUR_RETENTION', 90 * 24 * 3600)),
+}
+
+# Product and brand changes served at /api/v1/changes/; `manage.py compact_changes` drops superseded entries
+# and tombstones older than TOMBSTONE_RETENTION seconds.
+CHANGE_FEED = {
+    'BATCH_SIZE': 500,
+    'MAX_BATCH_SIZE': 5000,
+    'TOMBSTONE_RETENTION': int(os.environ.get('CHANGE_FEED_TOMBSTONE_RETENTION', 30 * 24 * 3600)),
+}
+
+# Admin-only Server-Sent Events stream of product changes at /api/v1/products/events/ (ASGI only). With
+# several workers, set EVENT_BROKER=products.events.SocketBroker and run `manage.py run_event_broker`.
+EVENT_STREAM = {
+    'QUEUE_SIZE': int(os.environ.get('EVENT_STREAM_QUEUE_SIZE', 100)),
+    'HEARTBEAT': int(os.environ.get('EVENT_STREAM_HEARTBEAT', 15)),
+    'BROKER': os.environ.get('EVENT_BROKER', 'products.events.LocalBroker'),
+    'BROKER_HOST': os.environ.get('EVENT_BROKER_HOST', '127.0.0.1'),
+    'BROKER_PORT': int(os.environ.get('EVENT_BROKER_PORT', 8765)),
+}
+
+# Product change notifications are written to an outbox and emailed by `manage.py send_notifications`.
+NOTIFICATIONS = {
+    'WINDOW': int(os.environ.get('NOTIFICATIONS_WINDOW', 60)),
+    'BATCH_SIZE': 50,
+    'WORKERS': 4,
+    'MAX_ATTEMPTS': 5,
+    'BACKOFF_BASE': 30,
+    'BACKOFF_MAX': 3600,
+}
@@ -0,0 +1,96 @@
+"""
+``DATABASES`` profiles configured from the environment.
+
+Connections are persistent by default: a connection is kept for ``DB_CONN_MAX_AGE`` seconds
+(60) and checked with a cheap query before a new request reuses it (``DB_CONN_HEALTH_CHECKS``).
+With ``DB_POOL=1``, PostgreSQL connections are borrowed from a psycopg 3 pool of
+``DB_POOL_MIN_SIZE`` to ``DB_POOL_MAX_SIZE`` connections instead and given back after every
+request; clients wait up to ``DB_POOL_TIMEOUT`` seconds for a free one.
+
+``DB_REPLICAS`` adds read replicas of the primary for ``products.routers.ReplicaRouter``.
+"""
+import os
+
+
+def env_flag(name, default):
+    return os.environ.get(name, '1' if default else '0').lower() in ('1', 'true', 'yes', 'on')
+
+
+def connection_settings():
+    """
+    Returns the connection lifetime settings shared by every profile.
+    """
+    return {
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': env_flag('DB_CONN_HEALTH_CHECKS', True),
+    }
+
+
+def sqlite_profile(name):
+    """
+    Returns a SQLite ``DATABASES`` entry for the database file ``name``.
+    """
+    return {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ.get('DB_NAME', name),
+        **connection_settings(),
+        'TEST': {
+            'NAME': 'testing_db',
+        },
+    }
+
+
+def postgresql_profile(name='postgres', user='postgres', password='', host='localhost', port=5432):
+    """
+    Returns a PostgreSQL ``DATABASES`` entry read from ``DB_NAME``, ``DB_USER``, ``DB_PASSWORD``,
+    ``DB_HOST`` and ``DB_PORT``, defaulting to the arguments.
+    """
+    profile = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.environ.get('DB_NAME', name),
+        'USER': os.environ.get('DB_USER', user),
+        'PASSWORD': os.environ.get('DB_PASSWORD', password),
+        'HOST': os.environ.get('DB_HOST', host),
+        'PORT': int(os.environ.get('DB_PORT', port)),
+        **connection_settings(),
+        'OPTIONS': {},
+        'TEST': {
+            'NAME': 'testing_db',
+        },
+    }
+    if env_flag('DB_POOL', False):
+        profile['ENGINE'] = 'catalog_app.db.postgresql_pool'
+        # pooled connections are given back after every request instead of being kept
+        profile['CONN_MAX_AGE'] = 0
+        profile['OPTIONS']['pool'] = {
+            'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 2)),
+            'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+            'timeout': float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+        }
+    return profile
+
+
+def replica_profiles(primary):
+    """
+    Returns the ``DATABASES`` entries of the read replicas listed in ``DB_REPLICAS`` and their weights.
+
+    ``DB_REPLICAS`` is a comma separated list of ``location=weight`` items, the weight defaulting
+    to 1. A location is a database file for SQLite and a ``host`` or ``host:port`` for
+    PostgreSQL; the rest of the settings are the primary's. Replicas are named ``replica_1``,
+    ``replica_2``, ... and mirror the primary in tests.
+    """
+    databases, weights = {}, {}
+    items = [item.strip() for item in os.environ.get('DB_REPLICAS', '').split(',') if item.strip()]
+    for number, item in enumerate(items, 1):
+        location, _, weight = item.partition('=')
+        profile = {**primary, 'TEST': {'MIRROR': 'default'}}
+        if primary['ENGINE'] == 'django.db.backends.sqlite3':
+            profile['NAME'] = location
+        else:
+            host, _, port = location.partition(':')
+            profile['HOST'] = host
+            profile['PORT'] = int(port) if port else primary['PORT']
+        alias = f'replica_{number}'
+        databases[alias] = profile
+        weights[alias] = int(weight) if weight else 1
+    return databases, weights
@@ -1,4 +1,5 @@
 from .base import *
+from .database import postgresql_profile, replica_profiles
 
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = False
@@ -8,21 +9,18 @@ ALLOWED_HOSTS = ['testserver', 'localhost', '0.0.0.0']
 
 
 # Database
-# https://docs.djangoproject.com/en/4.0/ref/settings/#databases
+# https://docs.djangoproject.com/en/4.2/ref/settings/#databases
+# See catalog_app/settings/database.py for the environment variables.
 
-# Database
-# https://docs.djangoproject.com/en/4.0/ref/settings/#databases
-
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.postgresql_psycopg2',
-        'NAME': 'postgres',
-        'USER': 'postgres',
-        'PASSWORD': 'postgres',
-        'HOST': 'localhost',
-        'PORT': 5432,
-        'TEST': {
-            'NAME': 'testing_db',
-        },
-    }
-}
\ No newline at end of file
+DATABASES = {'default': postgresql_profile(password='postgres')}
+
+# Read replicas for the product and brand reads, listed in DB_REPLICAS.
+replicas, replica_weights = replica_profiles(DATABASES['default'])
+DATABASES.update(replicas)
+REPLICA_ROUTING = {**REPLICA_ROUTING, 'REPLICAS': replica_weights}
+
+PERFORMANCE_METRICS = {
+    **PERFORMANCE_METRICS,
+    'SERVER_TIMING': True,
+    'SLOW_QUERY_SAMPLE_RATE': 1.0,
+}
@@ -1,4 +1,5 @@
 from .base import *
+from .database import postgresql_profile, replica_profiles, sqlite_profile
 
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = False
@@ -8,17 +9,15 @@ ALLOWED_HOSTS = []
 
 
 # Database
-# https://docs.djangoproject.com/en/4.0/ref/settings/#databases
+# https://docs.djangoproject.com/en/4.2/ref/settings/#databases
+# DB_ENGINE=postgresql selects PostgreSQL; see catalog_app/settings/database.py for the other variables.
 
-# Database
-# https://docs.djangoproject.com/en/4.0/ref/settings/#databases
+if os.environ.get('DB_ENGINE') == 'postgresql':
+    DATABASES = {'default': postgresql_profile()}
+else:
+    DATABASES = {'default': sqlite_profile(BASE_DIR / 'db.sqlite3')}
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-        'TEST': {
-            'NAME': 'testing_db',
-        },
-    }
-}
\ No newline at end of file
+# Read replicas for the product and brand reads, listed in DB_REPLICAS.
+replicas, replica_weights = replica_profiles(DATABASES['default'])
+DATABASES.update(replicas)
+REPLICA_ROUTING = {**REPLICA_ROUTING, 'REPLICAS': replica_weights}
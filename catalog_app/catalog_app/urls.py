@@ -22,7 +22,10 @@ from drf_yasg.views import get_schema_view
 from rest_framework import permissions
 
 from products.views import ProductListCreateAPIView, ProductRetrieveUpdateDestroyAPIView, BrandListCreateAPIView, \
-    BrandRetrieveUpdateDestroyAPIView, CustomUserRetrieveUpdateDestroyAPIView, CustomUserListCreateAPIView
+    BrandRetrieveUpdateDestroyAPIView, CustomUserRetrieveUpdateDestroyAPIView, CustomUserListCreateAPIView, \
+    ProductCacheStatsAPIView, ProductStockAdjustAPIView, ProductImportAPIView, ProductExportAPIView, \
+    QuerySeriesAPIView, QueryTopProductsAPIView, MetricsAPIView, ChangeFeedAPIView, ProductBatchAPIView, \
+    PriceAsOfAPIView, PriceChangesAPIView
 
 schema_view = get_schema_view(
     openapi.Info(
@@ -46,9 +49,20 @@ urlpatterns = [
     path('api/v1/users/', CustomUserListCreateAPIView.as_view(), name='user-list'),
     path('api/v1/users/<int:pk>/', CustomUserRetrieveUpdateDestroyAPIView.as_view(), name='user-detail'),
     path('api/v1/products/', ProductListCreateAPIView.as_view(), name='product_list_create'),
+    path('api/v1/products/batch/', ProductBatchAPIView.as_view(), name='product_batch'),
+    path('api/v1/products/export/', ProductExportAPIView.as_view(), name='product_export'),
+    path('api/v1/products/import/', ProductImportAPIView.as_view(), name='product_import'),
+    path('api/v1/products/stock/', ProductStockAdjustAPIView.as_view(), name='product_stock_adjust'),
     path('api/v1/products/<int:pk>/', ProductRetrieveUpdateDestroyAPIView.as_view(), name='product_retrieve_update_destroy'),
     path('api/v1/brands/', BrandListCreateAPIView.as_view(), name='brand_list_create'),
     path('api/v1/brands/<int:pk>/', BrandRetrieveUpdateDestroyAPIView.as_view(),
          name='brand_retrieve_update_destroy'),
+    path('api/v1/changes/', ChangeFeedAPIView.as_view(), name='change_feed'),
+    path('api/v1/prices/', PriceAsOfAPIView.as_view(), name='price_as_of'),
+    path('api/v1/prices/changes/', PriceChangesAPIView.as_view(), name='price_changes'),
+    path('api/v1/cache/stats/', ProductCacheStatsAPIView.as_view(), name='product_cache_stats'),
+    path('api/v1/metrics/', MetricsAPIView.as_view(), name='metrics'),
+    path('api/v1/analytics/top/', QueryTopProductsAPIView.as_view(), name='analytics_top'),
+    path('api/v1/analytics/series/', QuerySeriesAPIView.as_view(), name='analytics_series'),
 
 ]
\ No newline at end of file
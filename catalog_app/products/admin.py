@@ -1,7 +1,8 @@
 from django.contrib import admin
 
-from products.models import Product, Brand
+from products.models import Product, Brand, Notification
 
 # Register your models here.
 admin.site.register(Product)
 admin.site.register(Brand)
+admin.site.register(Notification)
@@ -0,0 +1,195 @@
+import operator
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+from functools import reduce
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q, Sum
+from django.db.models.functions import Trunc
+from django.utils import timezone
+
+from products.models import QueryBucket, QueryCompaction
+
+DEFAULT_QUERY_ANALYTICS = {
+    'GRACE': 120,
+    'MINUTE_RETENTION': 2 * 24 * 3600,
+    'HOUR_RETENTION': 90 * 24 * 3600,
+}
+
+# From the finest to the coarsest resolution.
+RESOLUTIONS = (QueryBucket.MINUTE, QueryBucket.HOUR, QueryBucket.DAY)
+BUCKET_SECONDS = {QueryBucket.MINUTE: 60, QueryBucket.HOUR: 3600, QueryBucket.DAY: 24 * 3600}
+
+
+def get_analytics_settings(**overrides):
+    """
+    Returns the ``QUERY_ANALYTICS`` setting merged over the defaults and the given overrides.
+    """
+    config = {**DEFAULT_QUERY_ANALYTICS, **getattr(settings, 'QUERY_ANALYTICS', {})}
+    config.update({key.upper(): value for key, value in overrides.items() if value is not None})
+    return config
+
+
+def floor_bucket(moment, resolution):
+    """
+    Returns the start of the UTC bucket of ``resolution`` containing ``moment``.
+    """
+    size = BUCKET_SECONDS[resolution]
+    return datetime.fromtimestamp(int(moment.timestamp()) // size * size, tz=dt_timezone.utc)
+
+
+def ceil_bucket(moment, resolution):
+    """
+    Returns the start of the first UTC bucket of ``resolution`` starting at or after ``moment``.
+    """
+    start = floor_bucket(moment, resolution)
+    return start if start == moment else start + timedelta(seconds=BUCKET_SECONDS[resolution])
+
+
+def record_views(increments, now=None):
+    """
+    Appends a minute bucket for every product of a ``{product_id: amount}`` dict.
+
+    Rows are only inserted, never updated, so concurrent flushes do not contend on them.
+    """
+    start = floor_bucket(now or timezone.now(), QueryBucket.MINUTE)
+    QueryBucket.objects.bulk_create([
+        QueryBucket(product_id=product_id, resolution=QueryBucket.MINUTE, start=start, count=amount)
+        for product_id, amount in increments.items() if amount
+    ])
+
+
+def get_watermarks():
+    """
+    Returns a ``{resolution: compacted_until}`` dict of the compacted resolutions.
+    """
+    return dict(QueryCompaction.objects.values_list('resolution', 'compacted_until'))
+
+
+def _lock_watermark(resolution, default):
+    try:
+        with transaction.atomic():
+            QueryCompaction.objects.get_or_create(resolution=resolution, defaults={'compacted_until': default})
+    except IntegrityError:
+        pass
+    return QueryCompaction.objects.select_for_update().get(resolution=resolution)
+
+
+def fold(source, target, until):
+    """
+    Sums the ``source`` buckets into one ``target`` bucket per product, from the ``target``
+    watermark up to ``until``, and moves the watermark to ``until``.
+
+    When ``source`` and ``target`` are the same resolution, the summed rows replace the
+    appended ones. Returns the number of ``target`` buckets written.
+    """
+    with transaction.atomic():
+        earliest = QueryBucket.objects.filter(resolution=source).order_by('start').values_list('start', flat=True).first()
+        compaction = _lock_watermark(target, floor_bucket(earliest, target) if earliest else until)
+        start = compaction.compacted_until
+        if start >= until:
+            return 0
+        source_rows = QueryBucket.objects.filter(resolution=source, start__gte=start, start__lt=until)
+        totals = list(
+            source_rows.values('product_id', bucket=Trunc('start', target, tzinfo=dt_timezone.utc))
+            .annotate(total=Sum('count')).order_by()
+        )
+        if source == target:
+            source_rows.delete()
+        QueryBucket.objects.bulk_create([
+            QueryBucket(product_id=row['product_id'], resolution=target, start=row['bucket'], count=row['total'])
+            for row in totals
+        ], batch_size=1000)
+        compaction.compacted_until = until
+        compaction.save(update_fields=['compacted_until'])
+    return len(totals)
+
+
+def compact_query_buckets(now=None, **overrides):
+    """
+    Folds appended minute rows into one row per product and minute, minutes into hours and
+    hours into days, then deletes fine rows that are older than their retention and covered
+    by a coarser rollup.
+
+    Buckets younger than ``GRACE`` seconds are left alone, so flushes still writing to them
+    are not missed. Returns the number of buckets written per resolution.
+    """
+    config = get_analytics_settings(**overrides)
+    now = now or timezone.now()
+    cutoff = now - timedelta(seconds=config['GRACE'])
+    written = {
+        QueryBucket.MINUTE: fold(QueryBucket.MINUTE, QueryBucket.MINUTE, floor_bucket(cutoff, QueryBucket.MINUTE)),
+        QueryBucket.HOUR: fold(QueryBucket.MINUTE, QueryBucket.HOUR, floor_bucket(cutoff, QueryBucket.HOUR)),
+    }
+    hours_until = get_watermarks()[QueryBucket.HOUR]
+    written[QueryBucket.DAY] = fold(QueryBucket.HOUR, QueryBucket.DAY, floor_bucket(hours_until, QueryBucket.DAY))
+
+    watermarks = get_watermarks()
+    minute_horizon = min(watermarks[QueryBucket.HOUR], now - timedelta(seconds=config['MINUTE_RETENTION']))
+    QueryBucket.objects.filter(resolution=QueryBucket.MINUTE, start__lt=minute_horizon).delete()
+    hour_horizon = min(watermarks[QueryBucket.DAY], now - timedelta(seconds=config['HOUR_RETENTION']))
+    QueryBucket.objects.filter(resolution=QueryBucket.HOUR, start__lt=hour_horizon).delete()
+    return written
+
+
+def plan_segments(start, end, watermarks, coarsest=QueryBucket.DAY):
+    """
+    Splits ``[start, end)`` into ``(resolution, start, end)`` segments, reading the coarsest
+    compacted buckets (up to ``coarsest``) that fit and minute buckets for the rest.
+    """
+    if start >= end:
+        return []
+    for resolution in reversed(RESOLUTIONS[1:RESOLUTIONS.index(coarsest) + 1]):
+        until = watermarks.get(resolution)
+        if until is None:
+            continue
+        low = ceil_bucket(start, resolution)
+        high = min(floor_bucket(end, resolution), until)
+        if low < high:
+            return (plan_segments(start, low, watermarks, coarsest) + [(resolution, low, high)]
+                    + plan_segments(high, end, watermarks, coarsest))
+    return [(QueryBucket.MINUTE, start, end)]
+
+
+def _segment_filter(segments):
+    return reduce(operator.or_, [
+        Q(resolution=resolution, start__gte=low, start__lt=high) for resolution, low, high in segments
+    ])
+
+
+def top_products(start, end, limit=10):
+    """
+    Returns the ``limit`` products with the most queries in ``[start, end)`` as
+    ``{'product': id, 'total': count}`` dicts, most queried first.
+    """
+    segments = plan_segments(start, end, get_watermarks())
+    if not segments:
+        return []
+    return list(
+        QueryBucket.objects.filter(_segment_filter(segments))
+        .values('product').annotate(total=Sum('count')).order_by('-total', 'product')[:limit]
+    )
+
+
+def query_series(start, end, resolution, product_id=None):
+    """
+    Returns ``(bucket_start, count)`` pairs for every bucket of ``resolution`` in ``[start, end)``,
+    for one product or for all of them, with zeros for buckets without queries.
+    """
+    start, end = floor_bucket(start, resolution), ceil_bucket(end, resolution)
+    segments = plan_segments(start, end, get_watermarks(), coarsest=resolution)
+    totals = defaultdict(int)
+    if segments:
+        queryset = QueryBucket.objects.filter(_segment_filter(segments))
+        if product_id is not None:
+            queryset = queryset.filter(product_id=product_id)
+        for row in queryset.values('start').annotate(total=Sum('count')).order_by():
+            totals[floor_bucket(row['start'], resolution)] += row['total']
+    step = timedelta(seconds=BUCKET_SECONDS[resolution])
+    points = []
+    moment = start
+    while moment < end:
+        points.append((moment, totals.get(moment, 0)))
+        moment += step
+    return points
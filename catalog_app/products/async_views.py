@@ -0,0 +1,312 @@
+import asyncio
+import logging
+import math
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import HttpResponse, StreamingHttpResponse
+from django.urls import path
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .authentication import CachedTokenAuthentication
+from .cache import product_cache
+from .changes import read_changes
+from .conditional import CONDITIONAL_HEADERS, detail_validators, page_etag, set_validator_headers
+from .counters import get_view_counter
+from .events import OVERFLOW, format_event, get_broker, get_event_settings, hub
+from .models import ChangeLog, Product
+from .renderers import FastJSONRenderer
+from .routers import replica_reads
+from .serializers import ProductSerializer
+from .throttling import AnonReadThrottle, UserReadThrottle, should_count_view
+from .views import ProductListCreateAPIView, ProductRetrieveUpdateDestroyAPIView
+
+logger = logging.getLogger(__name__)
+
+JSON_MEDIA_TYPES = ('', '*/*', 'application/json')
+
+_background_tasks = set()
+
+
+def run_with_fresh_connections(func, *args):
+    """
+    Runs ``func`` closing the thread's expired or broken database connections before and after it.
+
+    Django does this around every request; executor threads serve no requests, so without it
+    their connections would never be recycled, and a pooled connection would stay checked out.
+    """
+    close_old_connections()
+    try:
+        return func(*args)
+    finally:
+        close_old_connections()
+
+
+def fire_and_forget(func, *args):
+    """
+    Runs a blocking function in the default executor without waiting for it, logging its errors.
+    """
+    future = asyncio.get_running_loop().run_in_executor(None, run_with_fresh_connections, func, *args)
+    _background_tasks.add(future)
+
+    def done(task):
+        _background_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error('Background task %s failed.', func, exc_info=task.exception())
+
+    future.add_done_callback(done)
+
+
+def can_serve_async(request):
+    """
+    Returns True for plain JSON GET requests without conditional headers, which the async handlers serve.
+    """
+    if request.method != 'GET':
+        return False
+    if request.headers.get('Accept', '') not in JSON_MEDIA_TYPES:
+        return False
+    return not any(header in request.META for header in CONDITIONAL_HEADERS)
+
+
+def is_anonymous(request):
+    """
+    Returns True when the request carries no credentials, without touching the session or the database.
+    """
+    return 'HTTP_AUTHORIZATION' not in request.META and settings.SESSION_COOKIE_NAME not in request.COOKIES
+
+
+def render_json(data, allow, status=200):
+    response = HttpResponse(FastJSONRenderer().render(data), content_type='application/json', status=status)
+    response['Vary'] = 'Accept'
+    response['Allow'] = allow
+    return response
+
+
+def async_read_view(sync_view, handler):
+    """
+    Wraps a DRF view so the GET requests ``handler`` accepts are served natively async.
+
+    ``handler`` returns None for the requests it does not serve (writes, credentials or
+    parameters it does not support, errors); those go to the synchronous DRF view, so
+    responses stay identical whichever path serves them.
+    """
+    view_class = sync_view.cls
+    instance = view_class(**sync_view.initkwargs)
+    instance.setup(None)  # adds HEAD like the instances DRF creates per request
+    allow = ', '.join(instance.allowed_methods)
+    sync_view_async = sync_to_async(sync_view)
+
+    async def view(request, *args, **kwargs):
+        response = None
+        if can_serve_async(request):
+            with replica_reads(request):
+                response = await handler(request, allow, *args, **kwargs)
+        if response is None:
+            response = await sync_view_async(request, *args, **kwargs)
+        return response
+
+    view.cls = view_class
+    view.initkwargs = sync_view.initkwargs
+    view.csrf_exempt = True
+    return view
+
+
+async def product_detail(request, allow, pk):
+    """
+    Serves the product detail to anonymous users from the product cache or the async ORM.
+
+    The view is counted without waiting for the view counter. Throttled clients and missing
+    products are left to the DRF view, which answers 429 or 404; the throttle token is taken
+    only once the product is found, so the DRF view does not charge a request twice.
+    """
+    if not is_anonymous(request):
+        return None
+
+    async def load():
+        row = await Product.objects.values(*ProductSerializer.values_fields()).aget(pk=pk)
+        return (await ProductSerializer.arepresent_rows([row]))[0]
+
+    try:
+        payload = await product_cache.aget_or_set(pk, load)
+    except Product.DoesNotExist:
+        return None
+    if not AnonReadThrottle().allow_request(request, None):
+        return None
+    if should_count_view(request):
+        fire_and_forget(get_view_counter().increment, pk)
+
+    response = render_json(payload, allow)
+    view_class = ProductRetrieveUpdateDestroyAPIView
+    set_validator_headers(response, *detail_validators(
+        payload, 'json', view_class.etag_fields, view_class.last_modified_field))
+    return response
+
+
+def _page_number(value, num_pages):
+    if value == 'last':
+        return num_pages
+    try:
+        number = int(value)
+    except ValueError:
+        return None
+    return number if 1 <= number <= num_pages else None
+
+
+async def product_list(request, allow):
+    """
+    Serves plain page-number pages of the product list with the async ORM.
+
+    Listing requires a logged in user: the session user is resolved in one thread hop and
+    everything else runs on the event loop. Filters, search, ordering, cursor pagination and
+    token credentials are left to the DRF view.
+    """
+    if set(request.GET) - {'page', 'page_size'} or 'HTTP_AUTHORIZATION' in request.META:
+        return None
+    if settings.SESSION_COOKIE_NAME not in request.COOKIES:
+        return None
+    if not await sync_to_async(lambda: request.user.is_authenticated)():
+        return None
+
+    pagination = ProductListCreateAPIView.pagination_class
+    page_size = pagination.page_size
+    if request.GET.get('page_size', '').isdigit() and int(request.GET['page_size']) > 0:
+        page_size = min(int(request.GET['page_size']), pagination.max_page_size)
+
+    queryset = Product.objects.order_by('id').values(*ProductSerializer.values_fields())
+    count = await queryset.acount()
+    num_pages = max(1, math.ceil(count / page_size))
+    number = _page_number(request.GET.get('page', '1'), num_pages)
+    if number is None:
+        return None
+    # taken once the page is known to exist: the DRF view throttles the requests left to it
+    if not UserReadThrottle().allow_request(request, None):
+        return None
+    offset = (number - 1) * page_size
+    rows = [row async for row in queryset[offset:offset + page_size]]
+    results = await ProductSerializer.arepresent_rows(rows)
+
+    url = request.build_absolute_uri()
+    previous_link = None
+    if number > 1:
+        previous_link = remove_query_param(url, 'page') if number == 2 else replace_query_param(url, 'page', number - 1)
+    data = {
+        'count': count,
+        'next': replace_query_param(url, 'page', number + 1) if number < num_pages else None,
+        'previous': previous_link,
+        'results': results,
+    }
+    response = render_json(data, allow)
+    set_validator_headers(response, page_etag('json', count, results, ProductListCreateAPIView.etag_fields))
+    return response
+
+
+def get_stream_user(request):
+    """
+    Returns the user of a token or session, then closes the connection: a stream holds none while it waits.
+    """
+    try:
+        credentials = CachedTokenAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        credentials = None
+    user = credentials[0] if credentials else request.user
+    user.is_staff  # loads the session user while a connection is available
+    close_old_connections()
+    return user
+
+
+def replay_changes(after):
+    """
+    Returns the product changes following ``after`` as ``(seq, message)`` pairs, or None
+    when they do not fit in one change feed batch.
+    """
+    batch = read_changes(after)
+    close_old_connections()
+    if batch['has_more']:
+        return None
+    return [
+        (change['seq'], format_event({'seq': change['seq'], 'id': change['id'], 'action': change['action']}))
+        for change in batch['changes'] if change['type'] == ChangeLog.PRODUCT
+    ]
+
+
+def reset_message(after):
+    return f'event: reset\ndata: {{"after":{after}}}\n\n'.encode()
+
+
+async def product_events(request):
+    """
+    Streams product change events to admins as Server-Sent Events.
+
+    Every event has the change feed sequence number as id and ``{'seq', 'id', 'action'}``
+    as data. A client reconnecting with ``Last-Event-ID`` (or ``?after=``) first gets the
+    changes it missed. A ``reset`` event with the last delivered sequence number ends the
+    stream when the client fell too far behind; it should catch up from
+    ``/api/v1/changes/?after=`` and reconnect. Comments are sent as heartbeats.
+    """
+    user = await sync_to_async(get_stream_user)(request)
+    if not user.is_authenticated:
+        return render_json({'detail': 'Authentication credentials were not provided.'}, 'GET', status=401)
+    if not user.is_staff:
+        return render_json({'detail': 'You do not have permission to perform this action.'}, 'GET', status=403)
+
+    config = get_event_settings()
+    after = request.headers.get('Last-Event-ID') or request.GET.get('after') or ''
+    get_broker().start()
+
+    async def stream():
+        last = int(after) if after.isdigit() else 0
+        # subscribe before reading the backlog, so no change falls in between; both happen once the
+        # response streams, so a client that left before never holds a subscription
+        subscription = hub.subscribe(config['QUEUE_SIZE'])
+        try:
+            yield f"retry: {config['HEARTBEAT'] * 1000}\n\n".encode()
+            backlog = await sync_to_async(replay_changes)(last) if after.isdigit() else []
+            if backlog is None:
+                yield reset_message(last)
+                return
+            replayed = set()
+            for seq, message in backlog:
+                replayed.add(seq)
+                last = max(last, seq)
+                yield message
+            while True:
+                try:
+                    item = await asyncio.wait_for(subscription.queue.get(), config['HEARTBEAT'])
+                except asyncio.TimeoutError:
+                    yield b': heartbeat\n\n'
+                    continue
+                if item is OVERFLOW:
+                    yield reset_message(last)
+                    return
+                seq, message = item
+                if seq not in replayed:
+                    last = max(last, seq)
+                    yield message
+        finally:
+            hub.unsubscribe(subscription)
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+ASYNC_READ_HANDLERS = {
+    'product_list_create': product_list,
+    'product_retrieve_update_destroy': product_detail,
+}
+
+
+def with_async_reads(urlpatterns):
+    """
+    Returns ``urlpatterns`` with the product list and detail routes served by the async read path.
+    """
+    patterns = []
+    for pattern in urlpatterns:
+        handler = ASYNC_READ_HANDLERS.get(getattr(pattern, 'name', None))
+        if handler is not None:
+            pattern = path(str(pattern.pattern), async_read_view(pattern.callback, handler), name=pattern.name)
+        patterns.append(pattern)
+    return patterns
@@ -0,0 +1,118 @@
+import hashlib
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from products.routers import primary_reads
+
+DEFAULT_TOKEN_AUTH_CACHE = {
+    'CACHE': 'default',
+    'TIMEOUT': 60,
+}
+
+# Backends whose entries only one process sees: invalidating there leaves the other workers stale.
+PROCESS_LOCAL_CACHES = (LocMemCache, DummyCache)
+
+
+def get_token_cache_settings():
+    """
+    Returns the ``TOKEN_AUTH_CACHE`` setting merged over the defaults.
+    """
+    return {**DEFAULT_TOKEN_AUTH_CACHE, **getattr(settings, 'TOKEN_AUTH_CACHE', {})}
+
+
+def get_token_cache():
+    """
+    Returns the cache of ``TOKEN_AUTH_CACHE['CACHE']``, or None when it is process-local.
+    """
+    cache = caches[get_token_cache_settings()['CACHE']]
+    return None if isinstance(cache, PROCESS_LOCAL_CACHES) else cache
+
+
+def token_cache_key(key):
+    # hashed, so raw tokens are never visible in a shared cache
+    return f'auth:token:{hashlib.sha256(key.encode()).hexdigest()}'
+
+
+def get_permission_set(user):
+    """
+    Returns the ``app_label.codename`` permissions a user has directly or through its groups.
+
+    The permissions are read from the many-to-many tables: ``ModelBackend`` filters on the
+    ``user`` query name, which ``CustomUser`` also claims on ``Group`` and ``Permission``.
+    """
+    User = get_user_model()
+    fields = ('permission__content_type__app_label', 'permission__codename')
+    direct = User.user_permissions.through.objects.filter(**{User.user_permissions.field.m2m_field_name(): user})
+    groups = User.groups.through.objects.filter(**{User.groups.field.m2m_field_name(): user}).values('group_id')
+    through_groups = Group.permissions.through.objects.filter(group_id__in=groups)
+    return {f'{app_label}.{codename}' for app_label, codename in direct.values_list(*fields).union(
+        through_groups.values_list(*fields))}
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Token authentication that resolves tokens from the cache instead of the database.
+
+    The token is cached for ``TOKEN_AUTH_CACHE['TIMEOUT']`` seconds together with its user and
+    the user's permission set, stored where ``ModelBackend`` keeps it on the user instance, so
+    an authenticated request costs one cache lookup and its ``has_perm`` checks no query. Entries
+    are dropped when the token, the user, its groups or its permissions change (see
+    ``products.signals``); a change racing with a cache fill is picked up after the timeout.
+
+    Revocation must reach every worker, so tokens are only cached in a cache shared by the
+    workers: with a process-local backend (locmem, dummy) every request reads the token.
+    """
+
+    def authenticate_credentials(self, key):
+        cache = get_token_cache()
+        cache_key = token_cache_key(key)
+        token = cache.get(cache_key) if cache is not None else None
+        if token is None:
+            # cached entries are only dropped on writes, so they are filled from the primary
+            with primary_reads():
+                try:
+                    token = self.get_model().objects.select_related('user').get(key=key)
+                except self.get_model().DoesNotExist:
+                    raise exceptions.AuthenticationFailed(_('Invalid token.'))
+                if cache is not None:
+                    if not token.user.is_superuser:
+                        # superusers pass has_perm without looking at their permissions
+                        token.user._perm_cache = get_permission_set(token.user)
+                    cache.set(cache_key, token, get_token_cache_settings()['TIMEOUT'])
+
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+        return (token.user, token)
+
+
+def invalidate_tokens(*keys):
+    """
+    Drops the cached tokens with the given keys, now and again when the current transaction commits.
+    """
+    cache = get_token_cache()
+    if not keys or cache is None:
+        return
+    cache_keys = [token_cache_key(key) for key in keys]
+
+    def delete():
+        cache.delete_many(cache_keys)
+
+    delete()
+    transaction.on_commit(delete)
+
+
+def invalidate_user_tokens(user_ids):
+    """
+    Drops the cached tokens of the given users; ``user_ids`` may be a list or a ``values('pk')`` queryset.
+    """
+    invalidate_tokens(*Token.objects.filter(user_id__in=user_ids).values_list('key', flat=True))
@@ -0,0 +1,509 @@
+import asyncio
+import http.client
+import io
+import random
+import re
+import statistics
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+from urllib.parse import urlsplit
+
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.core.signals import request_finished, request_started
+from django.db import connection, connections
+from django.db.backends.signals import connection_created
+from django.db.models import Max, Min
+from django.urls import reverse
+from django.utils import timezone
+
+from products.brand_counts import repair_product_counts
+from products.models import Brand, Product
+from products.search import index_products, search_products
+
+
+def vocabulary(rng, size=5000):
+    """
+    Returns ``size`` pseudo-words, so generated names and descriptions have a realistic spread of terms.
+    """
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    return [''.join(rng.choice(letters) for _ in range(rng.randrange(4, 10))) for _ in range(size)]
+
+
+@contextmanager
+def benchmark_database(keepdb=False):
+    """
+    Runs the block against a throwaway copy of the default database, like the test runner.
+    """
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=keepdb)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=keepdb)
+
+
+@contextmanager
+def explicit_timestamps():
+    """
+    Lets bulk inserts set ``created_at``/``updated_at`` instead of the auto_now values.
+    """
+    fields = [Product._meta.get_field('created_at'), Product._meta.get_field('updated_at')]
+    saved = [(field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, (auto_now, auto_now_add) in zip(fields, saved):
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def seed_catalog(products=1000, brands=100, brands_per_product=2, batch_size=5000, seed=0):
+    """
+    Fills the catalog with generated brands and products using bulk inserts.
+
+    Products get random names, prices, stock levels (about 10% out of stock) and
+    ``updated_at`` values spread over the last year, plus ``brands_per_product`` brand links
+    counted in the brands' ``product_count``.
+    Returns the number of products in the catalog.
+    """
+    rng = random.Random(seed)
+    words = vocabulary(rng)
+    brand_ids = [brand.pk for brand in Brand.objects.bulk_create(
+        [Brand(name=f'Brand {i}') for i in range(brands)], batch_size=batch_size)]
+    Through = Product.brand.through
+    now = timezone.now()
+    with explicit_timestamps():
+        for start in range(0, products, batch_size):
+            batch = []
+            for i in range(start, min(start + batch_size, products)):
+                created_at = now - timedelta(seconds=rng.randrange(365 * 24 * 3600))
+                batch.append(Product(
+                    sku=0 if rng.random() < 0.1 else rng.randrange(1, 500),
+                    name=f'{rng.choice(words).title()} {rng.choice(words)} {i}',
+                    price=Decimal(rng.randrange(100, 100000)) / 100,
+                    description=' '.join(rng.choice(words) for _ in range(12)),
+                    created_at=created_at,
+                    updated_at=created_at + timedelta(seconds=rng.randrange(3600 * 24 * 30)),
+                ))
+            created = Product.objects.bulk_create(batch)
+            index_products(created)
+            if brand_ids and brands_per_product:
+                Through.objects.bulk_create([
+                    Through(product_id=product.pk, brand_id=brand_id)
+                    for product in created
+                    for brand_id in rng.sample(brand_ids, min(brands_per_product, len(brand_ids)))
+                ], batch_size=batch_size)
+    repair_product_counts(batch_size)
+    return Product.objects.count()
+
+
+def catalog_queries(now=None):
+    """
+    Returns the catalog's hot queries keyed by a short name, as zero-argument callables
+    returning querysets.
+    """
+    now = now or timezone.now()
+    probe = Product.objects.order_by('id').values_list('id', 'name').first() or (0, '')
+    return {
+        'sync_updated_since': lambda: Product.objects.filter(
+            updated_at__gte=now - timedelta(days=1)).order_by('updated_at', 'id')[:1000],
+        'name_lookup': lambda: Product.objects.filter(name=probe[1]),
+        'order_by_name': lambda: Product.objects.order_by('name')[:25],
+        'out_of_stock': lambda: Product.objects.filter(sku=0).order_by('id')[:25],
+        'search': lambda: search_products(Product.objects.all(), probe[1]).order_by('id')[:25],
+        'brand_products': lambda: Product.brand.through.objects.filter(
+            brand_id=Brand.objects.order_by('id').values_list('id', flat=True)[:1]).values_list('product_id')[:1000],
+    }
+
+
+def time_queryset(make_queryset, repeat=20):
+    """
+    Evaluates a fresh queryset ``repeat`` times and returns the timings in milliseconds.
+    """
+    timings = []
+    for _ in range(repeat):
+        queryset = make_queryset()
+        start = time.perf_counter()
+        list(queryset)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def summarize(timings):
+    """
+    Returns the p50/p95/p99 of a list of timings.
+    """
+    ordered = sorted(timings)
+
+    def percentile(p):
+        return ordered[min(len(ordered) - 1, round(p / 100 * (len(ordered) - 1)))]
+
+    return {
+        'p50': round(statistics.median(ordered), 3),
+        'p95': round(percentile(95), 3),
+        'p99': round(percentile(99), 3),
+    }
+
+
+@contextmanager
+def without_indexes(model):
+    """
+    Temporarily drops the ``Meta.indexes`` of a model, to measure queries without them.
+    """
+    with connection.schema_editor() as editor:
+        for index in model._meta.indexes:
+            editor.remove_index(model, index)
+    try:
+        yield
+    finally:
+        with connection.schema_editor() as editor:
+            for index in model._meta.indexes:
+                editor.add_index(model, index)
+
+
+def connection_profiles(alias='default'):
+    """
+    Returns the connection settings compared by ``connection_overhead`` as ``{name: overrides}``.
+
+    ``pooled`` is only included when the database is configured with a connection pool.
+    """
+    options = connections[alias].settings_dict['OPTIONS']
+    unpooled = {key: value for key, value in options.items() if key != 'pool'}
+    profiles = {
+        'per_request': {'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False, 'OPTIONS': unpooled},
+        'persistent': {'CONN_MAX_AGE': 60, 'CONN_HEALTH_CHECKS': True, 'OPTIONS': unpooled},
+    }
+    if options.get('pool'):
+        profiles['pooled'] = {'CONN_MAX_AGE': 0, 'OPTIONS': options}
+    return profiles
+
+
+@contextmanager
+def connection_settings(alias='default', **overrides):
+    """
+    Runs the block with the connection settings of a database temporarily overridden.
+    """
+    wrapper = connections[alias]
+    saved = {key: wrapper.settings_dict[key] for key in overrides}
+    wrapper.close()
+    wrapper.settings_dict.update(overrides)
+    try:
+        yield wrapper
+    finally:
+        wrapper.close()
+        wrapper.settings_dict.update(saved)
+
+
+def connection_overhead(requests=500, alias='default'):
+    """
+    Runs ``requests`` request cycles that each run one trivial query with the current connection settings.
+
+    ``request_started`` and ``request_finished`` are sent around every query like the request
+    handler does, so ``CONN_MAX_AGE`` and the health checks apply as in production. Returns the
+    latencies in milliseconds and the number of connections Django opened.
+    """
+    wrapper = connections[alias]
+    opened = []
+
+    def count_connection(sender, connection, **kwargs):
+        if connection.alias == alias:
+            opened.append(connection)
+
+    connection_created.connect(count_connection, weak=False)
+    latencies = []
+    try:
+        for _ in range(requests):
+            start = time.perf_counter()
+            request_started.send(sender=__name__)
+            with wrapper.cursor() as cursor:
+                cursor.execute('SELECT 1')
+                cursor.fetchone()
+            request_finished.send(sender=__name__)
+            latencies.append((time.perf_counter() - start) * 1000)
+    finally:
+        connection_created.disconnect(count_connection)
+    return {'latency_ms': summarize(latencies), 'connections': len(opened)}
+
+
+class QueryCountingApplication:
+    """
+    WSGI middleware that reports the number of SQL queries run by a request in a response header.
+    """
+    header = 'X-Benchmark-Queries'
+
+    def __init__(self, application):
+        self.application = application
+
+    def __call__(self, environ, start_response):
+        queries = []
+
+        def count_query(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        def start_with_count(status, headers, exc_info=None):
+            return start_response(status, headers + [(self.header, str(len(queries)))], exc_info)
+
+        with connection.execute_wrapper(count_query):
+            return self.application(environ, start_with_count)
+
+
+class QuietWSGIRequestHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+@contextmanager
+def wsgi_server(application):
+    """
+    Serves a WSGI application from background threads on a free local port and yields its base URL.
+    """
+    server = ThreadedWSGIServer(('127.0.0.1', 0), QuietWSGIRequestHandler, allow_reuse_address=False)
+    server.set_app(application)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f'http://127.0.0.1:{server.server_port}'
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
+
+
+def load_test(base_url, paths, concurrency=8, headers=None):
+    """
+    Requests every path of ``paths`` from ``concurrency`` threads over keep-alive connections.
+
+    Returns the latencies in milliseconds, the response status counts, the query counts
+    reported by ``QueryCountingApplication`` and the elapsed wall time in seconds.
+    """
+    location = urlsplit(base_url)
+    pending = iter(paths)
+    lock = threading.Lock()
+    latencies, query_counts, statuses = [], [], Counter()
+
+    def worker():
+        client = http.client.HTTPConnection(location.hostname, location.port, timeout=60)
+        try:
+            while True:
+                with lock:
+                    path = next(pending, None)
+                if path is None:
+                    return
+                start = time.perf_counter()
+                client.request('GET', path, headers=headers or {})
+                response = client.getresponse()
+                response.read()
+                elapsed = (time.perf_counter() - start) * 1000
+                with lock:
+                    latencies.append(elapsed)
+                    statuses[response.status] += 1
+                    query_counts.append(int(response.getheader(QueryCountingApplication.header, 0)))
+        finally:
+            client.close()
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return {
+        'latencies': latencies,
+        'statuses': statuses,
+        'query_counts': query_counts,
+        'elapsed': time.perf_counter() - start,
+    }
+
+
+SERVER_TIMING_QUERIES = re.compile(r'desc="(\d+) queries"')
+
+
+def server_timing_queries(value):
+    """
+    Returns the query count of a ``Server-Timing`` header written by ``PerformanceMiddleware``.
+    """
+    match = SERVER_TIMING_QUERIES.search(value or '')
+    return int(match.group(1)) if match else 0
+
+
+def _in_process_result(latencies, statuses, query_counts, start):
+    return {
+        'latencies': latencies,
+        'statuses': statuses,
+        'query_counts': query_counts,
+        'elapsed': time.perf_counter() - start,
+    }
+
+
+def wsgi_load_test(application, paths, concurrency=8, headers=None):
+    """
+    Calls a WSGI application for every path of ``paths`` from ``concurrency`` threads in this process.
+
+    Returns the same result as ``load_test``, without the cost of sockets and HTTP parsing.
+    Query counts are read from the ``Server-Timing`` header, so ``PERFORMANCE_METRICS['SERVER_TIMING']``
+    must be enabled.
+    """
+    pending = iter(paths)
+    lock = threading.Lock()
+    latencies, query_counts, statuses = [], [], Counter()
+    base_environ = {
+        'REQUEST_METHOD': 'GET', 'SCRIPT_NAME': '', 'SERVER_NAME': '127.0.0.1', 'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1', 'REMOTE_ADDR': '127.0.0.1', 'wsgi.version': (1, 0),
+        'wsgi.url_scheme': 'http', 'wsgi.errors': sys.stderr, 'wsgi.multithread': True,
+        'wsgi.multiprocess': False, 'wsgi.run_once': False,
+    }
+    for name, value in (headers or {}).items():
+        base_environ['HTTP_' + name.upper().replace('-', '_')] = value
+
+    def worker():
+        while True:
+            with lock:
+                path = next(pending, None)
+            if path is None:
+                return
+            path_info, _, query_string = path.partition('?')
+            environ = {**base_environ, 'PATH_INFO': path_info, 'QUERY_STRING': query_string,
+                       'wsgi.input': io.BytesIO()}
+            response_start = {}
+
+            def start_response(status, response_headers, exc_info=None):
+                response_start.update(status=int(status.split()[0]), headers=dict(response_headers))
+
+            start = time.perf_counter()
+            body = application(environ, start_response)
+            try:
+                b''.join(body)
+            finally:
+                if hasattr(body, 'close'):
+                    body.close()
+            elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                latencies.append(elapsed)
+                statuses[response_start['status']] += 1
+                query_counts.append(server_timing_queries(response_start['headers'].get('Server-Timing')))
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return _in_process_result(latencies, statuses, query_counts, start)
+
+
+def asgi_load_test(application, paths, concurrency=8, headers=None):
+    """
+    Sends every path of ``paths`` to an ASGI application from ``concurrency`` asyncio tasks in this process.
+
+    Returns the same result as ``load_test`` and ``wsgi_load_test``; query counts are read from
+    the ``Server-Timing`` header.
+    """
+    pending = iter(paths)
+    latencies, query_counts, statuses = [], [], Counter()
+    request_headers = [(b'host', b'127.0.0.1')] + [
+        (name.lower().encode(), value.encode()) for name, value in (headers or {}).items()]
+
+    async def request(path):
+        path_info, _, query_string = path.partition('?')
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+            'scheme': 'http', 'path': path_info, 'raw_path': path_info.encode(),
+            'query_string': query_string.encode(), 'root_path': '', 'headers': request_headers,
+            'client': ('127.0.0.1', 0), 'server': ('127.0.0.1', 80),
+        }
+        messages = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+        response = {}
+
+        async def receive():
+            if messages:
+                return messages.pop()
+            # the client never disconnects
+            await asyncio.Future()
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                response.update(status=message['status'], headers=dict(message['headers']))
+
+        await application(scope, receive, send)
+        return response
+
+    async def worker():
+        for path in pending:
+            start = time.perf_counter()
+            response = await request(path)
+            latencies.append((time.perf_counter() - start) * 1000)
+            statuses[response['status']] += 1
+            timing = response['headers'].get(b'Server-Timing') or response['headers'].get(b'server-timing')
+            query_counts.append(server_timing_queries(timing.decode() if timing else None))
+
+    async def run():
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+    start = time.perf_counter()
+    asyncio.run(run())
+    return _in_process_result(latencies, statuses, query_counts, start)
+
+
+def api_workload(requests, seed=0):
+    """
+    Returns the benchmarked API requests as ``{name: (paths, authenticated)}``.
+
+    Detail requests spread over random existing products, so the product cache is
+    measured with a realistic hit rate rather than a single hot key.
+    """
+    rng = random.Random(seed)
+    bounds = Product.objects.aggregate(low=Min('id'), high=Max('id'))
+    low, high = bounds['low'] or 1, bounds['high'] or 1
+    word = (Product.objects.order_by('id').values_list('name', flat=True).first() or 'product').split()[0]
+    products = reverse('product_list_create')
+    return {
+        'product_list': ([f'{products}?page={rng.randrange(1, 50)}' for _ in range(requests)], True),
+        'product_list_cursor': ([f'{products}?pagination=cursor'] * requests, True),
+        'product_filter': ([f'{products}?in_stock=true&min_price=10&ordering=-price'] * requests, True),
+        'product_search': ([f'{products}?search={word}'] * requests, True),
+        'product_detail': ([
+            reverse('product_retrieve_update_destroy', args=[rng.randint(low, high)]) for _ in range(requests)
+        ], False),
+        'brand_list': ([f"{reverse('brand_list_create')}?page={rng.randrange(1, 20)}" for _ in range(requests)], True),
+    }
+
+
+def summarize_load(result):
+    """
+    Returns latency percentiles, throughput, mean query count and status counts of a ``load_test`` result.
+    """
+    query_counts = result['query_counts'] or [0]
+    return {
+        'requests': len(result['latencies']),
+        'latency_ms': summarize(result['latencies']),
+        'throughput_rps': round(len(result['latencies']) / result['elapsed'], 1),
+        'queries_per_request': round(statistics.mean(query_counts), 2),
+        'statuses': {str(status): count for status, count in sorted(result['statuses'].items())},
+    }
+
+
+def compare_results(baseline, current, threshold=1.25):
+    """
+    Compares two benchmark result dicts endpoint by endpoint.
+
+    Returns ``(name, baseline_p95, current_p95, ratio, regressed)`` tuples. An endpoint regressed
+    when its p95 grew by more than ``threshold`` times or it runs more queries per request.
+    """
+    rows = []
+    for name, result in current['endpoints'].items():
+        previous = baseline['endpoints'].get(name)
+        if previous is None:
+            continue
+        old, new = previous['latency_ms']['p95'], result['latency_ms']['p95']
+        ratio = round(new / old, 2) if old else None
+        regressed = (ratio is not None and ratio > threshold) or (
+            result['queries_per_request'] > previous['queries_per_request'])
+        rows.append((name, old, new, ratio, regressed))
+    return rows
@@ -0,0 +1,74 @@
+"""
+Maintained ``Brand.product_count`` counters.
+
+Brand pages read the stored counter instead of counting the brand through table, so they
+cost the same whatever the size of the catalog. The counters are adjusted with relative
+``UPDATE``s in the transaction of every link change; ``repair_product_counts`` recounts
+them for the changes made outside the ORM.
+"""
+from collections import Counter, defaultdict
+
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from products.changes import record_changes
+from products.models import Brand, ChangeLog, Product
+
+
+def linked_products(**filters):
+    """
+    Returns the number of products linked to the brand of the outer query, as a correlated subquery.
+
+    Evaluated per selected row with the ``(brand_id, product_id)`` index of the through
+    table, so annotating a page of brands reads the links of those brands only.
+    """
+    links = (Product.brand.through.objects.filter(brand_id=OuterRef('pk'), **filters)
+             .order_by().values('brand_id').annotate(count=Count('*')).values('count'))
+    return Coalesce(Subquery(links), 0)
+
+
+def in_stock_products():
+    """
+    Returns the number of products with ``sku > 0`` linked to the brand of the outer query.
+    """
+    return linked_products(product__sku__gt=0)
+
+
+def count_links(links):
+    """
+    Returns the number of links per brand of a through table queryset as a ``Counter``.
+    """
+    return Counter(links.values_list('brand_id', flat=True))
+
+
+def adjust_product_counts(deltas):
+    """
+    Adds ``{brand_id: delta}`` to the product counters, with one ``UPDATE`` per distinct delta,
+    and logs the brands in the change feed.
+    """
+    by_delta = defaultdict(list)
+    for brand_id, delta in deltas.items():
+        if delta:
+            by_delta[delta].append(brand_id)
+    for delta, brand_ids in by_delta.items():
+        Brand.objects.filter(pk__in=brand_ids).update(product_count=F('product_count') + delta)
+    record_changes(ChangeLog.BRAND, [brand_id for brand_ids in by_delta.values() for brand_id in brand_ids])
+
+
+def repair_product_counts(batch_size=1000):
+    """
+    Recounts the products of every brand, ``batch_size`` brands at a time, and rewrites the
+    counters that drifted. Returns the number of brands repaired.
+    """
+    repaired, last = 0, 0
+    while True:
+        batch = list(Brand.objects.filter(pk__gt=last).order_by('pk').annotate(actual=linked_products())
+                     .values_list('pk', 'product_count', 'actual')[:batch_size])
+        if not batch:
+            return repaired
+        last = batch[-1][0]
+        drifted = [pk for pk, stored, actual in batch if stored != actual]
+        if drifted:
+            # recounted in the UPDATE, so links changed since the batch was read are not lost
+            repaired += Brand.objects.filter(pk__in=drifted).update(product_count=linked_products())
+            record_changes(ChangeLog.BRAND, drifted)
@@ -0,0 +1,128 @@
+import threading
+import time
+
+from django.core.cache import caches
+from django.db import transaction
+
+from products.metrics import record_cache_lookup
+from products.routers import primary_reads
+
+
+class ProductCache:
+    """
+    Read-through cache of serialized product payloads.
+
+    Payloads are stored under a key made of the product id and a per-product
+    version token. Invalidating a product bumps its version, so a request that
+    read the old row before the change can only ever fill a key nobody reads
+    anymore. TTL and LRU eviction are delegated to the configured cache backend.
+
+    alias: str
+        Name of the cache in ``settings.CACHES`` used to store the payloads.
+    """
+    # Bump when the serialized payload shape changes so old entries are ignored.
+    payload_version = 1
+
+    def __init__(self, alias='products'):
+        self.alias = alias
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def _version_key(self, pk):
+        return f'product:{pk}:version'
+
+    def _payload_key(self, pk, version):
+        return f'product:{pk}:v{self.payload_version}:{version}'
+
+    def _get_version(self, pk):
+        key = self._version_key(pk)
+        version = self.cache.get(key)
+        if version is None:
+            # A fresh token (instead of 0) keeps payloads cached under an evicted version unreachable.
+            self.cache.add(key, time.time_ns(), timeout=None)
+            version = self.cache.get(key)
+        return version
+
+    async def _aget_version(self, pk):
+        key = self._version_key(pk)
+        version = await self.cache.aget(key)
+        if version is None:
+            await self.cache.aadd(key, time.time_ns(), timeout=None)
+            version = await self.cache.aget(key)
+        return version
+
+    def _count(self, attr, amount=1):
+        with self._lock:
+            setattr(self, attr, getattr(self, attr) + amount)
+
+    def get_or_set(self, pk, fill):
+        """
+        Returns the cached payload for a product, calling ``fill()`` to build and store it on a miss.
+        """
+        key = self._payload_key(pk, self._get_version(pk))
+        payload = self.cache.get(key)
+        record_cache_lookup(hit=payload is not None)
+        if payload is not None:
+            self._count('hits')
+            return payload
+        self._count('misses')
+        # a lagging replica would store a stale payload under the new version
+        with primary_reads():
+            payload = fill()
+        self.cache.set(key, payload)
+        return payload
+
+    async def aget_or_set(self, pk, afill):
+        """
+        Async version of ``get_or_set``; ``afill()`` is awaited to build the payload on a miss.
+        """
+        key = self._payload_key(pk, await self._aget_version(pk))
+        payload = await self.cache.aget(key)
+        record_cache_lookup(hit=payload is not None)
+        if payload is not None:
+            self._count('hits')
+            return payload
+        self._count('misses')
+        with primary_reads():
+            payload = await afill()
+        await self.cache.aset(key, payload)
+        return payload
+
+    def invalidate(self, *pks):
+        """
+        Makes the cached payloads of the given products unreachable.
+
+        The version is bumped right away and again once the current transaction
+        commits, so readers that fill the cache before the commit are discarded too.
+        """
+        pks = [pk for pk in pks if pk is not None]
+        if not pks:
+            return
+        self._bump(pks)
+        transaction.on_commit(lambda: self._bump(pks))
+
+    def _bump(self, pks):
+        cache = self.cache
+        for pk in pks:
+            key = self._version_key(pk)
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.set(key, time.time_ns(), timeout=None)
+        self._count('invalidations', len(pks))
+
+    def stats(self):
+        """
+        Returns the hit, miss and invalidation counters of this process.
+        """
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'invalidations': self.invalidations}
+
+
+product_cache = ProductCache()
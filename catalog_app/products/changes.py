@@ -0,0 +1,173 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.db.models import Exists, F, Max, OuterRef
+from django.utils import timezone
+
+from products.events import publish_changes
+from products.models import Brand, ChangeLog, ChangeLogCompaction, ChangeLogSequence, Product
+from products.serializers import BrandSerializer, ProductSerializer
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHANGE_FEED = {
+    'BATCH_SIZE': 500,
+    'MAX_BATCH_SIZE': 5000,
+    'TOMBSTONE_RETENTION': 30 * 24 * 3600,
+}
+
+# Model and serializer of the objects of every kind of change.
+KINDS = {
+    ChangeLog.PRODUCT: (Product, ProductSerializer),
+    ChangeLog.BRAND: (Brand, BrandSerializer),
+}
+
+
+def get_change_feed_settings(**overrides):
+    """
+    Returns the ``CHANGE_FEED`` setting merged over the defaults and the given overrides.
+    """
+    config = {**DEFAULT_CHANGE_FEED, **getattr(settings, 'CHANGE_FEED', {})}
+    config.update({key.upper(): value for key, value in overrides.items() if value is not None})
+    return config
+
+
+def record_changes(kind, object_ids, action=ChangeLog.UPSERT):
+    """
+    Appends an entry per object to the change log, in the current transaction, numbers the
+    entries once it commits and then publishes product changes to the event stream.
+    """
+    now = timezone.now()
+    entries = ChangeLog.objects.bulk_create(
+        [ChangeLog(kind=kind, object_id=object_id, action=action, created_at=now) for object_id in object_ids],
+        batch_size=1000)
+    if entries:
+        transaction.on_commit(lambda: number_committed_changes(kind, [entry.pk for entry in entries]))
+
+
+def number_committed_changes(kind, entry_ids):
+    """
+    Numbers the entries of a committed transaction and publishes them if they are product changes.
+
+    Entries left unnumbered by a failure here are numbered by the next read of the feed.
+    """
+    try:
+        entries = sequence_changes(entry_ids)
+    except DatabaseError:
+        logger.warning('Failed to number %d change log entries.', len(entry_ids), exc_info=True)
+        return
+    if kind == ChangeLog.PRODUCT and entries:
+        publish_changes(entries)
+
+
+def sequence_changes(entry_ids=None):
+    """
+    Gives the next sequence numbers to committed change log entries, in id order, and returns them.
+
+    Only the entries of ``entry_ids`` are numbered, or every committed entry without a number
+    when it is None. The ``ChangeLogSequence`` row is locked with an ``UPDATE`` until the
+    numbers are committed, so a transaction numbering entries waits for the previous one to
+    commit and numbers become visible in increasing order.
+    """
+    entries = ChangeLog.objects.filter(seq__isnull=True)
+    if entry_ids is not None:
+        entries = entries.filter(pk__in=entry_ids)
+    if not entries.exists():
+        return []
+    with transaction.atomic():
+        sequence = ChangeLogSequence.objects.filter(pk=1)
+        if not sequence.update(last=F('last')):
+            # the row is missing, e.g. after the tables were flushed: continue after the highest number
+            ChangeLogSequence.objects.get_or_create(
+                pk=1, defaults={'last': ChangeLog.objects.aggregate(last=Max('seq'))['last'] or 0})
+            sequence.update(last=F('last'))
+        last = sequence.values_list('last', flat=True).get()
+        # read again under the lock: a concurrent call may have numbered some of them
+        entries = list(entries.order_by('pk'))
+        for seq, entry in enumerate(entries, last + 1):
+            entry.seq = seq
+        ChangeLog.objects.bulk_update(entries, ['seq'], batch_size=500)
+        sequence.update(last=last + len(entries))
+    return entries
+
+
+def get_purge_watermark():
+    """
+    Returns the sequence number up to which tombstones were purged, 0 if none was.
+    """
+    return ChangeLogCompaction.objects.values_list('purged_until', flat=True).first() or 0
+
+
+def read_changes(after=0, limit=None):
+    """
+    Returns the changes following sequence number ``after`` as a ``{'changes', 'next', 'has_more'}`` dict.
+
+    Only the latest change of every object in the batch is returned, upserts with the
+    current representation of the object. Upserts of objects deleted since are left out:
+    their tombstone follows. Committed entries not numbered yet are numbered first; entries
+    of transactions still running are numbered after they commit, so they come after every
+    change returned now and are never skipped. ``next`` is the ``after`` of the next call,
+    and ``has_more`` tells whether it can be made right away.
+    """
+    limit = limit or get_change_feed_settings()['BATCH_SIZE']
+    sequence_changes()
+    entries = list(
+        ChangeLog.objects.filter(seq__gt=after).order_by('seq')
+        .values_list('seq', 'kind', 'object_id', 'action')[:limit + 1])
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    latest = {}
+    for entry in entries:
+        latest[entry[1], entry[2]] = entry
+    data = {}
+    for kind, (model, serializer) in KINDS.items():
+        ids = [object_id for (entry_kind, object_id), entry in latest.items()
+               if entry_kind == kind and entry[3] == ChangeLog.UPSERT]
+        if ids:
+            rows = list(model.objects.filter(pk__in=ids).values(*serializer.values_fields()))
+            data.update(((kind, row['id']), row) for row in serializer.represent_rows(rows))
+
+    changes = []
+    for seq, kind, object_id, action in sorted(latest.values()):
+        if action == ChangeLog.UPSERT and (kind, object_id) not in data:
+            continue
+        changes.append({
+            'seq': seq,
+            'type': kind,
+            'id': object_id,
+            'action': action,
+            'data': data.get((kind, object_id)),
+        })
+    return {'changes': changes, 'next': entries[-1][0] if entries else after, 'has_more': has_more}
+
+
+def compact_changes(now=None, **overrides):
+    """
+    Deletes the changes superseded by a later change of the same object, then the tombstones
+    older than ``TOMBSTONE_RETENTION`` seconds, and moves the purge watermark past them.
+
+    Superseded changes can go at any time: a mirror reading from before them gets the later
+    change. Purged tombstones cannot be replayed, so mirrors behind the watermark must sync
+    from scratch. Returns the number of changes deleted by each step.
+    """
+    config = get_change_feed_settings(**overrides)
+    now = now or timezone.now()
+    sequence_changes()
+    later = ChangeLog.objects.filter(kind=OuterRef('kind'), object_id=OuterRef('object_id'), pk__gt=OuterRef('pk'))
+    superseded = ChangeLog.objects.filter(Exists(later)).delete()[0]
+
+    horizon = now - timedelta(seconds=config['TOMBSTONE_RETENTION'])
+    with transaction.atomic():
+        tombstones = ChangeLog.objects.filter(action=ChangeLog.DELETE, created_at__lt=horizon, seq__isnull=False)
+        purged_until = tombstones.aggregate(last=Max('seq'))['last']
+        purged = 0
+        if purged_until is not None:
+            compaction = ChangeLogCompaction.objects.select_for_update().get_or_create(pk=1)[0]
+            purged = tombstones.filter(seq__lte=purged_until).delete()[0]
+            compaction.purged_until = max(compaction.purged_until, purged_until)
+            compaction.compacted_at = now
+            compaction.save()
+    return {'superseded': superseded, 'purged': purged}
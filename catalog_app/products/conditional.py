@@ -0,0 +1,189 @@
+import hashlib
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import router, transaction
+from django.utils.cache import get_conditional_response
+from django.utils.dateparse import parse_datetime
+from django.utils.http import http_date
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.response import Response
+
+CONDITIONAL_HEADERS = ('HTTP_IF_MATCH', 'HTTP_IF_NONE_MATCH', 'HTTP_IF_MODIFIED_SINCE', 'HTTP_IF_UNMODIFIED_SINCE')
+
+
+def make_etag(*parts):
+    """
+    Returns a strong ETag hashing the JSON representation of ``parts``.
+    """
+    encoded = json.dumps(parts, cls=DjangoJSONEncoder, separators=(',', ':')).encode()
+    return f'"{hashlib.sha1(encoded).hexdigest()}"'
+
+
+def set_validator_headers(response, etag, last_modified=None):
+    """
+    Sets the ``ETag`` and, when given, the ``Last-Modified`` header of a response.
+    """
+    response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+
+
+def detail_validators(data, renderer_format, etag_fields, last_modified_field=None):
+    """
+    Returns the ``(etag, last_modified)`` of a rendered detail representation.
+    """
+    etag = make_etag(renderer_format, [data[name] for name in etag_fields])
+    last_modified = parse_datetime(data[last_modified_field]) if last_modified_field else None
+    return etag, last_modified
+
+
+def page_etag(renderer_format, count, items, etag_fields):
+    """
+    Returns the ETag of a rendered list page from its total count and the validator fields of its items.
+    """
+    return make_etag(renderer_format, count, [[item[name] for name in etag_fields] for item in items])
+
+
+class ConditionalRequestMixin:
+    """
+    Base mixin for generic views answering conditional requests without serializing the body.
+
+    Validators are computed from ``etag_fields`` (and ``last_modified_field``) only. They are
+    read from the database before the handler runs when the request carries a conditional
+    header, and taken from the rendered data otherwise, so both paths agree on the same ETag.
+
+    etag_fields: tuple
+        Model fields whose values identify a version of the representation.
+
+    last_modified_field: str
+        Datetime model field sent as ``Last-Modified``, or None.
+    """
+    etag_fields = ('id',)
+    last_modified_field = None
+
+    def represent(self, row):
+        """
+        Returns the serialized values of the validator fields of a ``values()`` row; annotations
+        the serializer does not render are taken as they are.
+        """
+        fields = self.get_serializer().fields
+        return [fields[name].to_representation(row[name]) if name in fields else row[name]
+                for name in self.etag_fields]
+
+    def get_current_validators(self):
+        """
+        Returns the ``(etag, last_modified)`` of the resource in the database, or None if it does not exist.
+        """
+        raise NotImplementedError
+
+    def get_response_validators(self, data):
+        """
+        Returns the ``(etag, last_modified)`` of the data rendered by the handler.
+        """
+        raise NotImplementedError
+
+    def check_preconditions(self, request):
+        """
+        Returns a 304 or 412 response when the request preconditions say so, otherwise None.
+        """
+        if not any(header in request.META for header in CONDITIONAL_HEADERS):
+            return None
+        validators = self.get_current_validators()
+        if validators is None:
+            return None
+        etag, last_modified = validators
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is not None and response.status_code == 304:
+            set_validator_headers(response, etag, last_modified)
+        return response
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if (request.method in ('GET', 'HEAD', 'PUT', 'PATCH') and response.status_code == 200
+                and isinstance(response, Response) and not response.has_header('ETag')):
+            set_validator_headers(response, *self.get_response_validators(response.data))
+        return response
+
+
+class ConditionalRetrieveMixin(ConditionalRequestMixin):
+    """
+    Conditional GET and optimistic concurrency (``If-Match``) for detail views.
+
+    Writes check their preconditions and write in one transaction, reading the validators
+    with ``select_for_update()``: a concurrent write with the same ``If-Match`` waits for the
+    first one to commit, then sees the new ETag and gets a 412 instead of overwriting it.
+    """
+
+    def get_current_validators(self):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        fields = self.etag_fields + ((self.last_modified_field,) if self.last_modified_field else ())
+        queryset = self.get_queryset().prefetch_related(None)
+        if self.request.method not in SAFE_METHODS:
+            queryset = queryset.select_for_update(of=('self',))
+        row = queryset.filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]}).values(*fields).first()
+        if row is None:
+            return None
+        last_modified = row[self.last_modified_field] if self.last_modified_field else None
+        return make_etag(self.request.accepted_renderer.format, self.represent(row)), last_modified
+
+    def get_response_validators(self, data):
+        return detail_validators(data, self.request.accepted_renderer.format, self.etag_fields,
+                                 self.last_modified_field)
+
+    def get(self, request, *args, **kwargs):
+        return self.check_preconditions(request) or super().get(request, *args, **kwargs)
+
+    def conditional_write(self, handler, request, *args, **kwargs):
+        """
+        Runs a write handler if the request preconditions hold, in the transaction that checked them.
+        """
+        with transaction.atomic(using=router.db_for_write(self.get_queryset().model)):
+            return self.check_preconditions(request) or handler(request, *args, **kwargs)
+
+    def put(self, request, *args, **kwargs):
+        return self.conditional_write(super().put, request, *args, **kwargs)
+
+    def patch(self, request, *args, **kwargs):
+        return self.conditional_write(super().patch, request, *args, **kwargs)
+
+    def delete(self, request, *args, **kwargs):
+        return self.conditional_write(super().delete, request, *args, **kwargs)
+
+
+class ConditionalListMixin(ConditionalRequestMixin):
+    """
+    Conditional GET for paginated list views.
+
+    The ETag covers the validator fields of every item on the page plus the total count, so
+    changes, insertions and deletions that move items in or out of the page all change it.
+    No ``Last-Modified`` is sent: the newest ``updated_at`` of a page does not change when an
+    item is deleted from it.
+    """
+
+    def get_current_validators(self):
+        queryset = self.filter_queryset(self.get_queryset()).prefetch_related(None).values(*self.etag_fields)
+        page = self.paginate_queryset(queryset)
+        rows = page if page is not None else list(queryset)
+        return make_etag(self.request.accepted_renderer.format, self.get_page_count(),
+                         [self.represent(row) for row in rows]), None
+
+    def get_page_count(self):
+        """
+        Returns the total count rendered in page-number mode, None in cursor mode or without pagination.
+        """
+        if self.paginator is None or getattr(self.paginator, 'cursor_paginator', None) is not None:
+            return None
+        page = getattr(self.paginator, 'page', None)
+        return page.paginator.count if page is not None else None
+
+    def get_response_validators(self, data):
+        if isinstance(data, dict):
+            count, items = data.get('count'), data['results']
+        else:
+            count, items = None, data
+        return page_etag(self.request.accepted_renderer.format, count, items, self.etag_fields), None
+
+    def get(self, request, *args, **kwargs):
+        return self.check_preconditions(request) or super().get(request, *args, **kwargs)
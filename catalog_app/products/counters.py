@@ -0,0 +1,297 @@
+import atexit
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DatabaseError, transaction
+from django.db.models import F
+from django.utils.module_loading import import_string
+
+from products.analytics import record_views
+from products.models import Product, Query
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_VIEW_COUNTER = {
+    'BACKEND': 'products.counters.LocalViewCounter',
+    'FLUSH_INTERVAL': 5,
+    'FLUSH_SIZE': 1000,
+    'CACHE_ALIAS': 'default',
+}
+
+
+class BaseViewCounter:
+    """
+    Base class for anonymous product view counters.
+
+    Counters collect increments in memory (or in a cache) and write them to
+    ``products.Query`` in batches, so the read path does not touch the database.
+
+    flush_interval: float
+        Maximum number of seconds increments may stay buffered before a flush.
+
+    flush_size: int
+        Number of buffered increments that triggers a flush.
+    """
+
+    def __init__(self, flush_interval=5, flush_size=1000, **options):
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self._last_flush = time.monotonic()
+
+    def increment(self, product_id, amount=1):
+        """
+        Records ``amount`` views for a product.
+        """
+        raise NotImplementedError
+
+    def increment_many(self, increments):
+        """
+        Records a ``{product_id: amount}`` dict of views, e.g. of the products of a multi-get.
+        """
+        for product_id, amount in increments.items():
+            self.increment(product_id, amount)
+
+    def drain(self):
+        """
+        Removes and returns the pending increments as a ``{product_id: amount}`` dict.
+        """
+        raise NotImplementedError
+
+    def pending(self):
+        """
+        Returns the number of increments waiting to be flushed.
+        """
+        raise NotImplementedError
+
+    def should_flush(self):
+        """
+        Returns True when the buffer is full or the flush interval has elapsed.
+        """
+        if self.pending() >= self.flush_size:
+            return True
+        return time.monotonic() - self._last_flush >= self.flush_interval and self.pending() > 0
+
+    def maybe_flush(self):
+        """
+        Flushes the pending increments if the size or interval threshold was reached.
+        """
+        if self.should_flush():
+            return self.flush()
+        return 0
+
+    def flush(self):
+        """
+        Writes the pending increments to the database and returns the number of products updated.
+        """
+        self._last_flush = time.monotonic()
+        increments = self.drain()
+        if not increments:
+            return 0
+        write_view_counts(increments)
+        return len(increments)
+
+    def flush_on_exit(self):
+        """
+        Flushes the pending increments at shutdown, logging instead of raising on database errors.
+        """
+        try:
+            self.flush()
+        except DatabaseError:
+            logger.exception('Failed to flush view counts on shutdown.')
+
+
+class LocalViewCounter(BaseViewCounter):
+    """
+    View counter that buffers increments in process memory.
+
+    Increments are kept in a ``Counter`` that is swapped out under a short lock on
+    flush, so the request path never waits on the database.
+    """
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        self._lock = threading.Lock()
+        self._counts = Counter()
+        self._total = 0
+
+    def increment(self, product_id, amount=1):
+        with self._lock:
+            self._counts[product_id] += amount
+            self._total += amount
+        self.maybe_flush()
+
+    def increment_many(self, increments):
+        with self._lock:
+            self._counts.update(increments)
+            self._total += sum(increments.values())
+        self.maybe_flush()
+
+    def drain(self):
+        with self._lock:
+            counts, self._counts = self._counts, Counter()
+            self._total = 0
+        return dict(counts)
+
+    def pending(self):
+        return self._total
+
+
+class CacheViewCounter(BaseViewCounter):
+    """
+    View counter that buffers increments in a Django cache.
+
+    With a cache shared by all workers (e.g. memcached) any process, including
+    the ``flush_view_counts`` management command, can flush the buffer.
+
+    Counters are written to the current generation: every product viewed in a generation is
+    registered once in a numbered slot of that generation, so a flush reads the products viewed
+    since the previous flush only. A flush takes a lock with ``cache.add`` (a concurrent flush
+    finds nothing to drain), starts a new generation and claims the counters of the one it
+    closed by decrementing them, which keeps the increments of requests that were still writing
+    to it; what they left is claimed by the next flush, which then deletes the generation.
+    Counters the cache evicted before a flush are lost.
+
+    lock_timeout: float
+        Seconds after which the lock of a flush that died is released.
+    """
+    key_prefix = 'view_counter'
+
+    def __init__(self, cache_alias='default', lock_timeout=60, **options):
+        super().__init__(**options)
+        self.cache = caches[cache_alias]
+        self.lock_timeout = lock_timeout
+        self._local_pending = 0
+
+    def _key(self, generation, *parts):
+        return ':'.join(map(str, (self.key_prefix, generation, *parts)))
+
+    @property
+    def _generation_key(self):
+        return f'{self.key_prefix}:generation'
+
+    @property
+    def _lock_key(self):
+        return f'{self.key_prefix}:lock'
+
+    def _generation(self):
+        return self.cache.get(self._generation_key) or 0
+
+    def increment(self, product_id, amount=1):
+        generation = self._generation()
+        key = self._key(generation, 'count', product_id)
+        if self.cache.add(key, amount, timeout=None):
+            self.cache.add(self._key(generation, 'seq'), 0, timeout=None)
+            slot = self.cache.incr(self._key(generation, 'seq'))
+            self.cache.set(self._key(generation, 'slot', slot), product_id, timeout=None)
+        else:
+            self.cache.incr(key, amount)
+        self._local_pending += amount
+        self.maybe_flush()
+
+    def _counter_keys(self, generation):
+        """
+        Returns the ``{counter key: product_id}`` dict and the slot keys of a generation.
+        """
+        seq = self.cache.get(self._key(generation, 'seq')) or 0
+        slot_keys = [self._key(generation, 'slot', slot) for slot in range(1, seq + 1)]
+        product_ids = self.cache.get_many(slot_keys).values()
+        return {self._key(generation, 'count', product_id): product_id for product_id in product_ids}, slot_keys
+
+    def _claim(self, key, amount):
+        try:
+            self.cache.decr(key, amount)
+        except ValueError:
+            # evicted since it was read: nothing is left to decrement
+            pass
+
+    def drain(self):
+        self._local_pending = 0
+        if not self.cache.add(self._lock_key, 1, timeout=self.lock_timeout):
+            return {}
+        try:
+            self.cache.add(self._generation_key, 0, timeout=None)
+            closed = self.cache.incr(self._generation_key) - 1
+            increments = Counter()
+            counters, _ = self._counter_keys(closed)
+            for key, amount in self.cache.get_many(list(counters)).items():
+                if amount:
+                    self._claim(key, amount)
+                    increments[counters[key]] += amount
+
+            # the generation closed by the previous flush no longer receives increments
+            counters, slot_keys = self._counter_keys(closed - 1)
+            for key, amount in self.cache.get_many(list(counters)).items():
+                if amount:
+                    increments[counters[key]] += amount
+            self.cache.delete_many([*counters, *slot_keys, self._key(closed - 1, 'seq')])
+            return dict(increments)
+        finally:
+            self.cache.delete(self._lock_key)
+
+    def pending(self):
+        return self._local_pending
+
+
+def write_view_counts(increments):
+    """
+    Applies a ``{product_id: amount}`` dict to ``products.Query`` with atomic updates.
+
+    Products without a Query row get one created in bulk first, then products sharing
+    the same increment are updated together with a single
+    ``UPDATE ... SET count = count + n`` statement. The increments are also appended to
+    the minute buckets read by the analytics reports.
+    """
+    with transaction.atomic():
+        existing = set(Query.objects.filter(product_id__in=increments).values_list('product_id', flat=True))
+        missing = set(increments) - existing
+        if missing:
+            # Rows created concurrently by another worker are left alone and incremented below.
+            product_ids = set(Product.objects.filter(pk__in=missing).values_list('pk', flat=True))
+            Query.objects.bulk_create([Query(product_id=pk, count=0) for pk in product_ids], ignore_conflicts=True)
+            existing |= product_ids
+
+        by_amount = defaultdict(list)
+        for product_id, amount in increments.items():
+            by_amount[amount].append(product_id)
+        for amount, product_ids in by_amount.items():
+            Query.objects.filter(product_id__in=product_ids).update(count=F('count') + amount)
+        record_views({product_id: amount for product_id, amount in increments.items() if product_id in existing})
+
+
+_view_counter = None
+_view_counter_lock = threading.Lock()
+
+
+def get_view_counter():
+    """
+    Returns the process-wide view counter configured by the ``VIEW_COUNTER`` setting.
+
+    The counter is flushed when the interpreter exits.
+    """
+    global _view_counter
+    if _view_counter is None:
+        with _view_counter_lock:
+            if _view_counter is None:
+                config = {**DEFAULT_VIEW_COUNTER, **getattr(settings, 'VIEW_COUNTER', {})}
+                backend = import_string(config['BACKEND'])
+                options = {'flush_interval': config['FLUSH_INTERVAL'], 'flush_size': config['FLUSH_SIZE']}
+                if issubclass(backend, CacheViewCounter):
+                    options['cache_alias'] = config['CACHE_ALIAS']
+                _view_counter = backend(**options)
+                atexit.register(_view_counter.flush_on_exit)
+    return _view_counter
+
+
+def reset_view_counter():
+    """
+    Discards the configured view counter so the next call rebuilds it from settings.
+    """
+    global _view_counter
+    with _view_counter_lock:
+        if _view_counter is not None:
+            atexit.unregister(_view_counter.flush_on_exit)
+        _view_counter = None
@@ -0,0 +1,9 @@
+from django.dispatch import Signal
+
+# Sent with ``product_ids`` after stock levels were changed with queryset updates,
+# which bypass the model's post_save signal.
+inventory_changed = Signal()
+
+# Sent with ``created_ids`` and ``updated_ids`` after a chunk of products was written
+# by the bulk importer, which bypasses the model's save signals.
+products_imported = Signal()
@@ -0,0 +1,354 @@
+"""
+Product change events pushed to admin clients over Server-Sent Events.
+
+Committed product changes are published to a broker, which hands them to the ``EventHub``
+of every worker; the hub fans each event out to the queues of the SSE streams connected to
+that worker. An idle stream is one small queue and a coroutine waiting on it, so a worker
+can hold thousands of them. ``LocalBroker`` delivers within the process; ``SocketBroker``
+relays through the ``run_event_broker`` command, a local stand-in for a pub/sub server when
+several workers serve streams.
+"""
+import asyncio
+import json
+import logging
+import socket
+import threading
+import time
+from collections import defaultdict
+from contextlib import suppress
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_EVENT_STREAM = {
+    'QUEUE_SIZE': 100,
+    'HEARTBEAT': 15,
+    'BROKER': 'products.events.LocalBroker',
+    'BROKER_HOST': '127.0.0.1',
+    'BROKER_PORT': 8765,
+}
+
+# Queued instead of the events of a subscription that fell too far behind.
+OVERFLOW = object()
+
+# First line sent to the broker by the connections that receive events.
+SUBSCRIBE = b'subscribe\n'
+
+
+def get_event_settings():
+    """
+    Returns the ``EVENT_STREAM`` setting merged over the defaults.
+    """
+    return {**DEFAULT_EVENT_STREAM, **getattr(settings, 'EVENT_STREAM', {})}
+
+
+def format_event(event):
+    """
+    Returns a ``{'seq', 'id', 'action'}`` product change as a Server-Sent Events message.
+    """
+    data = json.dumps(event, separators=(',', ':'))
+    return f"id: {event['seq']}\nevent: product\ndata: {data}\n\n".encode()
+
+
+class Subscription:
+    """
+    The queue of one connected stream, read on the event loop that created it.
+
+    A subscription whose queue is full when an event arrives has its pending events
+    replaced by ``OVERFLOW``: the stream tells the client to catch up from the change feed
+    and ends, instead of holding an unbounded backlog or slowing the other streams down.
+    """
+    __slots__ = ('queue', 'loop', 'overflowed')
+
+    def __init__(self, loop, size):
+        self.queue = asyncio.Queue(size)
+        self.loop = loop
+        self.overflowed = False
+
+    def offer(self, item):
+        """
+        Queues ``(seq, message)``; must run on the subscription's loop. Returns False on overflow.
+        """
+        if self.overflowed:
+            return True
+        try:
+            self.queue.put_nowait(item)
+            return True
+        except asyncio.QueueFull:
+            self.overflowed = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(OVERFLOW)
+            return False
+
+
+class EventHub:
+    """
+    Fans events out to the subscriptions of this process.
+
+    ``dispatch`` may be called from any thread. It schedules one callback per event loop,
+    which offers the event to all the subscriptions of that loop, so an event costs a single
+    wakeup of the loop however many streams it serves. Messages are encoded once per event.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = defaultdict(set)
+        self.dropped = 0
+
+    def subscribe(self, size=100):
+        """
+        Returns a new subscription of the running event loop.
+        """
+        subscription = Subscription(asyncio.get_running_loop(), size)
+        with self._lock:
+            self._subscriptions[subscription.loop].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.loop)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.loop]
+
+    def dispatch(self, event):
+        """
+        Delivers a ``{'seq', 'id', 'action'}`` event to every subscription.
+        """
+        item = (event['seq'], format_event(event))
+        with self._lock:
+            loops = list(self._subscriptions)
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        for loop in loops:
+            if loop.is_closed():
+                continue
+            if loop is running:
+                self._deliver(loop, item)
+            else:
+                loop.call_soon_threadsafe(self._deliver, loop, item)
+
+    def _deliver(self, loop, item):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(loop, ()))
+        dropped = sum(1 for subscription in subscriptions if not subscription.offer(item))
+        if dropped:
+            with self._lock:
+                self.dropped += dropped
+
+    def stats(self):
+        """
+        Returns the number of subscriptions and of subscriptions dropped for falling behind.
+        """
+        with self._lock:
+            return {'subscribers': sum(map(len, self._subscriptions.values())), 'dropped': self.dropped}
+
+
+hub = EventHub()
+
+
+class LocalBroker:
+    """
+    Broker delivering the events published in a process to the streams of that process only.
+    """
+
+    def __init__(self, hub, **options):
+        self.hub = hub
+
+    def start(self):
+        pass
+
+    def publish(self, event):
+        self.hub.dispatch(event)
+
+
+class SocketBroker:
+    """
+    Broker relaying events through the ``run_event_broker`` TCP server, so every worker
+    connected to it delivers them to its streams.
+
+    Events are sent as JSON lines; a publisher that cannot reach the broker logs the
+    failure and drops events for ``retry_interval`` seconds rather than delaying writes.
+    Subscribing workers read from the broker in a daemon thread that reconnects on errors.
+    """
+
+    def __init__(self, hub, host='127.0.0.1', port=8765, timeout=0.5, retry_interval=5, **options):
+        self.hub = hub
+        self.address = (host, port)
+        self.timeout = timeout
+        self.retry_interval = retry_interval
+        self._lock = threading.Lock()
+        self._socket = None
+        self._retry_at = 0
+        self._listener = None
+        self._listening = None
+        self._closed = threading.Event()
+
+    def publish(self, event):
+        line = json.dumps(event).encode() + b'\n'
+        with self._lock:
+            if self._socket is None:
+                if time.monotonic() < self._retry_at:
+                    return
+                try:
+                    self._socket = socket.create_connection(self.address, timeout=self.timeout)
+                except OSError:
+                    logger.warning('Event broker at %s:%s is unreachable; dropping events.', *self.address)
+                    self._retry_at = time.monotonic() + self.retry_interval
+                    return
+            try:
+                self._socket.sendall(line)
+            except OSError:
+                logger.warning('Lost the event broker connection; dropping an event.', exc_info=True)
+                self._socket.close()
+                self._socket = None
+
+    def start(self):
+        """
+        Starts reading the broker's events into the hub, once per process.
+        """
+        with self._lock:
+            if self._listener is None:
+                self._listener = threading.Thread(target=self._listen, name='event-broker', daemon=True)
+                self._listener.start()
+
+    def close(self):
+        """
+        Stops reading events and closes the connections to the broker.
+        """
+        self._closed.set()
+        with self._lock:
+            for connection in (self._socket, self._listening):
+                if connection is not None:
+                    with suppress(OSError):
+                        connection.shutdown(socket.SHUT_RDWR)
+                    connection.close()
+            self._socket = None
+
+    def _listen(self):
+        while not self._closed.is_set():
+            try:
+                with socket.create_connection(self.address) as connection:
+                    self._listening = connection
+                    connection.sendall(SUBSCRIBE)
+                    for line in connection.makefile('rb'):
+                        self.hub.dispatch(json.loads(line))
+            except (OSError, ValueError):
+                if not self._closed.is_set():
+                    logger.warning('Event broker connection failed; reconnecting.', exc_info=True)
+            self._closed.wait(self.retry_interval)
+
+
+async def run_broker(host='127.0.0.1', port=8765, started=None):
+    """
+    Serves the TCP broker of ``SocketBroker``: every line published is sent to every subscriber.
+
+    A connection that starts with ``SUBSCRIBE`` receives events, any other connection
+    publishes them. Subscribers that do not keep up are disconnected and reconnect.
+    ``started`` is called with the server once it listens.
+    """
+    subscribers = set()
+
+    async def handle(reader, writer):
+        try:
+            first = await reader.readline()
+            if first == SUBSCRIBE:
+                subscribers.add(writer)
+                await reader.read()
+                return
+            line = first
+            while line:
+                for subscriber in list(subscribers):
+                    if subscriber.transport.get_write_buffer_size() > 1024 * 1024:
+                        subscribers.discard(subscriber)
+                        subscriber.close()
+                    else:
+                        subscriber.write(line)
+                line = await reader.readline()
+        except ConnectionError:
+            pass
+        finally:
+            subscribers.discard(writer)
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    if started is not None:
+        started(server)
+    async with server:
+        await server.serve_forever()
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    """
+    Returns the process-wide broker configured by the ``EVENT_STREAM`` setting.
+    """
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                config = get_event_settings()
+                _broker = import_string(config['BROKER'])(
+                    hub, host=config['BROKER_HOST'], port=config['BROKER_PORT'])
+    return _broker
+
+
+def publish_changes(entries):
+    """
+    Publishes committed product ``ChangeLog`` entries to the event stream.
+    """
+    broker = get_broker()
+    for entry in entries:
+        broker.publish({'seq': entry.seq, 'id': entry.object_id, 'action': entry.action})
+
+
+class CancelOnDisconnectMiddleware:
+    """
+    ASGI middleware that cancels the requests to ``paths`` when the client disconnects.
+
+    Django 4.2 only reads the ASGI receive channel for the request body, so an endless
+    streaming response would keep running after its client left. Once the body was read,
+    this waits for ``http.disconnect`` next to the application and cancels it.
+    """
+
+    def __init__(self, application, paths):
+        self.application = application
+        self.paths = tuple(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not scope['path'].startswith(self.paths):
+            return await self.application(scope, receive, send)
+        body_read = asyncio.Event()
+
+        async def receive_body():
+            message = await receive()
+            if message['type'] != 'http.request' or not message.get('more_body'):
+                body_read.set()
+            return message
+
+        async def wait_for_disconnect():
+            await body_read.wait()
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+
+        application = asyncio.ensure_future(self.application(scope, receive_body, send))
+        disconnect = asyncio.ensure_future(wait_for_disconnect())
+        try:
+            await asyncio.wait({application, disconnect}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in (application, disconnect):
+                if not task.done():
+                    task.cancel()
+                    with suppress(asyncio.CancelledError):
+                        await task
+        if application.done() and not application.cancelled():
+            application.result()
@@ -0,0 +1,61 @@
+import csv
+import io
+import json
+from itertools import islice
+
+from products.serializers import ProductSerializer
+
+CHUNK_SIZE = 2000
+FORMATS = ('jsonl', 'csv')
+CONTENT_TYPES = {'jsonl': 'application/x-ndjson', 'csv': 'text/csv'}
+
+EXPORT_FIELDS = ['id', 'sku', 'name', 'price', 'description', 'created_at', 'updated_at']
+
+
+def iter_product_chunks(queryset, chunk_size=CHUNK_SIZE):
+    """
+    Yields lists of at most ``chunk_size`` product dicts, each with its list of brand ids.
+
+    Rows are read through ``iterator(chunk_size=...)``, which uses a server-side cursor on
+    PostgreSQL, and represented with ``ProductSerializer.represent_rows``, which fetches the
+    brands of each chunk with a single through-table query. Memory use is bounded by the chunk
+    size and the output matches the API representation.
+    """
+    rows = queryset.order_by('id').values(*ProductSerializer.values_fields()).iterator(chunk_size=chunk_size)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        yield ProductSerializer.represent_rows(chunk)
+
+
+def export_jsonl(queryset, chunk_size=CHUNK_SIZE):
+    """
+    Yields the products of a queryset as JSON Lines, one encoded chunk at a time.
+    """
+    for products in iter_product_chunks(queryset, chunk_size):
+        yield ''.join(json.dumps(product, ensure_ascii=False) + '\n' for product in products).encode()
+
+
+def export_csv(queryset, chunk_size=CHUNK_SIZE):
+    """
+    Yields the products of a queryset as CSV, one encoded chunk at a time.
+
+    Brand ids are joined with semicolons, the format accepted by the CSV importer.
+    """
+    header = EXPORT_FIELDS + ['brand']
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    for products in iter_product_chunks(queryset, chunk_size):
+        for product in products:
+            product['brand'] = ';'.join(str(brand) for brand in product['brand'])
+            writer.writerow([product[name] for name in header])
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+EXPORTERS = {'jsonl': export_jsonl, 'csv': export_csv}
@@ -0,0 +1,116 @@
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend, OrderingFilter
+
+from products.models import Product
+from products.search import search_products
+
+
+def parse_id_list(name, value):
+    try:
+        return [int(item) for item in value.split(',') if item.strip()]
+    except ValueError:
+        raise ValidationError({name: ['Must be a comma separated list of ids.']})
+
+
+def parse_decimal(name, value):
+    try:
+        return Decimal(value)
+    except InvalidOperation:
+        raise ValidationError({name: ['A valid number is required.']})
+
+
+def parse_aware_datetime(name, value):
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise ValidationError({name: ['Must be an ISO 8601 datetime.']})
+    return timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed
+
+
+def parse_bool(name, value):
+    if value.lower() in ('1', 'true', 'yes'):
+        return True
+    if value.lower() in ('0', 'false', 'no'):
+        return False
+    raise ValidationError({name: ['Must be true or false.']})
+
+
+class ProductFilterBackend(BaseFilterBackend):
+    """
+    Filters products by brand, price range, stock availability and update time.
+
+    Every filter maps to an indexed column: ``brand`` uses an ``EXISTS`` on the brand
+    through table (covered by its ``(brand_id, product_id)`` index) so products linked to
+    several matching brands are not duplicated.
+    """
+    params = {
+        'brand': 'Comma separated brand ids; products linked to any of them.',
+        'min_price': 'Minimum price, inclusive.',
+        'max_price': 'Maximum price, inclusive.',
+        'in_stock': 'true for products with sku > 0, false for products out of stock.',
+        'updated_after': 'ISO 8601 datetime; products updated at or after it.',
+        'updated_before': 'ISO 8601 datetime; products updated before it.',
+    }
+
+    def filter_queryset(self, request, queryset, view):
+        params = request.query_params
+        if params.get('brand'):
+            brand_ids = parse_id_list('brand', params['brand'])
+            through = Product.brand.through.objects.filter(product_id=OuterRef('pk'), brand_id__in=brand_ids)
+            queryset = queryset.filter(Exists(through))
+        if params.get('min_price'):
+            queryset = queryset.filter(price__gte=parse_decimal('min_price', params['min_price']))
+        if params.get('max_price'):
+            queryset = queryset.filter(price__lte=parse_decimal('max_price', params['max_price']))
+        if params.get('in_stock'):
+            in_stock = parse_bool('in_stock', params['in_stock'])
+            queryset = queryset.filter(sku__gt=0) if in_stock else queryset.filter(sku=0)
+        if params.get('updated_after'):
+            queryset = queryset.filter(updated_at__gte=parse_aware_datetime('updated_after', params['updated_after']))
+        if params.get('updated_before'):
+            queryset = queryset.filter(updated_at__lt=parse_aware_datetime('updated_before', params['updated_before']))
+        return queryset
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {'name': name, 'required': False, 'in': 'query', 'description': description, 'schema': {'type': 'string'}}
+            for name, description in self.params.items()
+        ]
+
+
+class ProductSearchFilter(BaseFilterBackend):
+    """
+    Full-text search on product name and description with the ``search`` query parameter.
+    """
+    search_param = 'search'
+
+    def filter_queryset(self, request, queryset, view):
+        text = request.query_params.get(self.search_param, '').strip()
+        if not text:
+            return queryset
+        return search_products(queryset, text)
+
+    def get_schema_operation_parameters(self, view):
+        return [{
+            'name': self.search_param,
+            'required': False,
+            'in': 'query',
+            'description': 'Words to search for in the product name and description.',
+            'schema': {'type': 'string'},
+        }]
+
+
+class ProductOrderingFilter(OrderingFilter):
+    """
+    Whitelisted ordering that always ends with ``id`` so pages are stable when values tie.
+    """
+
+    def get_ordering(self, request, queryset, view):
+        ordering = list(super().get_ordering(request, queryset, view) or [])
+        if not {'id', '-id'} & set(ordering):
+            ordering.append('-id' if ordering and ordering[0].startswith('-') else 'id')
+        return ordering
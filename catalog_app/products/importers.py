@@ -0,0 +1,247 @@
+import csv
+import io
+import json
+import re
+from collections import Counter, defaultdict
+from itertools import islice
+
+from django.core.management.color import no_style
+from django.db import connections, router, transaction
+
+from products.brand_counts import adjust_product_counts, count_links
+from products.dispatch import products_imported
+from products.models import Brand, Notification, Product
+from products.prices import record_prices
+from products.serializers import ProductImportSerializer
+
+CHUNK_SIZE = 500
+MAX_REPORTED_ERRORS = 100
+FORMATS = ('csv', 'jsonl')
+
+UPDATE_FIELDS = ['sku', 'name', 'price', 'description', 'updated_at']
+
+# Product columns upserted rows may leave out, keeping the stored value.
+OPTIONAL_FIELDS = {'sku'}
+
+
+class ImportResult:
+    """
+    Summary of a bulk product import.
+
+    created: int
+        Number of products created.
+
+    updated: int
+        Number of existing products overwritten.
+
+    failed: int
+        Number of rows rejected by validation.
+
+    errors: list
+        ``{'line', 'errors'}`` dicts for the first ``MAX_REPORTED_ERRORS`` rejected rows.
+    """
+
+    def __init__(self):
+        self.created = 0
+        self.updated = 0
+        self.failed = 0
+        self.errors = []
+
+    def add_error(self, line, errors):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line, 'errors': errors})
+
+    def as_dict(self):
+        return {'created': self.created, 'updated': self.updated, 'failed': self.failed, 'errors': self.errors}
+
+
+def as_text(stream):
+    """
+    Wraps a binary stream so it can be read line by line as UTF-8 text.
+    """
+    if isinstance(stream, io.TextIOBase):
+        return stream
+    return io.TextIOWrapper(stream, encoding='utf-8', newline='')
+
+
+def iter_csv_rows(stream):
+    """
+    Yields ``(line, row)`` tuples from a CSV stream with a header row.
+
+    The ``brand`` column holds brand ids separated by commas, semicolons, pipes or spaces.
+    """
+    reader = csv.DictReader(as_text(stream))
+    for row in reader:
+        row = {key: value for key, value in row.items() if key and value != ''}
+        if 'brand' in row:
+            row['brand'] = [brand for brand in re.split(r'[,;|\s]+', row['brand']) if brand]
+        yield reader.line_num, row
+
+
+def iter_jsonl_rows(stream):
+    """
+    Yields ``(line, row)`` tuples from a JSON Lines stream, skipping blank lines.
+    """
+    for line, text in enumerate(as_text(stream), start=1):
+        if not text.strip():
+            continue
+        try:
+            row = json.loads(text)
+        except ValueError as e:
+            row = {'__error__': f'Invalid JSON: {e}'}
+        yield line, row
+
+
+def iter_rows(stream, file_format):
+    """
+    Yields ``(line, row)`` tuples from a CSV or JSON Lines stream.
+    """
+    if file_format == 'csv':
+        return iter_csv_rows(stream)
+    if file_format == 'jsonl':
+        return iter_jsonl_rows(stream)
+    raise ValueError(f'Unsupported import format: {file_format}')
+
+
+def guess_format(name):
+    """
+    Returns the import format matching a file name extension, or None.
+    """
+    name = (name or '').lower()
+    if name.endswith('.csv'):
+        return 'csv'
+    if name.endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    return None
+
+
+def import_products(rows, chunk_size=CHUNK_SIZE, notify=True):
+    """
+    Creates or overwrites products from an iterable of ``(line, row)`` tuples.
+
+    Rows are consumed ``chunk_size`` at a time, so memory use does not depend on the
+    input size. Each chunk is validated with ``ProductImportSerializer`` against the
+    brands it references (loaded with one query), then written in its own transaction:
+    rows without an ``id`` are bulk created, rows with an ``id`` are upserted with
+    ``bulk_create(update_conflicts=True)``, brand links are replaced in bulk, and new prices are
+    appended to the price history in bulk. An upserted row without ``sku`` or ``brand`` keeps
+    the stock level or brand links of an existing product.
+    No per-product notification is sent; a single digest summarizes the import.
+    """
+    result = ImportResult()
+    rows = iter(rows)
+    inserted_ids = False
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        inserted_ids |= _import_chunk(chunk, result)
+
+    if inserted_ids:
+        advance_id_sequence()
+    if result.created or result.updated:
+        if notify:
+            Notification.objects.create(
+                subject='Product import',
+                message=f'Product import finished: {result.created} created, {result.updated} updated, '
+                        f'{result.failed} failed.',
+            )
+    return result
+
+
+def advance_id_sequence():
+    """
+    Moves the product id sequence past the explicit ids inserted by upserts, never backwards.
+
+    Lowering it would hand out again ids taken by inserts that have not committed yet. Only
+    PostgreSQL needs this: SQLite and MySQL continue after the highest id on their own.
+    """
+    using = router.db_for_write(Product)
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        if connection.vendor != 'postgresql':
+            for sql in connection.ops.sequence_reset_sql(no_style(), [Product]):
+                cursor.execute(sql)
+            return
+        table = Product._meta.db_table
+        cursor.execute('SELECT pg_get_serial_sequence(%s, %s)', [table, Product._meta.pk.column])
+        sequence = cursor.fetchone()[0]
+        quoted_table = connection.ops.quote_name(table)
+        cursor.execute(
+            f'SELECT setval(%s::regclass, max_id) FROM (SELECT MAX(id) AS max_id FROM {quoted_table}) ids, '
+            f'{sequence} WHERE max_id > last_value', [sequence])
+
+
+def _import_chunk(chunk, result):
+    """
+    Imports a chunk of rows; returns True when upserts inserted products with explicit ids.
+    """
+    brand_ids = set()
+    for _, row in chunk:
+        if isinstance(row, dict) and isinstance(row.get('brand'), list):
+            brand_ids.update(brand for brand in row['brand'] if str(brand).isdigit())
+    context = {'brand_ids': set(Brand.objects.filter(pk__in=brand_ids).values_list('pk', flat=True))}
+
+    valid = []
+    for line, row in chunk:
+        if not isinstance(row, dict) or '__error__' in row:
+            result.add_error(line, {'non_field_errors': [row.get('__error__') if isinstance(row, dict) else
+                                                         'Each line must be a JSON object.']})
+            continue
+        serializer = ProductImportSerializer(data=row, context=context)
+        if serializer.is_valid():
+            valid.append(serializer.validated_data)
+        else:
+            result.add_error(line, serializer.errors)
+    if not valid:
+        return False
+
+    with transaction.atomic():
+        upsert_ids = [data['id'] for data in valid if 'id' in data]
+        existing_prices = dict(Product.objects.filter(pk__in=upsert_ids).values_list('pk', 'price'))
+        existing_ids = set(existing_prices)
+
+        new_products, upserts = [], []
+        for data in valid:
+            fields = {key: value for key, value in data.items() if key != 'brand'}
+            if 'id' in data:
+                upserts.append((Product(**fields), data.get('brand'), set(fields)))
+            else:
+                new_products.append((Product(**fields), data.get('brand')))
+
+        Product.objects.bulk_create([product for product, _ in new_products])
+        # Duplicate ids within a chunk would make the upsert touch the same row twice; the last row wins.
+        by_id = {product.pk: (product, brands, provided) for product, brands, provided in upserts}
+        by_fields = defaultdict(list)
+        for product, _, provided in by_id.values():
+            # columns left out of a row keep their stored value
+            by_fields[tuple(field for field in UPDATE_FIELDS
+                            if field not in OPTIONAL_FIELDS or field in provided)].append(product)
+        for update_fields, products in by_fields.items():
+            Product.objects.bulk_create(
+                products, update_conflicts=True, unique_fields=['id'], update_fields=list(update_fields))
+        unique_upserts = [(product, brands) for product, brands, _ in by_id.values()]
+
+        linked = [(product, brands) for product, brands in new_products + unique_upserts if brands is not None]
+        Through = Product.brand.through
+        links = Through.objects.filter(product_id__in=[product.pk for product, _ in linked])
+        old_links = count_links(links)
+        links.delete()
+        Through.objects.bulk_create(
+            [Through(product_id=product.pk, brand_id=brand) for product, brands in linked for brand in set(brands)],
+            ignore_conflicts=True)
+        new_links = Counter(brand for _, brands in linked for brand in set(brands))
+        adjust_product_counts({brand: new_links[brand] - old_links[brand] for brand in old_links | new_links})
+
+        record_prices([(product.pk, product.price) for product, _ in new_products + unique_upserts
+                       if product.pk not in existing_prices or existing_prices[product.pk] != product.price])
+
+        created_ids = [product.pk for product, _ in new_products]
+        created_ids += [product.pk for product, _ in unique_upserts if product.pk not in existing_ids]
+        updated_ids = [product.pk for product, _ in unique_upserts if product.pk in existing_ids]
+        products_imported.send(sender=Product, created_ids=created_ids, updated_ids=updated_ids)
+
+    result.created += len(created_ids)
+    result.updated += len(updated_ids)
+    return any(product.pk not in existing_ids for product, _ in unique_upserts)
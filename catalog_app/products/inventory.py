@@ -0,0 +1,60 @@
+from django.db import models, transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+
+from products.dispatch import inventory_changed
+from products.models import Product
+
+BATCH_SIZE = 500
+
+
+def batched(items, size=BATCH_SIZE):
+    """
+    Yields successive lists of at most ``size`` items.
+    """
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def apply_stock_adjustments(lines, batch_size=BATCH_SIZE):
+    """
+    Applies a list of ``(product_id, delta)`` stock adjustments in a single transaction.
+
+    The affected rows are locked and read once, the lines are checked in order against the
+    running stock level, and the accepted deltas are written with one
+    ``UPDATE ... SET sku = sku + CASE id WHEN ... END`` statement per batch of products.
+    Lines for unknown products or that would make the stock negative are skipped.
+
+    Returns a ``(applied, failed)`` tuple with the number of applied lines and a list of
+    ``{'index', 'product', 'delta', 'error'}`` dicts describing the rejected ones.
+    """
+    with transaction.atomic():
+        stock = {}
+        for chunk in batched({product_id for product_id, _ in lines}, batch_size):
+            stock.update(Product.objects.select_for_update().filter(pk__in=chunk).values_list('pk', 'sku'))
+
+        applied, failed, totals = 0, [], {}
+        for index, (product_id, delta) in enumerate(lines):
+            if product_id not in stock:
+                error = 'Product does not exist.'
+            elif stock[product_id] + delta < 0:
+                error = 'Not enough inventory for this product.'
+            else:
+                stock[product_id] += delta
+                totals[product_id] = totals.get(product_id, 0) + delta
+                applied += 1
+                continue
+            failed.append({'index': index, 'product': product_id, 'delta': delta, 'error': error})
+
+        changed = [product_id for product_id, total in totals.items() if total]
+        now = timezone.now()
+        for chunk in batched(changed, batch_size):
+            delta = Case(
+                *[When(pk=product_id, then=Value(totals[product_id])) for product_id in chunk],
+                output_field=models.IntegerField())
+            Product.objects.filter(pk__in=chunk).update(sku=F('sku') + delta, updated_at=now)
+
+        if changed:
+            inventory_changed.send(sender=Product, product_ids=changed)
+    return applied, failed
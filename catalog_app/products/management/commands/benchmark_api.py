@@ -0,0 +1,148 @@
+import json
+import platform
+from contextlib import contextmanager
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from products.benchmarking import (QueryCountingApplication, api_workload, asgi_load_test, benchmark_database,
+                                   compare_results, load_test, seed_catalog, summarize_load, wsgi_load_test,
+                                   wsgi_server)
+from products.counters import get_view_counter
+from products.metrics import get_metrics_settings
+from products.models import Product
+from products.throttling import get_throttle_settings
+
+
+class Command(BaseCommand):
+    """
+    Seeds a throwaway copy of the database, serves the real URL routes from a local threaded
+    WSGI server and load tests the main API endpoints with concurrent keep-alive clients.
+
+    With ``--driver wsgi`` or ``--driver asgi`` the requests are sent to the WSGI or ASGI
+    application inside this process instead, from threads or asyncio tasks. The ASGI driver
+    serves the product reads with the native async views (``catalog_app.asgi_urls``), so the two
+    drivers compare the sync and async request paths without any server in between.
+
+    Results can be saved as a JSON baseline and later runs compared against it.
+    """
+    help = 'Load test the catalog API and report latency, throughput and query counts per endpoint.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=10000, help='Number of products to seed.')
+        parser.add_argument('--brands', type=int, default=500, help='Number of brands to seed.')
+        parser.add_argument('--requests', type=int, default=500, help='Number of requests per endpoint.')
+        parser.add_argument('--concurrency', type=int, default=8, help='Number of concurrent clients.')
+        parser.add_argument('--driver', choices=['http', 'wsgi', 'asgi'], default='http',
+                            help='Send requests over HTTP to a local WSGI server, or in process to the '
+                                 'WSGI or ASGI application.')
+        parser.add_argument('--endpoint', action='append', dest='endpoints', help='Only run this endpoint.')
+        parser.add_argument('--keepdb', action='store_true', help='Reuse the seeded test database between runs.')
+        parser.add_argument('--save', help='Write the results as a JSON baseline to this path.')
+        parser.add_argument('--compare', help='Compare the results with the JSON baseline at this path.')
+        parser.add_argument('--threshold', type=float, default=1.25,
+                            help='p95 ratio over the baseline reported as a regression.')
+
+    def handle(self, *args, **options):
+        baseline = json.loads(Path(options['compare']).read_text()) if options['compare'] else None
+        # every request comes from one client, which the throttles would soon refuse
+        overrides = {'ALLOWED_HOSTS': ['127.0.0.1'], 'THROTTLING': {**get_throttle_settings(), 'ENABLED': False}}
+        if options['driver'] != 'http':
+            # the in-process drivers read the query counts from the Server-Timing header
+            overrides['PERFORMANCE_METRICS'] = {**get_metrics_settings(), 'SERVER_TIMING': True}
+        if options['driver'] == 'asgi':
+            overrides['ROOT_URLCONF'] = 'catalog_app.asgi_urls'
+        with benchmark_database(keepdb=options['keepdb']), override_settings(**overrides):
+            if not Product.objects.exists():
+                self.stderr.write(f"Seeding {options['products']} products...")
+                seed_catalog(products=options['products'], brands=options['brands'])
+            results = {
+                'meta': {
+                    'vendor': connection.vendor,
+                    'products': Product.objects.count(),
+                    'requests': options['requests'],
+                    'concurrency': options['concurrency'],
+                    'driver': options['driver'],
+                    'python': platform.python_version(),
+                    'django': django.get_version(),
+                    'created_at': timezone.now().isoformat(),
+                },
+                'endpoints': self.run_endpoints(options),
+            }
+
+        for name, result in results['endpoints'].items():
+            timings = result['latency_ms']
+            self.stdout.write(
+                f"{name}: p50={timings['p50']}ms p95={timings['p95']}ms p99={timings['p99']}ms "
+                f"{result['throughput_rps']} req/s {result['queries_per_request']} queries/req "
+                f"statuses={result['statuses']}")
+        if options['save']:
+            Path(options['save']).write_text(json.dumps(results, indent=2) + '\n')
+            self.stdout.write(f"Saved results to {options['save']}.")
+        if baseline is not None:
+            self.report_comparison(baseline, results, options['threshold'])
+
+    def run_endpoints(self, options):
+        admin = get_user_model().objects.filter(username='benchmark').first()
+        if admin is None:
+            admin = get_user_model().objects.create_superuser('benchmark', 'benchmark@example.com', 'benchmark')
+        client = Client()
+        client.force_login(admin)
+        session = {'Cookie': f'{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}'}
+
+        workload = api_workload(options['requests'])
+        unknown = set(options['endpoints'] or []) - set(workload)
+        if unknown:
+            raise CommandError(f'Unknown endpoints: {", ".join(sorted(unknown))}.')
+        results = {}
+        with self.driver(options['driver']) as run:
+            for name, (paths, authenticated) in workload.items():
+                if options['endpoints'] and name not in options['endpoints']:
+                    continue
+                headers = session if authenticated else {}
+                # warm up connections, caches and the query planner before measuring
+                run(paths[:options['concurrency']], options['concurrency'], headers)
+                results[name] = summarize_load(run(paths, options['concurrency'], headers))
+        # write the buffered anonymous views while the benchmark database still exists
+        get_view_counter().flush()
+        return results
+
+    @contextmanager
+    def driver(self, name):
+        """
+        Yields a ``run(paths, concurrency, headers)`` function sending the requests with the given driver.
+        """
+        if name == 'wsgi':
+            application = get_wsgi_application()
+            yield lambda *args: wsgi_load_test(application, *args)
+        elif name == 'asgi':
+            application = get_asgi_application()
+            yield lambda *args: asgi_load_test(application, *args)
+        else:
+            with wsgi_server(QueryCountingApplication(get_wsgi_application())) as base_url:
+                yield lambda *args: load_test(base_url, *args)
+
+    def report_comparison(self, baseline, results, threshold):
+        for key in ('vendor', 'products', 'concurrency', 'driver'):
+            if baseline['meta'].get(key) != results['meta'][key]:
+                self.stderr.write(self.style.WARNING(
+                    f"The baseline was recorded with {key}={baseline['meta'].get(key)}, "
+                    f"this run used {results['meta'][key]}."))
+        regressions = []
+        self.stdout.write(self.style.MIGRATE_HEADING('Compared with the baseline (p95)'))
+        for name, old, new, ratio, regressed in compare_results(baseline, results, threshold):
+            line = f'  {name}: {old}ms -> {new}ms ({ratio}x)'
+            self.stdout.write(self.style.ERROR(line) if regressed else line)
+            if regressed:
+                regressions.append(name)
+        if regressions:
+            raise CommandError(f'Regressions in: {", ".join(regressions)}.')
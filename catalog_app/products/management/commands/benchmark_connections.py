@@ -0,0 +1,42 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from products.benchmarking import connection_overhead, connection_profiles, connection_settings
+
+
+class Command(BaseCommand):
+    """
+    Measures the per-request cost of getting a database connection with new connections per
+    request, persistent connections and, when configured, the psycopg connection pool.
+
+    Every simulated request runs ``SELECT 1`` between the request signals, so the difference
+    between the profiles is the connection overhead.
+    """
+    help = 'Compare per-request database connection overhead across connection settings.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help='Number of requests per profile.')
+        parser.add_argument('--database', default='default', help='Database alias to connect to.')
+        parser.add_argument('--json', action='store_true', help='Print the results as JSON.')
+
+    def handle(self, *args, **options):
+        alias = options['database']
+        if alias not in connections:
+            raise CommandError(f'Unknown database alias: {alias}.')
+        results = {}
+        for name, overrides in connection_profiles(alias).items():
+            with connection_settings(alias, **overrides):
+                # warm up: imports, the pool filling up, the first connection of a persistent profile
+                connection_overhead(min(20, options['requests']), alias)
+                results[name] = connection_overhead(options['requests'], alias)
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        self.stdout.write(self.style.MIGRATE_HEADING(f"{connections[alias].vendor}, {options['requests']} requests"))
+        for name, result in results.items():
+            timings = result['latency_ms']
+            self.stdout.write(f"  {name}: p50={timings['p50']}ms p95={timings['p95']}ms p99={timings['p99']}ms "
+                              f"connections opened={result['connections']}")
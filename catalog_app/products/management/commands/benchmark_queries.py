@@ -0,0 +1,55 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from products.benchmarking import (benchmark_database, catalog_queries, seed_catalog, summarize, time_queryset,
+                                   without_indexes)
+from products.models import Product
+
+
+class Command(BaseCommand):
+    """
+    Seeds a throwaway copy of the database and reports query plans and latencies of the
+    catalog's hot queries, with and without the product indexes.
+    """
+    help = 'Benchmark the catalog queries against a seeded test database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100000, help='Number of products to seed.')
+        parser.add_argument('--brands', type=int, default=1000, help='Number of brands to seed.')
+        parser.add_argument('--repeat', type=int, default=20, help='Number of timed runs per query.')
+        parser.add_argument('--keepdb', action='store_true', help='Reuse the seeded test database between runs.')
+        parser.add_argument('--json', action='store_true', help='Print the results as JSON.')
+
+    def handle(self, *args, **options):
+        with benchmark_database(keepdb=options['keepdb']):
+            if not Product.objects.exists():
+                self.stderr.write(f"Seeding {options['products']} products...")
+                seed_catalog(products=options['products'], brands=options['brands'])
+            results = {}
+            for label, indexed in (('without_indexes', False), ('with_indexes', True)):
+                if indexed:
+                    results[label] = self.run_queries(options['repeat'])
+                else:
+                    with without_indexes(Product):
+                        results[label] = self.run_queries(options['repeat'])
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        for label, queries in results.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(label))
+            for name, result in queries.items():
+                timings = result['latency_ms']
+                self.stdout.write(f"  {name}: p50={timings['p50']}ms p95={timings['p95']}ms p99={timings['p99']}ms")
+                for line in result['plan'].splitlines():
+                    self.stdout.write(f'    {line}')
+
+    def run_queries(self, repeat):
+        results = {}
+        for name, make_queryset in catalog_queries().items():
+            results[name] = {
+                'plan': make_queryset().explain(),
+                'latency_ms': summarize(time_queryset(make_queryset, repeat)),
+            }
+        return results
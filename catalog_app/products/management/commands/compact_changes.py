@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from products.changes import compact_changes
+
+
+class Command(BaseCommand):
+    """
+    Background job that keeps the change log proportional to the catalog plus the recent deletes.
+    """
+    help = 'Delete superseded change log entries and purge tombstones older than the retention.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep compacting instead of exiting.')
+        parser.add_argument('--interval', type=float, default=3600, help='Seconds to sleep between runs with --loop.')
+        parser.add_argument('--retention', type=int, dest='tombstone_retention',
+                            help='Seconds tombstones are kept for before they are purged.')
+
+    def handle(self, *args, **options):
+        while True:
+            deleted = compact_changes(tombstone_retention=options['tombstone_retention'])
+            self.stdout.write(f"{deleted['superseded']} superseded changes, {deleted['purged']} tombstones purged")
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
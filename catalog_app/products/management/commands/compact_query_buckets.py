@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from products.analytics import compact_query_buckets
+
+
+class Command(BaseCommand):
+    """
+    Background job that rolls the product query buckets up into hour and day aggregates.
+    """
+    help = 'Fold minute query buckets into hour and day rollups and purge expired fine buckets.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep compacting instead of exiting.')
+        parser.add_argument('--interval', type=float, default=60, help='Seconds to sleep between runs with --loop.')
+        parser.add_argument('--grace', type=int, help='Seconds a bucket must be closed for before it is compacted.')
+
+    def handle(self, *args, **options):
+        while True:
+            written = compact_query_buckets(grace=options['grace'])
+            self.stdout.write(', '.join(f'{count} {resolution} buckets' for resolution, count in written.items()))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from products.counters import get_view_counter
+
+
+class Command(BaseCommand):
+    """
+    Writes the buffered anonymous product views to the Query table.
+
+    With the in-process backend this only flushes the views buffered by the command's
+    own process; use a shared cache backend to flush the views collected by the web workers.
+    """
+    help = 'Flush buffered anonymous product view counts to the database.'
+
+    def handle(self, *args, **options):
+        flushed = get_view_counter().flush()
+        self.stdout.write(self.style.SUCCESS(f'Flushed view counts for {flushed} products.'))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from products.importers import CHUNK_SIZE, FORMATS, guess_format, import_products, iter_rows
+
+
+class Command(BaseCommand):
+    """
+    Creates or overwrites products from a CSV or JSON Lines file, streaming it in chunks.
+    """
+    help = 'Bulk import products from a CSV or JSON Lines file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Path of the file to import.')
+        parser.add_argument('--format', choices=FORMATS, help='File format; guessed from the extension by default.')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Number of rows written per batch.')
+        parser.add_argument('--no-notify', action='store_true', help='Do not queue the import digest for admins.')
+
+    def handle(self, *args, **options):
+        file_format = options['format'] or guess_format(options['path'])
+        if file_format is None:
+            raise CommandError('Cannot guess the file format, use --format.')
+        with open(options['path'], 'rb') as stream:
+            result = import_products(
+                iter_rows(stream, file_format), chunk_size=options['chunk_size'], notify=not options['no_notify'])
+        for error in result.errors:
+            self.stderr.write(f"Line {error['line']}: {error['errors']}")
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported products: {result.created} created, {result.updated} updated, {result.failed} failed.'))
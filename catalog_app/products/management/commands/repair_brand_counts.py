@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from products.brand_counts import repair_product_counts
+
+
+class Command(BaseCommand):
+    """
+    Background job that recounts the products of every brand and fixes the counters that drifted,
+    e.g. after links were written with raw SQL or a bulk insert.
+    """
+    help = 'Recount the products of every brand and repair the drifted product_count counters.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Brands recounted per query.')
+        parser.add_argument('--loop', action='store_true', help='Keep repairing instead of exiting.')
+        parser.add_argument('--interval', type=float, default=24 * 3600,
+                            help='Seconds to sleep between runs with --loop.')
+
+    def handle(self, *args, **options):
+        while True:
+            repaired = repair_product_counts(options['batch_size'])
+            self.stdout.write(f'{repaired} brand counters repaired')
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,27 @@
+import asyncio
+
+from django.core.management.base import BaseCommand
+
+from products.events import get_event_settings, run_broker
+
+
+class Command(BaseCommand):
+    """
+    Local stand-in for a pub/sub server, relaying product change events between the ASGI workers
+    configured with ``products.events.SocketBroker``.
+    """
+    help = 'Relay product change events between the workers serving the event stream.'
+
+    def add_arguments(self, parser):
+        config = get_event_settings()
+        parser.add_argument('--host', default=config['BROKER_HOST'], help='Address to listen on.')
+        parser.add_argument('--port', type=int, default=config['BROKER_PORT'], help='Port to listen on.')
+
+    def handle(self, *args, **options):
+        def started(server):
+            self.stdout.write(f"Relaying events on {options['host']}:{options['port']}")
+
+        try:
+            asyncio.run(run_broker(options['host'], options['port'], started))
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from products.notifications import deliver_pending_notifications
+
+
+class Command(BaseCommand):
+    """
+    Background worker that emails the admin notifications waiting in the outbox.
+    """
+    help = 'Deliver pending product change notifications as coalesced email digests.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep polling the outbox instead of exiting.')
+        parser.add_argument('--interval', type=float, default=5, help='Seconds to sleep between polls with --loop.')
+        parser.add_argument('--window', type=int, help='Seconds of changes to a product coalesced into one digest.')
+        parser.add_argument('--workers', type=int, help='Number of threads sending emails.')
+        parser.add_argument('--batch-size', type=int, help='Number of digests sent per email connection.')
+
+    def handle(self, *args, **options):
+        overrides = {key: options[key] for key in ('window', 'workers', 'batch_size')}
+        while True:
+            sent, failed = deliver_pending_notifications(**overrides)
+            if sent or failed or not options['loop']:
+                self.stdout.write(f'Sent {sent} notification digests, {failed} failed.')
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,227 @@
+import bisect
+import contextvars
+import logging
+import random
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+
+slow_query_logger = logging.getLogger('products.slow_queries')
+
+DEFAULT_PERFORMANCE_METRICS = {
+    'SERVER_TIMING': False,
+    'SLOW_QUERY_MS': 200,
+    'SLOW_QUERY_SAMPLE_RATE': 0.0,
+}
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 50, 100)
+
+
+def get_metrics_settings():
+    """
+    Returns the ``PERFORMANCE_METRICS`` setting merged over the defaults.
+    """
+    return {**DEFAULT_PERFORMANCE_METRICS, **getattr(settings, 'PERFORMANCE_METRICS', {})}
+
+
+class RequestMetrics:
+    """
+    Work done while serving one request, filled in by the middleware, the query timer, the
+    serializers and the product cache.
+    """
+    __slots__ = ('request', 'config', 'db_queries', 'db_seconds', 'serializer_seconds', 'cache_hits',
+                 'cache_misses')
+
+    def __init__(self, request=None, config=None):
+        self.request = request
+        self.config = config or DEFAULT_PERFORMANCE_METRICS
+        self.db_queries = 0
+        self.db_seconds = 0.0
+        self.serializer_seconds = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def server_timing(self, total_seconds):
+        """
+        Returns the value of a ``Server-Timing`` header describing this request.
+        """
+        parts = [
+            f'total;dur={total_seconds * 1000:.1f}',
+            f'db;dur={self.db_seconds * 1000:.1f};desc="{self.db_queries} queries"',
+            f'serializer;dur={self.serializer_seconds * 1000:.1f}',
+        ]
+        if self.cache_hits or self.cache_misses:
+            parts.append(f'cache;desc="{self.cache_hits} hits, {self.cache_misses} misses"')
+        return ', '.join(parts)
+
+
+_current_request = contextvars.ContextVar('request_metrics', default=None)
+
+
+def start_request(request=None, config=None):
+    """
+    Starts collecting the metrics of a new request and returns them with the token to pass to ``end_request``.
+
+    The metrics live in a context variable, so work done in ``sync_to_async`` threads on behalf
+    of an async view is recorded too.
+    """
+    metrics = RequestMetrics(request, config)
+    return metrics, _current_request.set(metrics)
+
+
+def end_request(token):
+    _current_request.reset(token)
+
+
+def time_query(execute, sql, params, many, context):
+    """
+    Database ``execute_wrapper`` installed on every connection that counts and times the queries
+    of the request being served and logs a sample of the slow ones.
+    """
+    metrics = _current_request.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - start
+        metrics.db_queries += 1
+        metrics.db_seconds += elapsed
+        slow_query_ms, sample_rate = metrics.config['SLOW_QUERY_MS'], metrics.config['SLOW_QUERY_SAMPLE_RATE']
+        if sample_rate and slow_query_ms is not None and elapsed * 1000 >= slow_query_ms and random.random() < sample_rate:
+            match = getattr(metrics.request, 'resolver_match', None)
+            slow_query_logger.warning('Slow query on %s (%.1f ms): %s', match and match.url_name, elapsed * 1000, sql)
+
+
+def record_serializer_time(seconds):
+    """
+    Adds serialization time to the request being served, if any.
+    """
+    metrics = _current_request.get()
+    if metrics is not None:
+        metrics.serializer_seconds += seconds
+
+
+def record_cache_lookup(hit):
+    """
+    Counts a product cache hit or miss for the request being served, if any.
+    """
+    metrics = _current_request.get()
+    if metrics is not None:
+        if hit:
+            metrics.cache_hits += 1
+        else:
+            metrics.cache_misses += 1
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram; observations cost a binary search and a few additions.
+    """
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """
+        Returns ``(upper_bound, cumulative_count)`` pairs ending with ``+Inf``.
+        """
+        total = 0
+        pairs = []
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            pairs.append(('+Inf' if bound == float('inf') else repr(bound), total))
+        return pairs
+
+
+def _labels(**labels):
+    return ','.join(f'{name}="{value}"' for name, value in labels.items())
+
+
+class MetricsRegistry:
+    """
+    In-process aggregate of the request metrics, keyed by route name.
+
+    Each process (or worker) keeps its own registry; Prometheus adds them up when it
+    scrapes every worker.
+    """
+    histograms = (
+        ('catalog_request_duration_seconds', 'Wall time spent serving requests.', DURATION_BUCKETS),
+        ('catalog_request_db_queries', 'Number of SQL queries per request.', QUERY_COUNT_BUCKETS),
+        ('catalog_request_db_duration_seconds', 'Time spent in SQL queries per request.', DURATION_BUCKETS),
+        ('catalog_request_serializer_duration_seconds', 'Time spent serializing per request.', DURATION_BUCKETS),
+    )
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._histograms = {name: {} for name, _, _ in self.histograms}
+            self._responses = defaultdict(int)
+            self._cache = defaultdict(int)
+
+    def _observe(self, name, key, value):
+        histograms = self._histograms[name]
+        histogram = histograms.get(key)
+        if histogram is None:
+            buckets = next(buckets for metric, _, buckets in self.histograms if metric == name)
+            histogram = histograms[key] = Histogram(buckets)
+        histogram.observe(value)
+
+    def observe_request(self, route, method, status_code, duration, metrics):
+        """
+        Adds one served request to the aggregates.
+        """
+        key = (route, method)
+        with self._lock:
+            self._observe('catalog_request_duration_seconds', key, duration)
+            self._observe('catalog_request_db_queries', key, metrics.db_queries)
+            self._observe('catalog_request_db_duration_seconds', key, metrics.db_seconds)
+            self._observe('catalog_request_serializer_duration_seconds', key, metrics.serializer_seconds)
+            self._responses[(route, method, f'{status_code // 100}xx')] += 1
+            if metrics.cache_hits:
+                self._cache[(route, 'hit')] += metrics.cache_hits
+            if metrics.cache_misses:
+                self._cache[(route, 'miss')] += metrics.cache_misses
+
+    def render(self):
+        """
+        Returns the aggregates in the Prometheus text exposition format.
+        """
+        lines = []
+        with self._lock:
+            for name, description, _ in self.histograms:
+                lines += [f'# HELP {name} {description}', f'# TYPE {name} histogram']
+                for (route, method), histogram in sorted(self._histograms[name].items()):
+                    labels = _labels(route=route, method=method)
+                    for bound, count in histogram.cumulative():
+                        lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {count}')
+                    lines.append(f'{name}_sum{{{labels}}} {histogram.sum}')
+                    lines.append(f'{name}_count{{{labels}}} {histogram.count}')
+            lines += ['# HELP catalog_responses_total Responses by status class.',
+                      '# TYPE catalog_responses_total counter']
+            for (route, method, status), count in sorted(self._responses.items()):
+                lines.append(f'catalog_responses_total{{{_labels(route=route, method=method, status=status)}}} {count}')
+            lines += ['# HELP catalog_product_cache_requests_total Product cache lookups by result.',
+                      '# TYPE catalog_product_cache_requests_total counter']
+            for (route, result), count in sorted(self._cache.items()):
+                lines.append(f'catalog_product_cache_requests_total{{{_labels(route=route, result=result)}}} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
@@ -0,0 +1,95 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from products.metrics import end_request, get_metrics_settings, registry, start_request
+from products.routers import get_replica_settings, track_writes
+
+
+class PerformanceMiddleware:
+    """
+    Measures wall time, SQL queries, serialization time and product cache lookups of every
+    request and aggregates them per route name in ``products.metrics.registry``. Queries are
+    timed by ``products.metrics.time_query``, installed on every database connection.
+
+    With ``PERFORMANCE_METRICS['SERVER_TIMING']`` the measurements are also sent to the client
+    in a ``Server-Timing`` header. Streaming responses are measured up to the point the
+    response object is returned, not while the body is streamed.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        config = get_metrics_settings()
+        metrics, token = start_request(request, config)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            end_request(token)
+        return self.finish(request, response, metrics, config, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        config = get_metrics_settings()
+        metrics, token = start_request(request, config)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            end_request(token)
+        return self.finish(request, response, metrics, config, time.perf_counter() - start)
+
+    def finish(self, request, response, metrics, config, duration):
+        match = request.resolver_match
+        route = (match.url_name or match.route) if match else 'unresolved'
+        registry.observe_request(route, request.method, response.status_code, duration, metrics)
+        if config['SERVER_TIMING']:
+            response['Server-Timing'] = metrics.server_timing(duration)
+        return response
+
+
+class ReplicaPinMiddleware:
+    """
+    Pins a client to the primary database for ``REPLICA_ROUTING['PIN_SECONDS']`` after a request
+    of theirs wrote to it, so their next reads see the write even if the replicas lag behind.
+
+    The pin is a cookie read by ``products.routers.replica_reads``. Only unsafe methods pin:
+    GET requests that write on the side, like flushing the view counter, do not.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        with track_writes() as writes:
+            response = self.get_response(request)
+        return self.finish(request, response, writes)
+
+    async def __acall__(self, request):
+        with track_writes() as writes:
+            response = await self.get_response(request)
+        return self.finish(request, response, writes)
+
+    def finish(self, request, response, writes):
+        if writes.wrote and request.method not in ('GET', 'HEAD', 'OPTIONS', 'TRACE'):
+            config = get_replica_settings()
+            response.set_cookie(config['PIN_COOKIE'], '1', max_age=config['PIN_SECONDS'], httponly=True,
+                                samesite='Lax')
+        return response
@@ -0,0 +1,50 @@
+# Generated by Django 4.2 on 2026-10-18 17:59
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def merge_duplicate_queries(apps, schema_editor):
+    """
+    Fold duplicate Query rows created by concurrent get_or_create calls into one row per product.
+    """
+    Query = apps.get_model('products', 'Query')
+    duplicates = (Query.objects.values('product_id').order_by()
+                  .annotate(rows=Count('id'), keep=Min('id'), total=Sum('count')).filter(rows__gt=1))
+    for duplicate in duplicates.iterator():
+        Query.objects.filter(pk=duplicate['keep']).update(count=duplicate['total'])
+        Query.objects.filter(product_id=duplicate['product_id']).exclude(pk=duplicate['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0002_notification'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['updated_at', 'id'], name='product_updated_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['name'], name='product_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['sku'], name='product_sku_idx'),
+        ),
+        # Covers brand -> products lookups with an index-only scan; the auto-created
+        # unique (product_id, brand_id) constraint already covers product -> brands.
+        migrations.RunSQL(
+            'CREATE INDEX products_product_brand_brand_product_idx '
+            'ON products_product_brand (brand_id, product_id)',
+            'DROP INDEX products_product_brand_brand_product_idx',
+        ),
+        migrations.RunPython(merge_duplicate_queries, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='query',
+            constraint=models.UniqueConstraint(fields=('product',), name='unique_query_product'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations, models
+
+FTS_TABLE = 'products_product_fts'
+SEARCH_INDEX = 'product_search_idx'
+
+
+def create_search_index(apps, schema_editor):
+    """
+    Create the full-text index for the current database: a GIN index over the
+    name/description tsvector on PostgreSQL, or an FTS5 table on SQLite.
+    """
+    Product = apps.get_model('products', 'Product')
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.add_index(
+            Product, GinIndex(SearchVector('name', 'description', config='english'), name=SEARCH_INDEX))
+    elif vendor == 'sqlite':
+        schema_editor.execute(f'CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(name, description)')
+        schema_editor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, name, description) SELECT id, name, description FROM products_product')
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(f'DROP INDEX IF EXISTS {SEARCH_INDEX}')
+    elif vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0003_catalog_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['price'], name='product_price_idx'),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.2 on 2026-10-18 19:32
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_product_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QueryCompaction',
+            fields=[
+                ('resolution', models.CharField(choices=[('minute', 'Minute'), ('hour', 'Hour'), ('day', 'Day')], max_length=6, primary_key=True, serialize=False)),
+                ('compacted_until', models.DateTimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='QueryBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resolution', models.CharField(choices=[('minute', 'Minute'), ('hour', 'Hour'), ('day', 'Day')], max_length=6)),
+                ('start', models.DateTimeField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='query_buckets', to='products.product')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='querybucket',
+            index=models.Index(fields=['resolution', 'start'], name='query_bucket_window_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='querybucket',
+            index=models.Index(fields=['product', 'resolution', 'start'], name='query_bucket_product_idx'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 4.2 on 2026-10-18 20:12
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+def log_existing_objects(apps, schema_editor):
+    """
+    Start the change log with an upsert of every existing brand and product, so a mirror
+    reading the feed from the start gets the whole catalog.
+    """
+    ChangeLog = apps.get_model('products', 'ChangeLog')
+    now = django.utils.timezone.now()
+    for kind, model in (('brand', 'Brand'), ('product', 'Product')):
+        object_ids = apps.get_model('products', model).objects.order_by('pk').values_list('pk', flat=True)
+        ChangeLog.objects.bulk_create(
+            [ChangeLog(kind=kind, object_id=object_id, action='upsert', created_at=now) for object_id in object_ids],
+            batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_query_buckets'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('product', 'Product'), ('brand', 'Brand')], max_length=7)),
+                ('object_id', models.BigIntegerField()),
+                ('action', models.CharField(choices=[('upsert', 'Upsert'), ('delete', 'Delete')], max_length=6)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ChangeLogCompaction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('purged_until', models.BigIntegerField(default=0)),
+                ('compacted_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='changelog',
+            index=models.Index(fields=['kind', 'object_id', 'id'], name='changelog_object_idx'),
+        ),
+        migrations.RunPython(log_existing_objects, migrations.RunPython.noop),
+    ]
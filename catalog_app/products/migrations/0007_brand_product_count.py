@@ -0,0 +1,32 @@
+# Generated by Django 4.2 on 2026-10-18 21:40
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_products(apps, schema_editor):
+    """
+    Fill the counters of the existing brands with one UPDATE.
+    """
+    Brand = apps.get_model('products', 'Brand')
+    Through = apps.get_model('products', 'Product').brand.through
+    links = (Through.objects.filter(brand_id=OuterRef('pk')).order_by()
+             .values('brand_id').annotate(count=Count('*')).values('count'))
+    Brand.objects.update(product_count=Coalesce(Subquery(links), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_change_log'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='brand',
+            name='product_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_products, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 4.2 on 2026-10-18 22:05
+
+from django.contrib.postgres.indexes import BrinIndex
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+CHANGED_AT_INDEX = 'price_history_changed_idx'
+
+
+def create_changed_at_index(apps, schema_editor):
+    """
+    Index the price changes by time: a BRIN index on PostgreSQL, which stays tiny since rows
+    are appended in time order, and a B-tree elsewhere.
+    """
+    PriceHistory = apps.get_model('products', 'PriceHistory')
+    if schema_editor.connection.vendor == 'postgresql':
+        index = BrinIndex(fields=['changed_at'], name=CHANGED_AT_INDEX)
+    else:
+        index = models.Index(fields=['changed_at'], name=CHANGED_AT_INDEX)
+    schema_editor.add_index(PriceHistory, index)
+
+
+def drop_changed_at_index(apps, schema_editor):
+    schema_editor.execute(f'DROP INDEX IF EXISTS {CHANGED_AT_INDEX}')
+
+
+def record_current_prices(apps, schema_editor):
+    """
+    Start the history of every existing product with its current price, as of its last update.
+
+    Rows are inserted in time order, like the ones appended later, so the BRIN index on
+    ``changed_at`` stays selective over the backfilled pages too.
+    """
+    Product = apps.get_model('products', 'Product')
+    PriceHistory = apps.get_model('products', 'PriceHistory')
+    schema_editor.execute(
+        f'INSERT INTO {PriceHistory._meta.db_table} (product_id, price, changed_at) '
+        f'SELECT id, price, updated_at FROM {Product._meta.db_table} ORDER BY updated_at, id')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0007_brand_product_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceHistory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('changed_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('product', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='price_history', to='products.product')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='pricehistory',
+            index=models.Index(fields=['product', 'changed_at', 'id'], name='price_history_product_idx'),
+        ),
+        migrations.RunPython(create_changed_at_index, drop_changed_at_index),
+        migrations.RunPython(record_current_prices, migrations.RunPython.noop),
+    ]
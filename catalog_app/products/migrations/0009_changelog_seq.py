@@ -0,0 +1,38 @@
+# Generated by Django 4.2 on 2026-10-18 23:10
+
+from django.db import migrations, models
+from django.db.models import F, Max
+
+
+def number_existing_changes(apps, schema_editor):
+    """
+    Number the existing entries in id order and start the sequence after them, so mirrors
+    keep their position in the feed.
+    """
+    ChangeLog = apps.get_model('products', 'ChangeLog')
+    ChangeLog.objects.update(seq=F('id'))
+    last = ChangeLog.objects.aggregate(last=Max('id'))['last'] or 0
+    apps.get_model('products', 'ChangeLogSequence').objects.create(pk=1, last=last)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0008_price_history'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='changelog',
+            name='seq',
+            field=models.BigIntegerField(null=True, unique=True),
+        ),
+        migrations.CreateModel(
+            name='ChangeLogSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(number_existing_changes, migrations.RunPython.noop),
+    ]
@@ -1,12 +1,20 @@
 from django.contrib.auth.models import AbstractUser, Group, Permission
-from django.db import models
+from django.db import models, transaction
+from django.db.models import DEFERRED, F
+from django.utils import timezone
+
+from products.dispatch import inventory_changed
 
 
 class Brand(models.Model):
     """
     Model representing a brand of products.
+
+    ``product_count`` is maintained by the signal receivers and the importer (see
+    ``products.brand_counts``) rather than counted on every read.
     """
     name = models.CharField(max_length=255)
+    product_count = models.PositiveIntegerField(default=0, editable=False)
 
     def __str__(self):
         """
@@ -27,27 +35,85 @@ class Product(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     brand = models.ManyToManyField(Brand, related_name='products', blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['updated_at', 'id'], name='product_updated_at_idx'),
+            models.Index(fields=['name'], name='product_name_idx'),
+            models.Index(fields=['sku'], name='product_sku_idx'),
+            models.Index(fields=['price'], name='product_price_idx'),
+        ]
+
     def __str__(self):
         """
         Return the name of the product.
         """
         return self.name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """
+        Keeps the loaded price, so saves can tell whether it changed without reading it again.
+        """
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_price = instance.__dict__.get('price', DEFERRED)
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using, fields, **kwargs)
+        if fields is None or 'price' in fields:
+            self._loaded_price = self.__dict__.get('price', DEFERRED)
+
+    def price_changed(self):
+        """
+        Returns True when the price differs from the one the product was loaded with.
+
+        A deferred price that was never set is unchanged; a price set on a new product, or over
+        a deferred one, counts as changed.
+        """
+        if 'price' not in self.__dict__:
+            return False
+        loaded = getattr(self, '_loaded_price', DEFERRED)
+        return loaded is DEFERRED or self._meta.get_field('price').to_python(self.price) != loaded
+
+    def save(self, *args, **kwargs):
+        """
+        Saves the product and runs the post_save receivers (e.g. the notification outbox) in one transaction.
+        """
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+        if 'price' in self.__dict__:
+            self._loaded_price = self._meta.get_field('price').to_python(self.price)
+
     def add_inventory(self, quantity):
         """
         Adds a quantity of items to the sku level for this product.
+
+        The stock is changed with an atomic ``UPDATE ... SET sku = sku + n`` so concurrent
+        adjustments are never lost, and only the sku and updated_at columns are written.
         """
-        self.sku += quantity
-        self.save()
+        self._adjust_inventory(Product.objects.filter(pk=self.pk), quantity)
 
     def remove_inventory(self, quantity):
         """
         Removes a quantity of items from the sku level for this product.
+
+        The update is guarded with ``WHERE sku >= n``, so the stock can never go negative
+        even when several requests remove items at the same time.
         """
-        if self.sku < quantity:
+        if not self._adjust_inventory(Product.objects.filter(pk=self.pk, sku__gte=quantity), -quantity):
             raise ValueError('Not enough inventory for this product.')
-        self.sku -= quantity
-        self.save()
+
+    def _adjust_inventory(self, queryset, delta):
+        """
+        Applies a stock delta to the rows of the queryset and reloads the new stock level.
+        """
+        with transaction.atomic():
+            updated = queryset.update(sku=F('sku') + delta, updated_at=timezone.now())
+            if updated:
+                inventory_changed.send(sender=Product, product_ids=[self.pk])
+        if updated:
+            self.refresh_from_db(fields=['sku', 'updated_at'])
+        return updated
 
 
 class Query(models.Model):
@@ -57,6 +123,11 @@ class Query(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='queries')
     count = models.IntegerField(blank=True, default=0)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product'], name='unique_query_product'),
+        ]
+
     def __str__(self):
         """
         Return the name of the product and the number of queries.
@@ -64,6 +135,176 @@ class Query(models.Model):
         return f"{self.product.name}: {self.count} queries"
 
 
+class QueryBucket(models.Model):
+    """
+    Model representing the anonymous queries of a product during one minute, hour or day.
+
+    View counter flushes append minute rows without updating existing ones, and the
+    ``compact_query_buckets`` job folds them into one row per product and bucket, then
+    into hour and day rollups that the analytics reports read.
+    """
+    MINUTE = 'minute'
+    HOUR = 'hour'
+    DAY = 'day'
+    RESOLUTION_CHOICES = [(MINUTE, 'Minute'), (HOUR, 'Hour'), (DAY, 'Day')]
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='query_buckets')
+    resolution = models.CharField(max_length=6, choices=RESOLUTION_CHOICES)
+    start = models.DateTimeField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['resolution', 'start'], name='query_bucket_window_idx'),
+            models.Index(fields=['product', 'resolution', 'start'], name='query_bucket_product_idx'),
+        ]
+
+    def __str__(self):
+        """
+        Return the product id, the bucket and the number of queries.
+        """
+        return f"{self.product_id} {self.resolution} {self.start:%Y-%m-%d %H:%M}: {self.count} queries"
+
+
+class QueryCompaction(models.Model):
+    """
+    Model recording up to when the query buckets of a resolution have been compacted.
+
+    Buckets of ``resolution`` starting before ``compacted_until`` are complete, so
+    reports can read them instead of summing finer buckets.
+    """
+    resolution = models.CharField(max_length=6, choices=QueryBucket.RESOLUTION_CHOICES, primary_key=True)
+    compacted_until = models.DateTimeField()
+
+    def __str__(self):
+        """
+        Return the resolution and the compaction watermark.
+        """
+        return f"{self.resolution} compacted until {self.compacted_until}"
+
+
+class PriceHistory(models.Model):
+    """
+    Model representing the price of a product from ``changed_at`` on.
+
+    Rows are only appended, when a product is created or saved with a new price. The
+    ``(product, changed_at, id)`` index answers the price of a product at a point in time
+    with one index probe. The changes in a time range are read through an index on
+    ``changed_at``, which migration 0008 creates as a BRIN index on PostgreSQL: rows are
+    appended in time order, so it stays a few pages large for hundreds of millions of rows.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='price_history', db_index=False)
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    changed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['product', 'changed_at', 'id'], name='price_history_product_idx'),
+        ]
+
+    def __str__(self):
+        """
+        Return the product id, the price and when it took effect.
+        """
+        return f"{self.product_id}: {self.price} from {self.changed_at:%Y-%m-%d %H:%M}"
+
+
+class Notification(models.Model):
+    """
+    Model representing an admin notification waiting in the outbox to be emailed.
+    """
+    product = models.ForeignKey(
+        Product, on_delete=models.SET_NULL, related_name='notifications', null=True, blank=True)
+    subject = models.CharField(max_length=255)
+    message = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['sent_at', 'next_attempt_at'], name='notification_pending_idx'),
+        ]
+
+    def __str__(self):
+        """
+        Return the subject of the notification.
+        """
+        return self.subject
+
+
+class ChangeLog(models.Model):
+    """
+    Model representing a change of a product or brand in the change feed.
+
+    Entries are appended in the transaction of the change. Once it committed, they get the
+    sequence number ``seq`` mirrors sync from, in commit order (see ``ChangeLogSequence``). An
+    upsert means the object was created or changed and must be read again; a delete is a
+    tombstone. The ``compact_changes`` job keeps only the latest entry per object and purges
+    old tombstones.
+    """
+    PRODUCT = 'product'
+    BRAND = 'brand'
+    KIND_CHOICES = [(PRODUCT, 'Product'), (BRAND, 'Brand')]
+    UPSERT = 'upsert'
+    DELETE = 'delete'
+    ACTION_CHOICES = [(UPSERT, 'Upsert'), (DELETE, 'Delete')]
+
+    kind = models.CharField(max_length=7, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    action = models.CharField(max_length=6, choices=ACTION_CHOICES)
+    created_at = models.DateTimeField(default=timezone.now)
+    seq = models.BigIntegerField(null=True, unique=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['kind', 'object_id', 'id'], name='changelog_object_idx'),
+        ]
+
+    def __str__(self):
+        """
+        Return the sequence number, the action and the changed object.
+        """
+        return f"#{self.seq} {self.action} {self.kind} {self.object_id}"
+
+
+class ChangeLogSequence(models.Model):
+    """
+    Model holding the last sequence number given to a change log entry.
+
+    Entries are numbered after their transaction committed, in a transaction that holds the
+    lock of this row until the numbers are committed too. Numbers are therefore committed in
+    increasing order, and a mirror that read up to a sequence number has seen every lower one,
+    however long the transactions that wrote the entries ran. The table holds a single row.
+    """
+    last = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        """
+        Return the last sequence number.
+        """
+        return f"#{self.last}"
+
+
+class ChangeLogCompaction(models.Model):
+    """
+    Model recording up to which sequence number tombstones have been purged from the change log.
+
+    A mirror that synced up to an earlier sequence number may have missed deletes and has to
+    sync again from scratch. The table holds a single row.
+    """
+    purged_until = models.BigIntegerField(default=0)
+    compacted_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        """
+        Return the purge watermark.
+        """
+        return f"tombstones purged until #{self.purged_until}"
+
+
 class CustomUser(AbstractUser):
     """
     Model representing a user of the system.
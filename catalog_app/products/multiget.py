@@ -0,0 +1,35 @@
+"""
+Multi-get of products by id, for clients rendering many known products at once (carts,
+recommendation rails) in one round trip instead of one detail request per product.
+"""
+from products.counters import get_view_counter
+from products.models import Product
+from products.serializers import ProductSerializer
+from products.throttling import should_count_view
+
+
+def load_products(ids):
+    """
+    Returns ``{'results', 'missing'}``: the representations of the products with the given
+    ids in the requested order, and the ids that do not exist.
+
+    Costs one ``id__in`` query for the products and one for their brand links, whatever the
+    number of ids.
+    """
+    rows = Product.objects.filter(pk__in=ids).values(*ProductSerializer.values_fields())
+    found = {representation['id']: representation for representation in ProductSerializer.represent_rows(rows)}
+    return {
+        'results': [found[pk] for pk in ids if pk in found],
+        'missing': [pk for pk in ids if pk not in found],
+    }
+
+
+def count_views(request, data):
+    """
+    Records a view of every product of an anonymous multi-get in the view counter, with a
+    single ``view_count`` token for the batch.
+
+    The counter flushes the whole batch with one bulk ``UPDATE`` of ``products.Query``.
+    """
+    if data['results'] and not request.user.is_authenticated and should_count_view(request):
+        get_view_counter().increment_many(dict.fromkeys([product['id'] for product in data['results']], 1))
@@ -0,0 +1,160 @@
+import logging
+import os
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.mail import EmailMessage, get_connection
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from products.models import Notification
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_NOTIFICATIONS = {
+    'WINDOW': 60,
+    'BATCH_SIZE': 50,
+    'WORKERS': 4,
+    'MAX_ATTEMPTS': 5,
+    'BACKOFF_BASE': 30,
+    'BACKOFF_MAX': 3600,
+    'LEASE': 300,
+}
+
+
+def get_notification_settings(**overrides):
+    """
+    Returns the ``NOTIFICATIONS`` setting merged over the defaults and the given overrides.
+    """
+    config = {**DEFAULT_NOTIFICATIONS, **getattr(settings, 'NOTIFICATIONS', {})}
+    config.update({key.upper(): value for key, value in overrides.items() if value is not None})
+    return config
+
+
+def queue_product_notification(product):
+    """
+    Writes a notification about a product change to the outbox.
+    """
+    return Notification.objects.create(
+        product=product,
+        subject=f"Product update: {product.name}",
+        message=f"Product {product.name} has been updated.",
+    )
+
+
+def backoff_delay(attempts, base, maximum):
+    """
+    Returns the exponential backoff, in seconds, before the next delivery attempt.
+    """
+    return min(base * 2 ** max(attempts - 1, 0), maximum)
+
+
+def claim_pending(now, window, batch_limit, lease, max_attempts):
+    """
+    Locks the deliverable notifications and returns them grouped into per-product digests.
+
+    A product's notifications are only picked up once the oldest of them is older than
+    ``window`` seconds, so bursts of changes collapse into a single email. Claimed rows
+    are leased so that other workers skip them while they are being delivered.
+    """
+    pending = Notification.objects.filter(
+        sent_at__isnull=True, next_attempt_at__lte=now, attempts__lt=max_attempts)
+    settled = pending.filter(created_at__lte=now - timedelta(seconds=window))
+    product_ids = list(settled.exclude(product=None).values_list('product_id', flat=True).distinct()[:batch_limit])
+    orphan_ids = list(settled.filter(product=None).values_list('pk', flat=True)[:batch_limit])
+
+    with transaction.atomic():
+        # re-checked with the lock held: a worker that read the same ids leased them meanwhile
+        claimed = pending.filter(pk__in=orphan_ids) | pending.filter(product_id__in=product_ids)
+        claimed = claimed.order_by('created_at')
+        if connection.features.has_select_for_update_skip_locked:
+            claimed = claimed.select_for_update(skip_locked=True)
+        notifications = list(claimed)
+        Notification.objects.filter(pk__in=[n.pk for n in notifications]).update(
+            next_attempt_at=now + timedelta(seconds=lease))
+
+    digests = defaultdict(list)
+    for notification in notifications:
+        key = notification.product_id if notification.product_id is not None else f'n{notification.pk}'
+        digests[key].append(notification)
+    return list(digests.values())
+
+
+def build_digest(notifications, recipients):
+    """
+    Builds a single email message summarizing a group of notifications.
+    """
+    latest = notifications[-1]
+    if len(notifications) == 1:
+        subject, body = latest.subject, latest.message
+    else:
+        subject = f"{latest.subject} ({len(notifications)} changes)"
+        body = '\n'.join(
+            f"[{notification.created_at:%Y-%m-%d %H:%M:%S}] {notification.message}" for notification in notifications)
+    return EmailMessage(subject, body, os.environ.get('EMAIL_USER'), recipients)
+
+
+def send_batch(digests, recipients):
+    """
+    Sends a batch of digests over a single email connection.
+
+    Returns ``(sent, failed)`` lists of digests, ``failed`` holding ``(digest, error)`` tuples.
+    Runs on worker threads and does not touch the database.
+    """
+    sent, failed = [], []
+    try:
+        with get_connection(fail_silently=False) as email_connection:
+            for digest in digests:
+                try:
+                    email_connection.send_messages([build_digest(digest, recipients)])
+                    sent.append(digest)
+                except Exception as e:
+                    failed.append((digest, e))
+    except Exception as e:
+        # The connection itself could not be opened; retry everything not attempted yet.
+        failed.extend((digest, e) for digest in digests[len(sent) + len(failed):])
+    return sent, failed
+
+
+def deliver_pending_notifications(now=None, **overrides):
+    """
+    Delivers the pending outbox notifications and returns ``(sent, failed)`` digest counts.
+
+    Digests are split in batches of ``BATCH_SIZE`` that are sent in parallel by ``WORKERS``
+    threads, each batch reusing one email connection. Failed digests are retried with
+    exponential backoff until ``MAX_ATTEMPTS`` is reached.
+    """
+    config = get_notification_settings(**overrides)
+    now = now or timezone.now()
+    digests = claim_pending(
+        now, config['WINDOW'], config['BATCH_SIZE'] * config['WORKERS'], config['LEASE'], config['MAX_ATTEMPTS'])
+    if not digests:
+        return 0, 0
+
+    User = get_user_model()
+    recipients = list(User.objects.filter(is_superuser=True).exclude(email='').values_list('email', flat=True))
+    if not recipients:
+        Notification.objects.filter(pk__in=[n.pk for digest in digests for n in digest]).update(sent_at=now)
+        return 0, 0
+
+    batch_size = config['BATCH_SIZE']
+    batches = [digests[i:i + batch_size] for i in range(0, len(digests), batch_size)]
+    sent, failed = [], []
+    with ThreadPoolExecutor(max_workers=config['WORKERS']) as executor:
+        for batch_sent, batch_failed in executor.map(lambda batch: send_batch(batch, recipients), batches):
+            sent.extend(batch_sent)
+            failed.extend(batch_failed)
+
+    Notification.objects.filter(pk__in=[n.pk for digest in sent for n in digest]).update(
+        sent_at=timezone.now(), attempts=F('attempts') + 1, last_error='')
+    for digest, error in failed:
+        logger.warning('Failed to send notification digest: %s', error)
+        attempts = max(n.attempts for n in digest) + 1
+        delay = backoff_delay(attempts, config['BACKOFF_BASE'], config['BACKOFF_MAX'])
+        Notification.objects.filter(pk__in=[n.pk for n in digest]).update(
+            attempts=F('attempts') + 1, next_attempt_at=now + timedelta(seconds=delay), last_error=str(error))
+    return len(sent), len(failed)
@@ -0,0 +1,134 @@
+import json
+
+from django.db import connections
+from django.utils.http import parse_header_parameters
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.response import Response
+
+
+def approximate_count(queryset):
+    """
+    Returns a cheap estimate of the number of rows in a queryset.
+
+    On PostgreSQL the planner's row estimate is read from ``EXPLAIN``, which uses table
+    statistics instead of scanning. Other databases fall back to an exact ``COUNT(*)``.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return queryset.count()
+    sql, params = queryset.order_by().values('pk').query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class ListCursorPagination(CursorPagination):
+    """
+    Keyset pagination on the id ordering used by the product, brand, and user lists.
+
+    Pages are fetched with ``WHERE id > <position>`` instead of ``OFFSET`` and no total
+    count is computed, so every page costs the same regardless of its depth.
+
+    approximate_count: int
+        Estimated number of items, only set when requested with ``count=approximate``.
+    """
+    ordering = 'id'
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 25
+    approximate_count = None
+
+    def get_paginated_response(self, data):
+        if self.approximate_count is None:
+            return super().get_paginated_response(data)
+        return Response({
+            'approximate_count': self.approximate_count,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+
+class ListPagination(PageNumberPagination):
+    """
+    Custom pagination class for product, brand, and user lists.
+
+    Page-number pagination is the default. Clients opt into cursor pagination with
+    ``?pagination=cursor`` or an ``Accept: application/json; version=2`` header; the
+    ``next``/``previous`` links then carry a ``cursor`` parameter that keeps the mode.
+
+    page_size: int
+        Default number of items per page.
+
+    page_size_query_param: str
+        The name of the query parameter used to set the size of a page.
+
+    max_page_size: int
+        Maximum number of items that can be returned per page.
+
+    pagination_query_param: str
+        The name of the query parameter used to select the pagination mode.
+
+    cursor_pagination_class: Pagination
+        Class used to paginate the results in cursor mode.
+    """
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 25
+    pagination_query_param = 'pagination'
+    count_query_param = 'count'
+    cursor_version = '2'
+    cursor_pagination_class = ListCursorPagination
+    cursor_paginator = None
+
+    def use_cursor(self, request):
+        """
+        Returns True when the request asks for cursor pagination.
+        """
+        params = request.query_params
+        if params.get(self.pagination_query_param) == 'cursor':
+            return True
+        if self.cursor_pagination_class.cursor_query_param in params:
+            return True
+        _, media_params = parse_header_parameters(getattr(request, 'accepted_media_type', None) or '')
+        return media_params.get('version') == self.cursor_version
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if not self.use_cursor(request):
+            self.cursor_paginator = None
+            return super().paginate_queryset(queryset, request, view)
+        self.cursor_paginator = self.cursor_pagination_class()
+        if request.query_params.get(self.count_query_param) == 'approximate':
+            self.cursor_paginator.approximate_count = approximate_count(queryset)
+        return self.cursor_paginator.paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def get_html_context(self):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_html_context()
+        return super().get_html_context()
+
+    def get_schema_operation_parameters(self, view):
+        return super().get_schema_operation_parameters(view) + [
+            {
+                'name': self.pagination_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Set to "cursor" to use cursor pagination.',
+                'schema': {'type': 'string', 'enum': ['page', 'cursor']},
+            },
+            {
+                'name': self.cursor_pagination_class.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'The pagination cursor value.',
+                'schema': {'type': 'string'},
+            },
+        ]
@@ -0,0 +1,57 @@
+"""
+Product price history, appended on every price change and read as of a point in time or
+over a time range.
+"""
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+from products.models import PriceHistory
+from products.serializers import PriceHistorySerializer
+
+
+def record_prices(prices, changed_at=None):
+    """
+    Appends ``(product_id, price)`` pairs to the price history with bulk inserts.
+    """
+    changed_at = changed_at or timezone.now()
+    PriceHistory.objects.bulk_create(
+        [PriceHistory(product_id=product_id, price=price, changed_at=changed_at) for product_id, price in prices],
+        batch_size=1000)
+
+
+def latest_price_id(at):
+    """
+    Returns the id of the history row of the outer product in effect at ``at``, as a correlated subquery.
+    """
+    rows = PriceHistory.objects.filter(product=OuterRef('pk'), changed_at__lte=at).order_by('-changed_at', '-id')
+    return Subquery(rows.values('pk')[:1])
+
+
+def prices_as_of(at, products, limit=None):
+    """
+    Returns the history rows in effect at ``at`` of the products of a queryset (the first
+    ``limit`` of them), in its order; products without a known price then get a None price.
+
+    Costs two queries whatever the size of the history: the products with the id of their
+    row, found with one probe of the ``(product, changed_at, id)`` index each, and the rows.
+    """
+    pairs = products.annotate(price_id=latest_price_id(at)).values_list('pk', 'price_id')
+    pairs = list(pairs[:limit] if limit else pairs)
+    rows = PriceHistory.objects.filter(pk__in=[price_id for _, price_id in pairs if price_id is not None])
+    found = {row['id']: row for row in
+             PriceHistorySerializer.represent_rows(rows.values(*PriceHistorySerializer.values_fields()))}
+    return [
+        found.get(price_id) or {'id': None, 'product': product_id, 'price': None, 'changed_at': None}
+        for product_id, price_id in pairs
+    ]
+
+
+def price_changes(since, until, product_id=None):
+    """
+    Returns the history rows recorded in ``[since, until)``, optionally of one product, in the
+    order they were appended, as ``values()`` rows for ``PriceHistorySerializer.represent_rows``.
+    """
+    rows = PriceHistory.objects.filter(changed_at__gte=since, changed_at__lt=until)
+    if product_id is not None:
+        rows = rows.filter(product_id=product_id)
+    return rows.order_by('pk').values(*PriceHistorySerializer.values_fields())
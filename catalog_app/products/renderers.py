@@ -0,0 +1,36 @@
+try:
+    import orjson
+except ImportError:  # optional: fall back to the standard library encoder
+    orjson = None
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+# JSONRenderer escapes the two line terminators JavaScript does not accept in string literals.
+LINE_SEPARATORS = ((b'\xe2\x80\xa8', b'\\u2028'), (b'\xe2\x80\xa9', b'\\u2029'))
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSON renderer encoding with orjson when it is installed, producing the same bytes as ``JSONRenderer``.
+
+    orjson is used for the default compact, non-ASCII-escaping output. Values orjson does not
+    encode like the standard library (datetimes, decimals, lazy strings, ...) are handed to
+    DRF's ``JSONEncoder``; indented output, other settings and anything orjson refuses fall
+    back to ``JSONRenderer``. orjson writes some floats differently (``1e16`` instead of
+    ``1e+16``) and NaN as ``null``, so only use it for payloads without floats.
+    """
+    options = orjson and (orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS)
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (orjson is None or data is None or not self.compact or self.ensure_ascii
+                or self.get_indent(accepted_media_type, renderer_context or {}) is not None):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            rendered = orjson.dumps(data, default=JSONEncoder().default, option=self.options)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        for separator, escaped in LINE_SEPARATORS:
+            if separator in rendered:
+                rendered = rendered.replace(separator, escaped)
+        return rendered
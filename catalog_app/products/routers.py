@@ -0,0 +1,120 @@
+import contextvars
+import random
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+DEFAULT_REPLICA_ROUTING = {
+    'REPLICAS': {},
+    'PIN_SECONDS': 5,
+    'PIN_COOKIE': 'catalog_primary',
+}
+
+# Replica the reads of the current block go to, None for the primary.
+_replica = contextvars.ContextVar('read_replica', default=None)
+# WriteTracker of the request being served, if any.
+_writes = contextvars.ContextVar('write_tracker', default=None)
+
+
+def get_replica_settings():
+    """
+    Returns the ``REPLICA_ROUTING`` setting merged over the defaults.
+    """
+    return {**DEFAULT_REPLICA_ROUTING, **getattr(settings, 'REPLICA_ROUTING', {})}
+
+
+def choose_replica(replicas, rng=random):
+    """
+    Returns a replica alias of a ``{alias: weight}`` dict picked by weight, or None if there is none.
+    """
+    aliases = [alias for alias, weight in replicas.items() if weight > 0]
+    if not aliases:
+        return None
+    return rng.choices(aliases, weights=[replicas[alias] for alias in aliases])[0]
+
+
+def is_pinned(request):
+    """
+    Returns True when the client wrote recently and its reads must see the primary.
+    """
+    return get_replica_settings()['PIN_COOKIE'] in request.COOKIES
+
+
+@contextmanager
+def replica_reads(request=None):
+    """
+    Sends the reads of the block to one replica chosen by weight, unless ``request`` is pinned
+    to the primary. Reads after a write in the block go to the primary.
+    """
+    replica = None if request is not None and is_pinned(request) else choose_replica(
+        get_replica_settings()['REPLICAS'])
+    token = _replica.set(replica)
+    try:
+        yield replica
+    finally:
+        _replica.reset(token)
+
+
+@contextmanager
+def primary_reads():
+    """
+    Sends the reads of the block to the primary, e.g. to fill a cache that must not go stale.
+    """
+    token = _replica.set(None)
+    try:
+        yield
+    finally:
+        _replica.reset(token)
+
+
+class WriteTracker:
+    """
+    Records whether a request wrote to the database, so ``ReplicaPinMiddleware`` can pin the client.
+    """
+    __slots__ = ('wrote',)
+
+    def __init__(self):
+        self.wrote = False
+
+
+@contextmanager
+def track_writes():
+    tracker = WriteTracker()
+    token = _writes.set(tracker)
+    try:
+        yield tracker
+    finally:
+        _writes.reset(token)
+
+
+class ReplicaRouter:
+    """
+    Routes the reads of ``replica_reads`` blocks to the replicas of ``REPLICA_ROUTING['REPLICAS']``.
+
+    Every other query, and every write, uses the default database, and a write sends the
+    remaining reads of the block to the primary as well. Replicas receive their schema and
+    data by replication, so migrations never run on them.
+    """
+
+    def db_for_read(self, model, **hints):
+        return _replica.get()
+
+    def db_for_write(self, model, **hints):
+        if _replica.get() is not None:
+            _replica.set(None)
+        tracker = _writes.get()
+        if tracker is not None:
+            tracker.wrote = True
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *get_replica_settings()['REPLICAS']}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in get_replica_settings()['REPLICAS']:
+            return False
+        return None
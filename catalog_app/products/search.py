@@ -0,0 +1,91 @@
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchVector
+from django.db import connections, router
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from products.models import Product
+
+FTS_TABLE = 'products_product_fts'
+SEARCH_CONFIG = 'english'
+
+
+def search_vector():
+    """
+    Returns the full-text vector over name and description used by the PostgreSQL GIN index.
+
+    Queries must use this exact expression for the planner to pick the index.
+    """
+    return SearchVector('name', 'description', config=SEARCH_CONFIG)
+
+
+def fts_query(text):
+    """
+    Turns free text into an FTS5 query matching all the words, the last one as a prefix.
+
+    Words are quoted, so characters with a meaning in the FTS5 syntax are searched literally.
+    """
+    words = [f'"{word}"' for word in re.findall(r'\w+', text)]
+    if words:
+        words[-1] += '*'
+    return ' '.join(words)
+
+
+def search_products(queryset, text):
+    """
+    Filters a product queryset to the products whose name or description match ``text``.
+
+    Uses PostgreSQL full-text search (backed by a GIN index), the SQLite FTS5 table kept
+    in sync by signals, or case-insensitive containment on other databases.
+    """
+    vendor = connections[queryset.db].vendor
+    if vendor == 'postgresql':
+        return queryset.alias(search=search_vector()).filter(
+            search=SearchQuery(text, config=SEARCH_CONFIG, search_type='websearch'))
+    if vendor == 'sqlite':
+        query = fts_query(text)
+        if not query:
+            return queryset.none()
+        return queryset.filter(pk__in=RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [query]))
+    return queryset.filter(Q(name__icontains=text) | Q(description__icontains=text))
+
+
+def _sqlite_connection():
+    connection = connections[router.db_for_write(Product)]
+    return connection if connection.vendor == 'sqlite' else None
+
+
+def index_products(products):
+    """
+    Writes the name and description of the given products to the SQLite FTS5 table.
+
+    Does nothing on other databases.
+    """
+    connection = _sqlite_connection()
+    if connection is None or not products:
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT OR REPLACE INTO {FTS_TABLE} (rowid, name, description) VALUES (%s, %s, %s)',
+            [(product.pk, product.name, product.description) for product in products])
+
+
+def index_product_ids(product_ids):
+    """
+    Reloads the given products and writes them to the SQLite FTS5 table.
+    """
+    if _sqlite_connection() is None or not product_ids:
+        return
+    index_products(list(Product.objects.filter(pk__in=product_ids).only('name', 'description')))
+
+
+def remove_products(product_ids):
+    """
+    Removes the given products from the SQLite FTS5 table.
+    """
+    connection = _sqlite_connection()
+    if connection is None or not product_ids:
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [(pk,) for pk in product_ids])
@@ -1,20 +1,220 @@
+import time
+
+from django.db.models import Prefetch
 from rest_framework import serializers
-from .models import Product, Brand, CustomUser
+from .metrics import record_serializer_time
+from .models import Product, Brand, CustomUser, PriceHistory
+
+
+class EagerLoadingMixin:
+    """
+    Mixin for model serializers that builds querysets loading only what the serializer renders.
+
+    Concrete columns the serializer does not use are deferred and many-to-many fields are
+    prefetched with just their primary keys, so listing a page costs a fixed number of queries.
+    """
+
+    @classmethod
+    def get_loaded_fields(cls):
+        """
+        Returns the concrete and many-to-many model fields rendered by the serializer.
+        """
+        if '_loaded_fields' not in cls.__dict__:
+            names = set(cls().fields)
+            opts = cls.Meta.model._meta
+            cls._loaded_fields = (
+                [field.name for field in opts.concrete_fields if field.name in names or field.primary_key],
+                [field.name for field in opts.many_to_many if field.name in names],
+            )
+        return cls._loaded_fields
+
+    @classmethod
+    def setup_eager_loading(cls, queryset):
+        """
+        Restricts the queryset to the rendered columns and prefetches many-to-many relations.
+        """
+        concrete, many_to_many = cls.get_loaded_fields()
+        queryset = queryset.only(*concrete)
+        for name in many_to_many:
+            related_model = queryset.model._meta.get_field(name).related_model
+            queryset = queryset.prefetch_related(Prefetch(name, queryset=related_model.objects.only('pk')))
+        return queryset
+
+
+class TimedRepresentationMixin:
+    """
+    Mixin for serializers that adds the time spent rendering instances to the request metrics.
+    """
+
+    def to_representation(self, instance):
+        start = time.perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            record_serializer_time(time.perf_counter() - start)
+
+
+class ValuesRepresentationMixin:
+    """
+    Mixin for model serializers that builds read-only representations straight from ``values()`` rows.
+
+    The converters of the readable fields are looked up once per class. Integers and strings
+    come from the database in their JSON type and are copied as they are; other values go
+    through their field's ``to_representation``. Many-to-many fields are read with one
+    through-table query per batch of rows, ordered by the related id. The result equals
+    ``serializer.data`` without building model instances or resolving fields per row.
+    """
+
+    @classmethod
+    def get_row_converters(cls):
+        """
+        Returns ``(name, converter)`` pairs of the concrete fields in rendering order, the converter
+        being None when values are copied, and ``(name, through, source, target)`` tuples of the
+        many-to-many fields.
+        """
+        if '_row_converters' not in cls.__dict__:
+            many_to_many = {field.name: field for field in cls.Meta.model._meta.many_to_many}
+            converters, relations = [], []
+            for field in cls()._readable_fields:
+                relation = many_to_many.get(field.source)
+                if relation is not None:
+                    through = relation.remote_field.through
+                    relations.append((field.field_name, through,
+                                      through._meta.get_field(relation.m2m_field_name()).attname,
+                                      through._meta.get_field(relation.m2m_reverse_field_name()).attname))
+                else:
+                    copied = isinstance(field, (serializers.IntegerField, serializers.CharField))
+                    converters.append((field.field_name, None if copied else field.to_representation))
+            cls._row_converters = (converters, relations)
+        return cls._row_converters
+
+    @classmethod
+    def values_fields(cls):
+        """
+        Returns the fields to pass to ``values()`` for ``represent_rows``; they include the primary key.
+        """
+        return [name for name, _ in cls.get_row_converters()[0]]
+
+    @classmethod
+    def get_link_querysets(cls, rows):
+        """
+        Returns ``(name, queryset)`` pairs yielding the ``(pk, related_pk)`` links of the rows for every
+        many-to-many field.
+        """
+        pk_name = cls.Meta.model._meta.pk.name
+        pks = [row[pk_name] for row in rows]
+        return [
+            (name, through.objects.filter(**{f'{source}__in': pks}).order_by(target).values_list(source, target))
+            for name, through, source, target in cls.get_row_converters()[1]
+        ]
+
+    @classmethod
+    def build_representations(cls, rows, links):
+        converters, _ = cls.get_row_converters()
+        pk_name = cls.Meta.model._meta.pk.name
+        start = time.perf_counter()
+        representations = []
+        for row in rows:
+            representation = {}
+            for name, convert in converters:
+                value = row[name]
+                representation[name] = value if convert is None or value is None else convert(value)
+            for name, related in links.items():
+                representation[name] = related.get(row[pk_name], [])
+            representations.append(representation)
+        record_serializer_time(time.perf_counter() - start)
+        return representations
+
+    @classmethod
+    def represent_rows(cls, rows):
+        """
+        Returns the representations of ``values()`` rows holding the ``values_fields()``.
+        """
+        rows = list(rows)
+        links = {}
+        for name, queryset in cls.get_link_querysets(rows) if rows else ():
+            links[name] = related = {}
+            for pk, related_pk in queryset:
+                related.setdefault(pk, []).append(related_pk)
+        return cls.build_representations(rows, links)
+
+    @classmethod
+    async def arepresent_rows(cls, rows):
+        """
+        Async version of ``represent_rows``.
+        """
+        rows = list(rows)
+        links = {}
+        for name, queryset in cls.get_link_querysets(rows) if rows else ():
+            links[name] = related = {}
+            async for pk, related_pk in queryset:
+                related.setdefault(pk, []).append(related_pk)
+        return cls.build_representations(rows, links)
 
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(TimedRepresentationMixin, EagerLoadingMixin, ValuesRepresentationMixin,
+                        serializers.ModelSerializer):
     class Meta:
         model = Product
         fields = '__all__'
 
 
-class BrandSerializer(serializers.ModelSerializer):
+class BrandSerializer(TimedRepresentationMixin, EagerLoadingMixin, ValuesRepresentationMixin,
+                      serializers.ModelSerializer):
     class Meta:
         model = Brand
         fields = '__all__'
 
 
-class CustomUserSerializer(serializers.ModelSerializer):
+class PriceHistorySerializer(TimedRepresentationMixin, ValuesRepresentationMixin, serializers.ModelSerializer):
+    product = serializers.IntegerField(source='product_id', read_only=True)
+
+    class Meta:
+        model = PriceHistory
+        fields = ['id', 'product', 'price', 'changed_at']
+
+
+class CustomUserSerializer(TimedRepresentationMixin, EagerLoadingMixin, serializers.ModelSerializer):
     class Meta:
         model = CustomUser
         fields = ['id', 'username', 'email', 'is_staff', 'is_superuser']
+
+
+class ProductImportSerializer(serializers.ModelSerializer):
+    """
+    Validates one row of a bulk product import.
+
+    Brand ids are checked against the ``brand_ids`` set in the serializer context, which the
+    importer loads once per chunk, instead of querying the database for every row.
+    """
+    id = serializers.IntegerField(required=False, min_value=1)
+    brand = serializers.ListField(child=serializers.IntegerField(), required=False)
+
+    class Meta:
+        model = Product
+        fields = ['id', 'sku', 'name', 'price', 'description', 'brand']
+
+    def validate_brand(self, value):
+        unknown = sorted(set(value) - self.context['brand_ids'])
+        if unknown:
+            raise serializers.ValidationError(f'Invalid brand ids: {unknown}.')
+        return value
+
+
+class StockAdjustmentLineSerializer(serializers.Serializer):
+    product = serializers.IntegerField()
+    delta = serializers.IntegerField()
+
+
+class StockAdjustmentSerializer(serializers.Serializer):
+    lines = serializers.ListField(child=StockAdjustmentLineSerializer(), allow_empty=False, max_length=10000)
+
+
+class ProductIdsSerializer(serializers.Serializer):
+    """
+    Validates the ids of a product multi-get; duplicates are dropped, keeping the first occurrence.
+    """
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False, max_length=200)
+
+    def validate_ids(self, value):
+        return list(dict.fromkeys(value))
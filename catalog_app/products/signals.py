@@ -1,48 +1,263 @@
-import os
-
-from botocore.exceptions import ClientError
 from django.contrib.auth import get_user_model
-from django.db.models.signals import post_save
+from django.contrib.auth.models import Group
+from django.db.backends.signals import connection_created
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
 from django.dispatch import receiver
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
 
-from products.models import Product
-from django.core.mail import send_mail
-
-User = get_user_model()
+from products.authentication import invalidate_tokens, invalidate_user_tokens
+from products.brand_counts import adjust_product_counts, count_links
+from products.cache import product_cache
+from products.changes import record_changes
+from products.dispatch import inventory_changed, products_imported
+from products.metrics import time_query
+from products.models import Brand, ChangeLog, Product
+from products.notifications import queue_product_notification
+from products.prices import record_prices
+from products.search import index_product_ids, index_products, remove_products
 
 
 @receiver(post_save, sender=Product)
 def product_change_notification(sender, instance, **kwargs):
     """
-    Send a notification to all other admins when a product is changed.
-    """
-
-    # Construct the email message
-    message = f"Product {instance.name} has been updated."
-    subject = f"Product update: {instance.name}"
-    # Get the email addresses of all admin users
-    admin_emails = User.objects.filter(is_superuser=True).values_list('email', flat=True)
-    to_addresses = list(admin_emails)
-    # Try to send the email up to 3 times if it fails
-    for i in range(3):
-        try:
-            # Send the email
-            send_mail(
-                subject,
-                message,
-                os.environ.get('EMAIL_USER'),
-                admin_emails,
-                fail_silently=False)
-
-            # If the email was sent successfully, exit the loop
-            break
-
-        except ClientError as e:
-            # If the email failed to send, retry up to 3 times
-            if i < 2 and e.response['Error']['Code'] in ['Throttling', 'Timeout']:
-                continue
-
-            # Otherwise, log the error and exit the loop
-            else:
-                print(f"Failed to send email: {e}")
-                break
+    Queue a notification to all other admins when a product is changed.
+
+    The notification is written to the outbox in the same transaction as the product
+    and emailed later by the ``send_notifications`` worker.
+    """
+    queue_product_notification(instance)
+
+
+@receiver(post_save, sender=Product)
+def record_price_change(sender, instance, created, update_fields, **kwargs):
+    """
+    Append the price of a product to its price history when it is created or its price changed.
+
+    The price is compared with the one the product was loaded with, so no extra query is made.
+    """
+    if update_fields is not None and 'price' not in update_fields:
+        return
+    if created or instance.price_changed():
+        record_prices([(instance.pk, instance.price)], instance.updated_at)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_product_cache(sender, instance, **kwargs):
+    """
+    Drop the cached payload of a product when it is saved or deleted.
+    """
+    product_cache.invalidate(instance.pk)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Brand)
+def log_change(sender, instance, **kwargs):
+    """
+    Log a saved product or brand in the change feed, in the transaction of the save.
+    """
+    record_changes(ChangeLog.BRAND if sender is Brand else ChangeLog.PRODUCT, [instance.pk])
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Brand)
+def log_deletion(sender, instance, **kwargs):
+    """
+    Log a tombstone for a deleted product or brand in the change feed.
+    """
+    record_changes(ChangeLog.BRAND if sender is Brand else ChangeLog.PRODUCT, [instance.pk], ChangeLog.DELETE)
+
+
+@receiver(inventory_changed, sender=Product)
+def log_inventory_change(sender, product_ids, **kwargs):
+    """
+    Log the products whose stock was changed with a queryset update in the change feed.
+    """
+    record_changes(ChangeLog.PRODUCT, product_ids)
+
+
+@receiver(products_imported, sender=Product)
+def log_import(sender, created_ids, updated_ids, **kwargs):
+    """
+    Log the products written by a bulk import in the change feed.
+    """
+    record_changes(ChangeLog.PRODUCT, created_ids + updated_ids)
+
+
+@receiver(inventory_changed, sender=Product)
+def invalidate_product_cache_on_inventory_change(sender, product_ids, **kwargs):
+    """
+    Drop the cached payloads of products whose stock was changed with a queryset update.
+    """
+    product_cache.invalidate(*product_ids)
+
+
+@receiver(products_imported, sender=Product)
+def invalidate_product_cache_on_import(sender, updated_ids, **kwargs):
+    """
+    Drop the cached payloads of products overwritten by a bulk import.
+    """
+    product_cache.invalidate(*updated_ids)
+
+
+@receiver(post_save, sender=Product)
+def update_search_index(sender, instance, **kwargs):
+    """
+    Keep the SQLite full-text table in sync with the product name and description.
+    """
+    index_products([instance])
+
+
+@receiver(post_delete, sender=Product)
+def remove_from_search_index(sender, instance, **kwargs):
+    """
+    Remove a deleted product from the SQLite full-text table.
+    """
+    remove_products([instance.pk])
+
+
+@receiver(products_imported, sender=Product)
+def update_search_index_on_import(sender, created_ids, updated_ids, **kwargs):
+    """
+    Index the products written by a bulk import in the SQLite full-text table.
+    """
+    index_product_ids(created_ids + updated_ids)
+
+
+def touch_products(product_ids):
+    """
+    Bump ``updated_at`` of products whose representation changed without a save, so their
+    ETags and incremental exports pick the change up, and log the change for the change feed.
+    """
+    if product_ids:
+        Product.objects.filter(pk__in=product_ids).update(updated_at=timezone.now())
+        record_changes(ChangeLog.PRODUCT, product_ids)
+
+
+@receiver(m2m_changed, sender=Product.brand.through)
+def product_brands_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Drop the cached payloads and bump ``updated_at`` of the products whose brands changed.
+    """
+    if not reverse:
+        changed = action == 'post_clear' or (action in ('post_add', 'post_remove') and pk_set)
+        product_ids = [instance.pk] if changed else []
+    elif action in ('post_add', 'post_remove'):
+        product_ids = list(pk_set)
+    elif action == 'pre_clear':
+        product_ids = list(instance.products.values_list('pk', flat=True))
+    else:
+        product_ids = []
+    product_cache.invalidate(*product_ids)
+    touch_products(product_ids)
+
+
+@receiver(pre_delete, sender=Brand)
+def brand_deleted(sender, instance, **kwargs):
+    """
+    Drop the cached payloads and bump ``updated_at`` of the products linked to a brand that is being deleted.
+    """
+    product_ids = list(instance.products.values_list('pk', flat=True))
+    product_cache.invalidate(*product_ids)
+    touch_products(product_ids)
+
+
+@receiver(m2m_changed, sender=Product.brand.through)
+def update_brand_product_counts(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Keep ``Brand.product_count`` in step with the brand links added and removed from either side.
+
+    ``pk_set`` of an addition only holds the new links, but that of a removal also holds ids
+    that were not linked, so the links about to be removed or cleared are counted first.
+    """
+    if action == 'post_add' and pk_set:
+        adjust_product_counts({instance.pk: len(pk_set)} if reverse else dict.fromkeys(pk_set, 1))
+    elif action in ('pre_remove', 'pre_clear'):
+        links = sender.objects.filter(**{'brand_id' if reverse else 'product_id': instance.pk})
+        if action == 'pre_remove':
+            links = links.filter(**{'product_id__in' if reverse else 'brand_id__in': pk_set})
+        instance._removed_brand_links = count_links(links)
+    elif action in ('post_remove', 'post_clear'):
+        removed = instance.__dict__.pop('_removed_brand_links', {})
+        adjust_product_counts({brand_id: -count for brand_id, count in removed.items()})
+
+
+@receiver(pre_delete, sender=Product)
+def uncount_deleted_product(sender, instance, **kwargs):
+    """
+    Decrement the counters of the brands of a product that is being deleted; its links are
+    deleted by the cascade, which sends no ``m2m_changed``.
+    """
+    links = count_links(Product.brand.through.objects.filter(product_id=instance.pk))
+    adjust_product_counts({brand_id: -count for brand_id, count in links.items()})
+
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=Token)
+@receiver(post_delete, sender=Token)
+def invalidate_cached_token(sender, instance, **kwargs):
+    """
+    Drop a cached token when it is saved or deleted.
+    """
+    invalidate_tokens(instance.key)
+
+
+@receiver(post_save, sender=User)
+def invalidate_cached_user_tokens(sender, instance, **kwargs):
+    """
+    Drop the cached tokens of a user when the user is saved; deleting it deletes its tokens.
+    """
+    invalidate_user_tokens([instance.pk])
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(m2m_changed, sender=User.user_permissions.through)
+def user_permissions_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Drop the cached tokens of users whose groups or direct permissions changed.
+    """
+    if not reverse:
+        user_ids = [instance.pk] if action in ('post_add', 'post_remove', 'post_clear') else []
+    elif action in ('post_add', 'post_remove'):
+        user_ids = pk_set
+    elif action == 'pre_clear':
+        user_ids = instance.user_set.values('pk')
+    else:
+        user_ids = []
+    invalidate_user_tokens(user_ids)
+
+
+@receiver(m2m_changed, sender=Group.permissions.through)
+def group_permissions_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Drop the cached tokens of the members of groups whose permissions changed.
+    """
+    if not reverse:
+        group_ids = [instance.pk] if action in ('post_add', 'post_remove', 'post_clear') else []
+    elif action in ('post_add', 'post_remove'):
+        group_ids = pk_set
+    elif action == 'pre_clear':
+        group_ids = instance.group_set.values('pk')
+    else:
+        group_ids = []
+    invalidate_user_tokens(User.objects.filter(groups__in=group_ids).values('pk'))
+
+
+@receiver(pre_delete, sender=Group)
+def group_deleted(sender, instance, **kwargs):
+    """
+    Drop the cached tokens of the members of a group that is being deleted.
+    """
+    invalidate_user_tokens(instance.user_set.values('pk'))
+
+
+@receiver(connection_created)
+def install_query_timer(sender, connection, **kwargs):
+    """
+    Time the queries of every new database connection for the request metrics.
+    """
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_query)
@@ -0,0 +1,105 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from products.analytics import compact_query_buckets, get_watermarks, query_series, record_views, top_products
+from products.counters import LocalViewCounter
+from products.models import CustomUser, Product, QueryBucket
+
+
+class QueryAnalyticsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = Product.objects.create(name='Product1', price=10.0, description='Test description')
+        cls.other = Product.objects.create(name='Product2', price=10.0, description='Test description')
+
+    def setUp(self):
+        self.day = datetime(2024, 3, 1, tzinfo=dt_timezone.utc)
+        # two appended rows in the same minute, then a spread over two hours and the next day
+        record_views({self.product.pk: 2, self.other.pk: 1}, now=self.day + timedelta(minutes=5, seconds=10))
+        record_views({self.product.pk: 3}, now=self.day + timedelta(minutes=5, seconds=40))
+        record_views({self.other.pk: 7}, now=self.day + timedelta(hours=1, minutes=30))
+        record_views({self.product.pk: 1}, now=self.day + timedelta(days=1, minutes=1))
+        self.now = self.day + timedelta(days=1, minutes=10)
+
+    def test_counter_flush_appends_minute_buckets(self):
+        QueryBucket.objects.all().delete()
+        counter = LocalViewCounter(flush_interval=60, flush_size=100)
+        counter.increment(self.product.pk)
+        counter.increment(self.product.pk)
+        counter.flush()
+        counter.increment(self.product.pk)
+        counter.flush()
+        buckets = QueryBucket.objects.filter(product=self.product, resolution=QueryBucket.MINUTE)
+        self.assertEqual(sorted(buckets.values_list('count', flat=True)), [1, 2])
+
+    def test_compaction_rolls_up_buckets(self):
+        written = compact_query_buckets(now=self.now)
+        self.assertEqual(written, {QueryBucket.MINUTE: 4, QueryBucket.HOUR: 3, QueryBucket.DAY: 2})
+        minute = QueryBucket.objects.get(product=self.product, resolution=QueryBucket.MINUTE,
+                                         start=self.day + timedelta(minutes=5))
+        self.assertEqual(minute.count, 5)
+        self.assertEqual(QueryBucket.objects.get(product=self.other, resolution=QueryBucket.DAY).count, 8)
+        self.assertEqual(get_watermarks()[QueryBucket.DAY], self.day + timedelta(days=1))
+
+        # running again only compacts what was appended since
+        self.assertEqual(compact_query_buckets(now=self.now), {'minute': 0, 'hour': 0, 'day': 0})
+        record_views({self.product.pk: 4}, now=self.now)
+        self.assertEqual(compact_query_buckets(now=self.now + timedelta(minutes=5))[QueryBucket.MINUTE], 1)
+
+    def test_reports_agree_before_and_after_compaction(self):
+        start, end = self.day, self.now
+        before = top_products(start, end)
+        series_before = query_series(start, start + timedelta(hours=3), QueryBucket.HOUR)
+        compact_query_buckets(now=self.now)
+        self.assertEqual(top_products(start, end), before)
+        self.assertEqual(query_series(start, start + timedelta(hours=3), QueryBucket.HOUR), series_before)
+        self.assertEqual(before, [{'product': self.other.pk, 'total': 8}, {'product': self.product.pk, 'total': 6}])
+        self.assertEqual([count for _, count in series_before], [6, 7, 0])
+
+        series = query_series(start, start + timedelta(days=2), QueryBucket.DAY, product_id=self.product.pk)
+        self.assertEqual(series, [(self.day, 5), (self.day + timedelta(days=1), 1)])
+
+    def test_expired_fine_buckets_are_purged_after_rollup(self):
+        compact_query_buckets(now=self.now, minute_retention=60, hour_retention=60)
+        rolled_up = QueryBucket.objects.filter(start__lt=self.day + timedelta(days=1))
+        self.assertFalse(rolled_up.filter(resolution__in=[QueryBucket.MINUTE, QueryBucket.HOUR]).exists())
+        self.assertEqual(top_products(self.day, self.day + timedelta(days=1))[0]['total'], 8)
+
+    def test_compact_query_buckets_command(self):
+        out = StringIO()
+        call_command('compact_query_buckets', stdout=out)
+        self.assertIn('minute buckets', out.getvalue())
+
+
+class QueryReportAPITest(APITestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_superuser(
+            username='testuser', email='test@example.com', password='testpassword')
+        self.product = Product.objects.create(name='Product1', price=10.0, description='Test description')
+        record_views({self.product.pk: 3})
+
+    def test_reports_require_admin(self):
+        self.assertEqual(self.client.get(reverse('analytics_top')).status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(self.client.get(reverse('analytics_series')).status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_top_products(self):
+        self.client.force_authenticate(self.user)
+        response = self.client.get(reverse('analytics_top'), {'period': 'hour'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'], [{'product': self.product.pk, 'name': 'Product1', 'count': 3}])
+        response = self.client.get(reverse('analytics_top'), {'period': 'year'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_series(self):
+        self.client.force_authenticate(self.user)
+        response = self.client.get(reverse('analytics_series'), {'resolution': 'minute', 'product': self.product.pk})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(sum(point['count'] for point in response.data['results']), 3)
+        response = self.client.get(reverse('analytics_series'), {'resolution': 'minute', 'since': '2000-01-01T00:00'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
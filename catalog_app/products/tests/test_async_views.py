@@ -0,0 +1,100 @@
+import asyncio
+import json
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from products.async_views import _background_tasks, fire_and_forget
+from products.counters import get_view_counter
+from products.models import Brand, Product
+from products.throttling import LocalBucketStore, get_bucket_store
+
+
+@override_settings(ROOT_URLCONF='catalog_app.asgi_urls',
+                   PERFORMANCE_METRICS={'SERVER_TIMING': True, 'SLOW_QUERY_SAMPLE_RATE': 0.0})
+class AsyncReadPathTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'password')
+        brand = Brand.objects.create(name='Brand')
+        for i in range(12):
+            Product.objects.create(sku=i, name=f'Product {i}', price=i, description='Description').brand.add(brand)
+        cls.product = Product.objects.order_by('id').first()
+
+    def setUp(self):
+        get_view_counter().drain()
+
+    def tearDown(self):
+        get_view_counter().drain()
+        get_bucket_store().clear()
+
+    async def test_anonymous_detail_matches_sync_view(self):
+        url = reverse('product_retrieve_update_destroy', args=[self.product.pk])
+        response = await self.async_client.get(url)
+        self.assertEqual(response.status_code, 200)
+        # the product and its prefetched brands
+        self.assertIn('2 queries', response['Server-Timing'])
+        await asyncio.gather(*_background_tasks)
+        self.assertEqual(get_view_counter().drain(), {self.product.pk: 1})
+
+        with override_settings(ROOT_URLCONF='catalog_app.urls'):
+            sync_response = await sync_to_async(self.client.get)(url)
+        self.assertEqual(json.loads(response.content), sync_response.json())
+        self.assertEqual(response['ETag'], sync_response['ETag'])
+        self.assertEqual(response['Allow'], sync_response['Allow'])
+
+        cached = await self.async_client.get(url)
+        self.assertIn('0 queries', cached['Server-Timing'])
+        self.assertEqual(cached.content, response.content)
+
+    async def test_missing_product_falls_back_to_sync_view(self):
+        response = await self.async_client.get(reverse('product_retrieve_update_destroy', args=[999]))
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(json.loads(response.content), {'detail': 'Not found.'})
+
+    async def test_misses_take_one_throttle_token(self):
+        consume = LocalBucketStore.consume
+        with mock.patch.object(LocalBucketStore, 'consume', autospec=True, side_effect=consume) as spy:
+            response = await self.async_client.get(reverse('product_retrieve_update_destroy', args=[999]))
+            self.assertEqual(response.status_code, 404)
+            await sync_to_async(self.async_client.force_login)(self.admin)
+            response = await self.async_client.get(reverse('product_list_create'), {'page': 9})
+            self.assertEqual(response.status_code, 404)
+        scopes = [call.args[1].split('_')[1] for call in spy.call_args_list]
+        self.assertEqual((scopes.count('anon'), scopes.count('user')), (1, 1))
+
+    async def test_background_jobs_recycle_connections(self):
+        # with the connection pool (CONN_MAX_AGE = 0) closing returns the thread's connection
+        calls = []
+        with mock.patch('products.async_views.close_old_connections', lambda: calls.append('close')):
+            fire_and_forget(calls.append, 'job')
+            fire_and_forget(int, 'not a number')
+            with self.assertLogs('products.async_views', 'ERROR'):
+                await asyncio.gather(*_background_tasks, return_exceptions=True)
+        self.assertEqual(calls.count('close'), 4)
+        self.assertEqual(calls[calls.index('job') - 1:calls.index('job') + 2], ['close', 'job', 'close'])
+
+    async def test_list_pages_match_sync_view(self):
+        await sync_to_async(self.async_client.force_login)(self.admin)
+        await sync_to_async(self.client.force_login)(self.admin)
+        url = reverse('product_list_create')
+        for params in ({}, {'page': 2}, {'page': 'last', 'page_size': 5}, {'search': 'Product'}, {'page': 9}):
+            response = await self.async_client.get(url, params)
+            with override_settings(ROOT_URLCONF='catalog_app.urls'):
+                sync_response = await sync_to_async(self.client.get)(url, params)
+            self.assertEqual(response.status_code, sync_response.status_code, params)
+            self.assertEqual(response.content, sync_response.content, params)
+            self.assertEqual(response.get('ETag'), sync_response.get('ETag'), params)
+
+    async def test_anonymous_list_and_writes_use_sync_view(self):
+        url = reverse('product_list_create')
+        self.assertEqual((await self.async_client.get(url)).status_code, 403)
+
+        await sync_to_async(self.async_client.force_login)(self.admin)
+        detail = reverse('product_retrieve_update_destroy', args=[self.product.pk])
+        response = await self.async_client.patch(detail, {'name': 'Renamed'}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((await Product.objects.aget(pk=self.product.pk)).name, 'Renamed')
@@ -0,0 +1,99 @@
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group, Permission
+from django.core.cache import caches
+from django.core.cache.backends.filebased import FileBasedCache
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APITestCase
+
+from products.authentication import CachedTokenAuthentication
+from products.models import Product
+
+
+class CachedTokenAuthenticationTest(APITestCase):
+    @classmethod
+    def setUpClass(cls):
+        # a file cache stands in for a cache shared by the workers, like redis or memcached
+        directory = tempfile.TemporaryDirectory()
+        cls.addClassCleanup(directory.cleanup)
+        cls.cache_location = directory.name
+        shared = override_settings(CACHES={**settings.CACHES, 'tokens': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': directory.name}})
+        shared.enable()
+        cls.addClassCleanup(shared.disable)
+        super().setUpClass()
+
+    def setUp(self):
+        caches['tokens'].clear()
+        self.user = get_user_model().objects.create_user('client', 'client@example.com', 'password')
+        self.token = Token.objects.create(user=self.user)
+        self.group = Group.objects.create(name='Catalog')
+        self.user.groups.add(self.group)
+        self.authentication = CachedTokenAuthentication()
+
+    def authenticate(self, key=None):
+        return self.authentication.authenticate_credentials(key or self.token.key)[0]
+
+    def test_cached_token_costs_no_query(self):
+        self.authenticate()
+        with self.assertNumQueries(0):
+            user = self.authenticate()
+            self.assertFalse(user.has_perm('products.add_product'))
+
+    def test_permission_changes_are_picked_up(self):
+        self.authenticate()
+        self.group.permissions.add(Permission.objects.get(codename='add_product'))
+        self.assertTrue(self.authenticate().has_perm('products.add_product'))
+
+        self.user.groups.clear()
+        self.assertFalse(self.authenticate().has_perm('products.add_product'))
+
+        self.user.user_permissions.add(Permission.objects.get(codename='change_product'))
+        self.assertTrue(self.authenticate().has_perm('products.change_product'))
+
+    def test_user_and_token_changes_are_picked_up(self):
+        self.authenticate()
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+        self.user.is_active = True
+        self.user.save()
+        key = self.token.key
+        self.authenticate()
+        self.token.delete()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(key)
+
+    def test_revocation_reaches_other_workers(self):
+        self.authenticate()
+        worker = caches['tokens']
+        # the change is made by another worker, through its own connection to the shared cache
+        caches['tokens'] = FileBasedCache(self.cache_location, {})
+        self.user.is_active = False
+        self.user.save()
+        caches['tokens'] = worker
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    @override_settings(TOKEN_AUTH_CACHE={'CACHE': 'default'})
+    def test_process_local_caches_are_not_used(self):
+        self.authenticate()
+        with self.assertNumQueries(1):
+            self.authenticate()
+
+    def test_token_request_adds_no_query(self):
+        Product.objects.create(name='Product1', price=10.0, description='Test description')
+        url = reverse('product_retrieve_update_destroy', args=[Product.objects.get().pk])
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+        # served from the product cache, with the token from the token cache
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
@@ -0,0 +1,42 @@
+from django.core.asgi import get_asgi_application
+from django.core.wsgi import get_wsgi_application
+from django.test import TransactionTestCase, override_settings
+
+from products.benchmarking import (QueryCountingApplication, asgi_load_test, compare_results, load_test,
+                                   summarize_load, wsgi_load_test, wsgi_server)
+from products.cache import product_cache
+from products.counters import get_view_counter
+from products.models import Product
+
+
+class BenchmarkHarnessTest(TransactionTestCase):
+    def test_load_test_reports_latency_and_queries(self):
+        with override_settings(ALLOWED_HOSTS=['127.0.0.1']), \
+                wsgi_server(QueryCountingApplication(get_wsgi_application())) as base_url:
+            result = summarize_load(load_test(base_url, ['/api/v1/products/999/'] * 6, concurrency=3))
+        self.assertEqual(result['requests'], 6)
+        self.assertEqual(result['statuses'], {'404': 6})
+        self.assertEqual(result['queries_per_request'], 1)
+        self.assertGreater(result['throughput_rps'], 0)
+
+    @override_settings(ALLOWED_HOSTS=['127.0.0.1'], PERFORMANCE_METRICS={'SERVER_TIMING': True})
+    def test_in_process_drivers(self):
+        product = Product.objects.create(name='Product1', price=10.0, description='Test description')
+        paths = [f'/api/v1/products/{product.pk}/'] * 6
+        wsgi = summarize_load(wsgi_load_test(get_wsgi_application(), paths, concurrency=1))
+        product_cache.invalidate(product.pk)
+        with override_settings(ROOT_URLCONF='catalog_app.asgi_urls'):
+            asgi = summarize_load(asgi_load_test(get_asgi_application(), paths, concurrency=1))
+        get_view_counter().drain()
+        for result in (wsgi, asgi):
+            self.assertEqual(result['statuses'], {'200': 6})
+            # the product and its brands are read once, then served from the product cache
+            self.assertEqual(result['queries_per_request'], round(2 / 6, 2))
+
+    def test_compare_results_flags_regressions(self):
+        def results(p95, queries):
+            return {'endpoints': {'product_list': {'latency_ms': {'p95': p95}, 'queries_per_request': queries}}}
+
+        self.assertEqual(compare_results(results(10, 4), results(11, 4)), [('product_list', 10, 11, 1.1, False)])
+        self.assertTrue(compare_results(results(10, 4), results(20, 4))[0][4])
+        self.assertTrue(compare_results(results(10, 4), results(10, 5))[0][4])
@@ -0,0 +1,114 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from products.brand_counts import repair_product_counts
+from products.importers import import_products
+from products.models import Brand, CustomUser, Product
+
+
+def product_counts():
+    return dict(Brand.objects.order_by('pk').values_list('name', 'product_count'))
+
+
+class BrandProductCountTest(TestCase):
+    def setUp(self):
+        self.first, self.second = Brand.objects.create(name='First'), Brand.objects.create(name='Second')
+        self.products = [
+            Product.objects.create(sku=i, name=f'Product {i}', price=1, description='Description') for i in range(3)]
+
+    def test_links_are_counted_from_both_sides(self):
+        self.products[0].brand.add(self.first, self.second)
+        self.products[0].brand.add(self.first)
+        self.second.products.add(*self.products[1:])
+        self.assertEqual(product_counts(), {'First': 1, 'Second': 3})
+
+        # removing a brand the product is not linked to changes nothing
+        self.products[1].brand.remove(self.first, self.second)
+        self.assertEqual(product_counts(), {'First': 1, 'Second': 2})
+        self.products[0].brand.clear()
+        self.assertEqual(product_counts(), {'First': 0, 'Second': 1})
+        self.second.products.set([self.products[0], self.products[1]])
+        self.assertEqual(product_counts(), {'First': 0, 'Second': 2})
+        self.second.products.clear()
+        self.assertEqual(product_counts(), {'First': 0, 'Second': 0})
+
+    def test_deleted_products_are_uncounted(self):
+        for product in self.products:
+            product.brand.add(self.first)
+        self.products[0].delete()
+        Product.objects.filter(pk=self.products[1].pk).delete()
+        self.assertEqual(product_counts(), {'First': 1, 'Second': 0})
+
+    def test_imports_replace_counted_links(self):
+        self.products[0].brand.add(self.first)
+        import_products([
+            (1, {'id': self.products[0].pk, 'sku': 1, 'name': 'Imported', 'price': '2.00', 'description': 'New',
+                 'brand': [self.second.pk]}),
+            (2, {'sku': 1, 'name': 'Created', 'price': '2.00', 'description': 'New',
+                 'brand': [self.first.pk, self.second.pk]}),
+        ], notify=False)
+        self.assertEqual(product_counts(), {'First': 1, 'Second': 2})
+
+    def test_repair(self):
+        Product.brand.through.objects.bulk_create([
+            Product.brand.through(product_id=product.pk, brand_id=self.first.pk) for product in self.products])
+        self.products[0].brand.add(self.second)
+        self.assertEqual(product_counts(), {'First': 0, 'Second': 1})
+        self.assertEqual(repair_product_counts(batch_size=1), 1)
+        self.assertEqual(product_counts(), {'First': 3, 'Second': 1})
+        self.assertEqual(repair_product_counts(), 0)
+
+    def test_repair_command(self):
+        Brand.objects.filter(pk=self.first.pk).update(product_count=5)
+        out = StringIO()
+        call_command('repair_brand_counts', stdout=out)
+        self.assertEqual(out.getvalue(), '1 brand counters repaired\n')
+        self.assertEqual(product_counts(), {'First': 0, 'Second': 0})
+
+
+class BrandCountAPITest(APITestCase):
+    def setUp(self):
+        self.client.force_authenticate(CustomUser.objects.create_superuser(
+            username='admin', email='admin@example.com', password='password'))
+        self.brand = Brand.objects.create(name='Brand')
+        Brand.objects.create(name='Empty')
+        self.products = [
+            Product.objects.create(sku=sku, name=f'Product {sku}', price=1, description='Description')
+            for sku in (0, 1, 5)]
+        self.brand.products.add(*self.products)
+
+    def test_counts(self):
+        response = self.client.get(reverse('brand_list_create'))
+        self.assertEqual([brand['product_count'] for brand in response.data['results']], [3, 0])
+        self.assertNotIn('in_stock_count', response.data['results'][0])
+
+        response = self.client.get(reverse('brand_list_create'), {'in_stock_count': 'true'})
+        self.assertEqual([(brand['product_count'], brand['in_stock_count']) for brand in response.data['results']],
+                         [(3, 2), (0, 0)])
+        url = reverse('brand_retrieve_update_destroy', args=[self.brand.pk])
+        self.assertEqual(self.client.get(url, {'in_stock_count': '1'}).data['in_stock_count'], 2)
+        self.assertEqual(self.client.get(url, {'in_stock_count': 'x'}).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_counts_are_read_only(self):
+        url = reverse('brand_retrieve_update_destroy', args=[self.brand.pk])
+        response = self.client.patch(url, {'name': 'Renamed', 'product_count': 100})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['product_count'], 3)
+
+    def assert_etag_changes(self, params, change):
+        url = reverse('brand_list_create')
+        etag = self.client.get(url, params)['ETag']
+        self.assertEqual(self.client.get(url, params, HTTP_IF_NONE_MATCH=etag).status_code,
+                         status.HTTP_304_NOT_MODIFIED)
+        change()
+        self.assertEqual(self.client.get(url, params, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+
+    def test_etags_follow_the_counts(self):
+        self.assert_etag_changes({}, self.products[0].brand.clear)
+        # stock levels change the in-stock count without changing the brand
+        self.assert_etag_changes({'in_stock_count': 'true'}, lambda: self.products[1].remove_inventory(1))
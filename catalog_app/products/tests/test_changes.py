@@ -0,0 +1,160 @@
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from products.changes import compact_changes, read_changes, sequence_changes
+from products.inventory import apply_stock_adjustments
+from products.models import Brand, ChangeLog, CustomUser, Product
+
+CHANGE_FEED = {'BATCH_SIZE': 500, 'MAX_BATCH_SIZE': 5000, 'TOMBSTONE_RETENTION': 3600}
+
+
+def logged():
+    return list(ChangeLog.objects.order_by('pk').values_list('kind', 'object_id', 'action'))
+
+
+@override_settings(CHANGE_FEED=CHANGE_FEED)
+class ChangeLogTest(TestCase):
+    def setUp(self):
+        self.brand = Brand.objects.create(name='Brand')
+        self.product = Product.objects.create(name='Product1', price=10.0, description='Test description')
+        ChangeLog.objects.all().delete()
+
+    def test_writes_are_logged(self):
+        product_id, brand_id = self.product.pk, self.brand.pk
+        self.product.brand.add(self.brand)
+        self.product.add_inventory(5)
+        apply_stock_adjustments([(product_id, 1)])
+        # deleting a brand changes the representation of its products
+        self.brand.delete()
+        self.product.delete()
+        # linking changes the brand's product count too
+        self.assertEqual(logged(), [('product', product_id, 'upsert'), ('brand', brand_id, 'upsert')] + [
+            ('product', product_id, 'upsert')] * 3 + [
+            ('brand', brand_id, 'delete'),
+            ('product', product_id, 'delete'),
+        ])
+
+    def test_batches_hold_the_latest_change_of_each_object(self):
+        self.product.name = 'Renamed'
+        self.product.save()
+        self.product.brand.add(self.brand)
+        other = Product.objects.create(name='Product2', price=1, description='Description')
+        other_id = other.pk
+        other.delete()
+
+        batch = read_changes()
+        self.assertEqual([(change['type'], change['id'], change['action']) for change in batch['changes']], [
+            ('product', self.product.pk, 'upsert'),
+            ('brand', self.brand.pk, 'upsert'),
+            ('product', other_id, 'delete'),
+        ])
+        self.assertEqual(batch['changes'][0]['data']['name'], 'Renamed')
+        self.assertEqual(batch['changes'][0]['data']['brand'], [self.brand.pk])
+        self.assertEqual(batch['changes'][1]['data']['product_count'], 1)
+        self.assertIsNone(batch['changes'][2]['data'])
+        self.assertEqual(batch['next'], ChangeLog.objects.order_by('seq').last().seq)
+        self.assertFalse(batch['has_more'])
+        self.assertEqual(read_changes(batch['next'])['changes'], [])
+
+    def test_changes_are_numbered_in_commit_order(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
+        first = ChangeLog.objects.get()
+        self.assertIsNotNone(first.seq)
+
+        # a long transaction logged a change before a short one, which committed first
+        slow = ChangeLog.objects.create(kind=ChangeLog.PRODUCT, object_id=self.product.pk, action=ChangeLog.UPSERT)
+        fast = ChangeLog.objects.create(kind=ChangeLog.BRAND, object_id=self.brand.pk, action=ChangeLog.UPSERT)
+        slow_id = slow.pk
+        slow.delete()
+        batch = read_changes(first.seq)
+        self.assertEqual([(change['seq'], change['type']) for change in batch['changes']], [(first.seq + 1, 'brand')])
+
+        # when the long transaction commits, its change follows those already read
+        slow.pk = slow_id
+        slow.save(force_insert=True)
+        self.assertLess(slow.pk, fast.pk)
+        batch = read_changes(batch['next'])
+        self.assertEqual([(change['seq'], change['type']) for change in batch['changes']], [(first.seq + 2, 'product')])
+        self.assertEqual(sequence_changes(), [])
+
+    def test_compaction(self):
+        for price in (1, 2, 3):
+            self.product.price = price
+            self.product.save()
+        Brand.objects.create(name='Deleted').delete()
+        # the brand upsert is superseded by its tombstone
+        self.assertEqual(compact_changes(), {'superseded': 3, 'purged': 0})
+        self.assertEqual([action for _, _, action in logged()], ['upsert', 'delete'])
+
+        self.assertEqual(compact_changes(now=timezone.now() + timedelta(hours=2)), {'superseded': 0, 'purged': 1})
+        self.assertEqual(logged(), [('product', self.product.pk, 'upsert')])
+
+
+@override_settings(CHANGE_FEED=CHANGE_FEED)
+class ChangeFeedAPITest(APITestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_superuser(
+            username='testuser', email='test@example.com', password='testpassword')
+        self.client.force_authenticate(self.user)
+        self.url = reverse('change_feed')
+
+    def sync(self, mirror, after=0, limit=2):
+        """
+        Applies the feed to a ``{(type, id): data}`` mirror and returns the next ``after``.
+        """
+        while True:
+            response = self.client.get(self.url, {'after': after, 'limit': limit})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            for change in response.data['changes']:
+                if change['action'] == 'delete':
+                    mirror.pop((change['type'], change['id']), None)
+                else:
+                    mirror[change['type'], change['id']] = change['data']
+            after = response.data['next']
+            if not response.data['has_more']:
+                return after
+
+    def catalog(self):
+        mirror = {}
+        for brand in self.client.get(reverse('brand_list_create'), {'page_size': 100}).data['results']:
+            mirror['brand', brand['id']] = dict(brand)
+        for product in self.client.get(reverse('product_list_create'), {'page_size': 100}).data['results']:
+            mirror['product', product['id']] = dict(product)
+        return mirror
+
+    def test_mirror_converges(self):
+        brands = [Brand.objects.create(name=f'Brand {i}') for i in range(3)]
+        products = [Product.objects.create(name=f'Product {i}', price=i, description='Description') for i in range(5)]
+        products[0].brand.add(brands[0], brands[1])
+        mirror = {}
+        after = self.sync(mirror)
+        self.assertEqual(mirror, self.catalog())
+
+        products[1].delete()
+        brands[1].delete()
+        products[2].name = 'Renamed'
+        products[2].save()
+        self.assertEqual(len(self.client.get(self.url, {'after': after}).data['changes']), 4)
+        self.sync(mirror, after)
+        self.assertEqual(mirror, self.catalog())
+
+    def test_purged_tombstones_require_a_full_sync(self):
+        product = Product.objects.create(name='Product', price=1, description='Description')
+        after = self.sync({})
+        product.delete()
+        compact_changes(now=timezone.now() + timedelta(hours=2))
+        response = self.client.get(self.url, {'after': after})
+        self.assertEqual(response.status_code, status.HTTP_410_GONE)
+        self.assertGreater(response.data['purged_until'], after)
+        self.assertEqual(self.client.get(self.url, {'after': 0}).status_code, status.HTTP_200_OK)
+
+    def test_parameters(self):
+        self.assertEqual(self.client.get(self.url, {'after': 'x'}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_403_FORBIDDEN)
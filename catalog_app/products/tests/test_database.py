@@ -0,0 +1,45 @@
+from unittest import mock
+
+from django.test import SimpleTestCase, TransactionTestCase
+
+from catalog_app.settings.database import postgresql_profile, replica_profiles, sqlite_profile
+from products.benchmarking import connection_overhead, connection_profiles, connection_settings
+
+
+class DatabaseProfileTest(SimpleTestCase):
+    def test_persistent_connections_by_default(self):
+        with mock.patch.dict('os.environ', {'DB_HOST': 'db', 'DB_PORT': '6432'}):
+            profile = postgresql_profile()
+        self.assertEqual(profile['ENGINE'], 'django.db.backends.postgresql')
+        self.assertEqual((profile['HOST'], profile['PORT']), ('db', 6432))
+        self.assertEqual(profile['CONN_MAX_AGE'], 60)
+        self.assertTrue(profile['CONN_HEALTH_CHECKS'])
+        self.assertEqual(sqlite_profile('db.sqlite3')['CONN_MAX_AGE'], 60)
+
+    def test_pool(self):
+        with mock.patch.dict('os.environ', {'DB_POOL': '1', 'DB_POOL_MAX_SIZE': '20', 'DB_CONN_MAX_AGE': '600'}):
+            profile = postgresql_profile()
+        self.assertEqual(profile['ENGINE'], 'catalog_app.db.postgresql_pool')
+        self.assertEqual(profile['CONN_MAX_AGE'], 0)
+        self.assertEqual(profile['OPTIONS']['pool'], {'min_size': 2, 'max_size': 20, 'timeout': 10.0})
+
+    def test_replicas(self):
+        with mock.patch.dict('os.environ', {'DB_REPLICAS': 'replica-a:6432=3, replica-b'}):
+            databases, weights = replica_profiles(postgresql_profile())
+        self.assertEqual(weights, {'replica_1': 3, 'replica_2': 1})
+        self.assertEqual((databases['replica_1']['HOST'], databases['replica_1']['PORT']), ('replica-a', 6432))
+        self.assertEqual((databases['replica_2']['HOST'], databases['replica_2']['PORT']), ('replica-b', 5432))
+        self.assertEqual(databases['replica_2']['TEST'], {'MIRROR': 'default'})
+        with mock.patch.dict('os.environ', {'DB_REPLICAS': 'replica.sqlite3'}):
+            databases, weights = replica_profiles(sqlite_profile('db.sqlite3'))
+        self.assertEqual(databases['replica_1']['NAME'], 'replica.sqlite3')
+
+
+class ConnectionOverheadTest(TransactionTestCase):
+    def test_persistent_connections_are_reused(self):
+        profiles = connection_profiles()
+        self.assertEqual(set(profiles), {'per_request', 'persistent'})
+        with connection_settings(**profiles['per_request']):
+            self.assertEqual(connection_overhead(5)['connections'], 5)
+        with connection_settings(**profiles['persistent']):
+            self.assertEqual(connection_overhead(5)['connections'], 1)
@@ -0,0 +1,208 @@
+import asyncio
+import threading
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.handlers.asgi import ASGIHandler
+from django.db import DatabaseError
+from django.test import AsyncRequestFactory, SimpleTestCase, TransactionTestCase, override_settings
+from rest_framework.authtoken.models import Token
+
+from products.async_views import product_events
+from products.events import (
+    OVERFLOW, CancelOnDisconnectMiddleware, EventHub, SocketBroker, hub, run_broker,
+)
+from products.models import ChangeLog, Product
+from products.throttling import get_bucket_store
+
+EVENTS_PATH = '/api/v1/products/events/'
+
+
+def event(seq, product_id=1, action='upsert'):
+    return {'seq': seq, 'id': product_id, 'action': action}
+
+
+class EventHubTest(SimpleTestCase):
+    async def test_fan_out(self):
+        hub = EventHub()
+        first, second = hub.subscribe(), hub.subscribe()
+        hub.dispatch(event(1))
+        for subscription in (first, second):
+            seq, message = subscription.queue.get_nowait()
+            self.assertEqual(seq, 1)
+            self.assertEqual(message, b'id: 1\nevent: product\ndata: {"seq":1,"id":1,"action":"upsert"}\n\n')
+
+        hub.unsubscribe(first)
+        self.assertEqual(hub.stats(), {'subscribers': 1, 'dropped': 0})
+
+    async def test_dispatch_from_another_thread(self):
+        hub = EventHub()
+        subscription = hub.subscribe()
+        await asyncio.to_thread(hub.dispatch, event(1))
+        self.assertEqual((await asyncio.wait_for(subscription.queue.get(), 1))[0], 1)
+
+    async def test_slow_subscribers_overflow(self):
+        hub = EventHub()
+        slow, fast = hub.subscribe(size=2), hub.subscribe(size=10)
+        for seq in range(1, 4):
+            hub.dispatch(event(seq))
+        self.assertIs(slow.queue.get_nowait(), OVERFLOW)
+        self.assertTrue(slow.queue.empty())
+        self.assertEqual(fast.queue.qsize(), 3)
+        self.assertEqual(hub.stats(), {'subscribers': 2, 'dropped': 1})
+
+
+class SocketBrokerTest(SimpleTestCase):
+    def test_round_trip(self):
+        loop = asyncio.new_event_loop()
+        listening = threading.Event()
+        addresses = []
+
+        def started(server):
+            addresses.append(server.sockets[0].getsockname())
+            listening.set()
+
+        async def serve():
+            server = asyncio.ensure_future(run_broker('127.0.0.1', 0, started))
+            await stopping.wait()
+            server.cancel()
+            await asyncio.gather(server, return_exceptions=True)
+
+        stopping = asyncio.Event()
+        thread = threading.Thread(target=loop.run_until_complete, args=(serve(),), daemon=True)
+        thread.start()
+        self.addCleanup(loop.close)
+        self.addCleanup(thread.join, 5)
+        self.addCleanup(loop.call_soon_threadsafe, stopping.set)
+        self.assertTrue(listening.wait(5))
+
+        receiving = EventHub()
+        broker = SocketBroker(receiving, *addresses[0], retry_interval=0.05)
+        self.addCleanup(broker.close)
+
+        async def receive():
+            subscription = receiving.subscribe()
+            broker.start()
+            # the listener may connect after the first events were published
+            while True:
+                await asyncio.to_thread(broker.publish, event(1))
+                try:
+                    return await asyncio.wait_for(subscription.queue.get(), 0.1)
+                except asyncio.TimeoutError:
+                    pass
+
+        self.assertEqual(asyncio.run(asyncio.wait_for(receive(), 5))[0], 1)
+
+    def test_unreachable_broker_drops_events(self):
+        broker = SocketBroker(EventHub(), '127.0.0.1', 1, retry_interval=60)
+        with self.assertLogs('products.events', 'WARNING') as logs:
+            broker.publish(event(1))
+            broker.publish(event(2))
+        self.assertEqual(len(logs.output), 1)
+
+
+class Stream:
+    """
+    A raw ASGI request to the event stream, read message by message.
+    """
+
+    def __init__(self, headers=(), query_string=b''):
+        self.received = asyncio.Queue()
+        self.sent = asyncio.Queue()
+        self.received.put_nowait({'type': 'http.request', 'body': b'', 'more_body': False})
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+            'path': EVENTS_PATH, 'raw_path': EVENTS_PATH.encode(), 'root_path': '', 'query_string': query_string,
+            'headers': [(name.lower().encode(), value.encode()) for name, value in headers],
+            'client': ('127.0.0.1', 50000), 'server': ('testserver', 80),
+        }
+        application = CancelOnDisconnectMiddleware(ASGIHandler(), [EVENTS_PATH])
+        self.task = asyncio.ensure_future(application(scope, self.received.get, self.sent.put))
+
+    async def start(self):
+        return await asyncio.wait_for(self.sent.get(), 5)
+
+    async def read(self):
+        """
+        Returns the next part of the body, skipping the connection settings.
+        """
+        while True:
+            body = (await asyncio.wait_for(self.sent.get(), 5)).get('body', b'')
+            if not body.startswith(b'retry:'):
+                return body
+
+    async def disconnect(self):
+        await self.received.put({'type': 'http.disconnect'})
+        await asyncio.wait_for(self.task, 5)
+
+
+@override_settings(ROOT_URLCONF='catalog_app.asgi_urls',
+                   EVENT_STREAM={'QUEUE_SIZE': 2, 'HEARTBEAT': 15, 'BROKER': 'products.events.LocalBroker'})
+class ProductEventStreamTest(TransactionTestCase):
+    def setUp(self):
+        admin = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'password')
+        user = get_user_model().objects.create_user('user', 'user@example.com', 'password')
+        self.admin_headers = [('Authorization', f'Token {Token.objects.create(user=admin).key}')]
+        self.user_headers = [('Authorization', f'Token {Token.objects.create(user=user).key}')]
+
+    def tearDown(self):
+        get_bucket_store().clear()
+
+    async def test_admins_only(self):
+        for headers, status in (([], 401), (self.user_headers, 403)):
+            stream = Stream(headers)
+            self.assertEqual((await stream.start())['status'], status)
+            await stream.disconnect()
+
+    async def test_events_are_streamed_until_disconnect(self):
+        stream = Stream(self.admin_headers)
+        start = await stream.start()
+        self.assertEqual(start['status'], 200)
+        self.assertIn((b'Content-Type', b'text/event-stream'), start['headers'])
+        await asyncio.sleep(0.1)
+        self.assertEqual(hub.stats()['subscribers'], 1)
+
+        hub.dispatch(event(7, 3))
+        self.assertEqual(await stream.read(), b'id: 7\nevent: product\ndata: {"seq":7,"id":3,"action":"upsert"}\n\n')
+
+        await stream.disconnect()
+        self.assertEqual(hub.stats()['subscribers'], 0)
+
+    async def test_reconnecting_replays_missed_changes(self):
+        product = await Product.objects.acreate(name='Product', price=1, description='Description')
+        seq = await ChangeLog.objects.filter(object_id=product.pk).order_by('seq').values_list('seq', flat=True).alast()
+        stream = Stream(self.admin_headers + [('Last-Event-ID', str(seq - 1))])
+        await stream.start()
+        self.assertIn(f'"seq":{seq},"id":{product.pk}'.encode(), await stream.read())
+
+        # a replayed change that is also published is sent once
+        hub.dispatch(event(seq, product.pk))
+        hub.dispatch(event(seq + 1, product.pk))
+        self.assertIn(f'id: {seq + 1}\n'.encode(), await stream.read())
+        await stream.disconnect()
+
+    async def test_slow_clients_are_told_to_catch_up(self):
+        stream = Stream(self.admin_headers, query_string=b'after=5')
+        await stream.start()
+        await asyncio.sleep(0.1)
+        # the stream is not read while the events are queued
+        for seq in range(6, 10):
+            hub.dispatch(event(seq))
+        messages = [await stream.read() for _ in range(2)]
+        self.assertEqual(messages[0], b'event: reset\ndata: {"after":5}\n\n')
+        self.assertEqual(messages[1], b'')
+        await stream.disconnect()
+
+    async def test_failing_replays_unsubscribe(self):
+        with mock.patch('products.async_views.replay_changes', side_effect=DatabaseError('Replica is gone')):
+            stream = Stream(self.admin_headers, query_string=b'after=5')
+            self.assertEqual((await stream.start())['status'], 200)
+            with self.assertRaises(DatabaseError):
+                await asyncio.wait_for(stream.task, 5)
+        self.assertEqual(hub.stats()['subscribers'], 0)
+
+    async def test_responses_that_never_stream_do_not_subscribe(self):
+        request = AsyncRequestFactory().get(EVENTS_PATH, headers=dict(self.admin_headers))
+        response = await product_events(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(hub.stats()['subscribers'], 0)
@@ -0,0 +1,108 @@
+import io
+import json
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from products.importers import import_products, iter_csv_rows, iter_jsonl_rows
+from products.models import Brand, CustomUser, Notification, Product
+
+
+class ProductImportTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.brand = Brand.objects.create(name='Brand1')
+        cls.other_brand = Brand.objects.create(name='Brand2')
+        cls.product = Product.objects.create(sku=1, name='Existing', price=1, description='Old description')
+        cls.product.brand.add(cls.brand)
+
+    def test_csv_import_creates_and_updates(self):
+        data = (
+            'id,sku,name,price,description,brand\n'
+            f'{self.product.id},5,Updated,2.50,New description,{self.other_brand.id}\n'
+            f',3,Created,1.00,Description,"{self.brand.id};{self.other_brand.id}"\n'
+            ',x,Broken,1.00,Description,\n'
+        )
+        notifications = Notification.objects.count()
+        result = import_products(iter_csv_rows(io.BytesIO(data.encode())), chunk_size=2)
+
+        self.assertEqual((result.created, result.updated, result.failed), (1, 1, 1))
+        self.assertEqual(result.errors[0]['line'], 4)
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.name, self.product.sku), ('Updated', 5))
+        self.assertEqual(list(self.product.brand.values_list('id', flat=True)), [self.other_brand.id])
+        created = Product.objects.get(name='Created')
+        self.assertEqual(set(created.brand.values_list('id', flat=True)), {self.brand.id, self.other_brand.id})
+        # a single digest instead of one notification per product
+        self.assertEqual(Notification.objects.count(), notifications + 1)
+
+    def test_upserts_keep_columns_they_leave_out(self):
+        self.product.add_inventory(49)
+        data = (
+            'id,name,price,description\n'
+            f'{self.product.id},Renamed,2.00,Description\n'
+        )
+        with mock.patch('products.importers.advance_id_sequence') as advance:
+            result = import_products(iter_csv_rows(io.BytesIO(data.encode())))
+        self.assertEqual(result.updated, 1)
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.name, self.product.sku), ('Renamed', 50))
+        self.assertEqual(list(self.product.brand.values_list('id', flat=True)), [self.brand.id])
+        # only existing ids were upserted: the id sequence is left alone
+        advance.assert_not_called()
+
+    def test_explicit_ids_advance_the_id_sequence(self):
+        explicit_id = self.product.id + 100
+        with mock.patch('products.importers.advance_id_sequence') as advance:
+            import_products([(1, {'id': explicit_id, 'name': 'Explicit', 'price': '1.00', 'description': 'New'})])
+        advance.assert_called_once_with()
+        self.assertEqual(Product.objects.get(pk=explicit_id).sku, 0)
+        self.assertGreater(Product.objects.create(name='Next', price=1, description='New').pk, explicit_id)
+
+    def test_jsonl_import_rejects_unknown_brands(self):
+        lines = [
+            {'sku': 1, 'name': 'First', 'price': '1.00', 'description': 'Description', 'brand': [self.brand.id]},
+            {'sku': 1, 'name': 'Second', 'price': '1.00', 'description': 'Description', 'brand': [999999]},
+            'not an object',
+        ]
+        data = '\n'.join(json.dumps(line) for line in lines) + '\n\n{broken'
+        result = import_products(iter_jsonl_rows(io.BytesIO(data.encode())))
+        self.assertEqual((result.created, result.failed), (1, 3))
+        self.assertIn('brand', result.errors[0]['errors'])
+        self.assertEqual([error['line'] for error in result.errors], [2, 3, 5])
+
+    def test_import_products_command(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl') as f:
+            f.write(json.dumps({'sku': 1, 'name': 'Imported', 'price': '3.00', 'description': 'Description'}))
+            f.flush()
+            out = StringIO()
+            call_command('import_products', f.name, stdout=out)
+        self.assertIn('1 created', out.getvalue())
+        self.assertTrue(Product.objects.filter(name='Imported').exists())
+
+
+class ProductImportAPITest(APITestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_superuser(
+            username='testuser', email='test@example.com', password='testpassword')
+        self.url = reverse('product_import')
+
+    def test_import_upload(self):
+        upload = SimpleUploadedFile('feed.csv', b'sku,name,price,description\n7,Uploaded,4.00,Description\n')
+        self.client.force_authenticate(self.user)
+        response = self.client.post(self.url, {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['created'], 1)
+        self.assertTrue(Product.objects.filter(name='Uploaded', sku=7).exists())
+
+    def test_import_requires_admin(self):
+        upload = SimpleUploadedFile('feed.csv', b'sku,name,price,description\n')
+        response = self.client.post(self.url, {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
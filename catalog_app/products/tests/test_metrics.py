@@ -0,0 +1,63 @@
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from products.counters import get_view_counter
+from products.metrics import Histogram, registry
+from products.models import CustomUser, Product
+from products.throttling import get_bucket_store
+
+SERVER_TIMING = {'SERVER_TIMING': True, 'SLOW_QUERY_MS': 0, 'SLOW_QUERY_SAMPLE_RATE': 1.0}
+
+
+class HistogramTest(SimpleTestCase):
+    def test_cumulative_buckets(self):
+        histogram = Histogram((0.1, 1))
+        for value in (0.05, 0.1, 0.5, 3):
+            histogram.observe(value)
+        self.assertEqual(histogram.cumulative(), [('0.1', 2), ('1', 3), ('+Inf', 4)])
+        self.assertEqual(histogram.count, 4)
+        self.assertAlmostEqual(histogram.sum, 3.65)
+
+
+class PerformanceMiddlewareTest(APITestCase):
+    def setUp(self):
+        registry.reset()
+        self.user = CustomUser.objects.create_superuser(
+            username='testuser', email='test@example.com', password='testpassword')
+        self.product = Product.objects.create(name='Product1', price=10.0, description='Test description')
+        self.url = reverse('product_retrieve_update_destroy', args=[self.product.pk])
+
+    def tearDown(self):
+        get_view_counter().drain()
+        get_bucket_store().clear()
+
+    def test_server_timing_is_off_by_default(self):
+        self.assertFalse(self.client.get(self.url).has_header('Server-Timing'))
+
+    @override_settings(PERFORMANCE_METRICS=SERVER_TIMING)
+    def test_server_timing_and_slow_query_sampling(self):
+        with self.assertLogs('products.slow_queries', 'WARNING') as logs:
+            response = self.client.get(self.url)
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.assertIn('cache;desc="0 hits, 1 misses"', response['Server-Timing'])
+        self.assertIn('Slow query on product_retrieve_update_destroy', logs.output[0])
+
+    def test_metrics_endpoint(self):
+        self.client.get(self.url)
+        self.client.get(self.url)
+        metrics_url = reverse('metrics')
+        self.assertEqual(self.client.get(metrics_url).status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.force_authenticate(self.user)
+        response = self.client.get(metrics_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        body = response.content.decode()
+        labels = 'route="product_retrieve_update_destroy",method="GET"'
+        self.assertIn(f'catalog_request_duration_seconds_count{{{labels}}} 2', body)
+        self.assertIn(f'catalog_request_db_queries_bucket{{{labels},le="+Inf"}} 2', body)
+        self.assertIn(f'catalog_responses_total{{{labels},status="2xx"}} 2', body)
+        self.assertIn('catalog_product_cache_requests_total{route="product_retrieve_update_destroy",result="hit"} 1',
+                      body)
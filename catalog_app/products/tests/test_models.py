@@ -1,6 +1,14 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 
-from products.models import Brand, Product, Query, CustomUser
+from products.counters import CacheViewCounter, LocalViewCounter, get_view_counter
+from products.models import Brand, Product, Query, CustomUser, Notification
 
 
 class BrandModelTest(TestCase):
@@ -60,6 +68,14 @@ class ProductModelTest(TestCase):
         sku_after_remove = product.sku
         self.assertEquals(sku_before_remove - 5, sku_after_remove)
 
+    def test_inventory_changes_do_not_notify(self):
+        product = Product.objects.get(id=1)
+        notifications = Notification.objects.count()
+        product.add_inventory(3)
+        product.remove_inventory(2)
+        self.assertEqual(Notification.objects.count(), notifications)
+        self.assertEqual(Product.objects.get(id=1).sku, 1)
+
     def test_remove_inventory_error(self):
         product = Product.objects.get(id=1)
         product.sku = 5
@@ -100,3 +116,107 @@ class CustomUserModelTest(TestCase):
     def test_object_name_is_username(self):
         user = CustomUser.objects.get(id=1)
         user.username
+
+
+class ViewCounterTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = Product.objects.create(name='Product1', price=10.0, description='Test description')
+        cls.other = Product.objects.create(name='Product2', price=10.0, description='Test description')
+
+    def test_local_counter_flushes_atomic_increments(self):
+        counter = LocalViewCounter(flush_interval=60, flush_size=100)
+        Query.objects.create(product=self.product, count=5)
+        for _ in range(3):
+            counter.increment(self.product.pk)
+        counter.increment(self.other.pk)
+        self.assertFalse(Query.objects.filter(product=self.other).exists())
+
+        self.assertEqual(counter.flush(), 2)
+        self.assertEqual(Query.objects.get(product=self.product).count, 8)
+        self.assertEqual(Query.objects.get(product=self.other).count, 1)
+        self.assertEqual(counter.pending(), 0)
+
+    def test_batches_are_flushed_with_one_update(self):
+        caches['default'].clear()
+        for counter in (LocalViewCounter(flush_interval=60, flush_size=100),
+                        CacheViewCounter(flush_interval=60, flush_size=100)):
+            counter.increment_many({self.product.pk: 1, self.other.pk: 1})
+            self.assertEqual(counter.pending(), 2)
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(counter.flush(), 2)
+            updates = [query for query in queries if query['sql'].startswith('UPDATE "products_query"')]
+            self.assertEqual(len(updates), 1)
+        self.assertEqual(dict(Query.objects.values_list('product_id', 'count')), {self.product.pk: 2, self.other.pk: 2})
+
+    def test_local_counter_flushes_when_full(self):
+        counter = LocalViewCounter(flush_interval=60, flush_size=2)
+        counter.increment(self.product.pk)
+        self.assertFalse(Query.objects.exists())
+        counter.increment(self.product.pk)
+        self.assertEqual(Query.objects.get(product=self.product).count, 2)
+
+    def test_cache_counter_flushes_increments(self):
+        counter = CacheViewCounter(flush_interval=60, flush_size=100)
+        counter.increment(self.product.pk)
+        counter.increment(self.product.pk, 2)
+        self.assertEqual(counter.flush(), 1)
+        self.assertEqual(Query.objects.get(product=self.product).count, 3)
+        self.assertEqual(counter.flush(), 0)
+
+    def test_cache_counter_drains_do_not_overlap(self):
+        caches['default'].clear()
+        first, second = (CacheViewCounter(flush_interval=60, flush_size=100) for _ in range(2))
+        first.increment(self.product.pk, 3)
+        second.increment(self.other.pk)
+        get_many = first.cache.get_many
+        flushed = []
+
+        def flush_concurrently(keys):
+            # the second worker flushes while the first one reads the counters
+            if not flushed:
+                flushed.append(second.flush())
+                second.increment(self.product.pk)
+            return get_many(keys)
+
+        with mock.patch.object(first.cache, 'get_many', side_effect=flush_concurrently):
+            self.assertEqual(first.flush(), 2)
+        self.assertEqual(flushed, [0])
+        self.assertEqual(dict(Query.objects.values_list('product_id', 'count')), {self.product.pk: 3, self.other.pk: 1})
+        self.assertEqual(second.flush(), 1)
+        self.assertEqual(Query.objects.get(product=self.product).count, 4)
+
+    def test_cache_counter_survives_evictions(self):
+        caches['default'].clear()
+        counter = CacheViewCounter(flush_interval=60, flush_size=100)
+        counter.increment(self.product.pk, 2)
+        counter.increment(self.other.pk)
+        get_many = counter.cache.get_many
+
+        def evict(keys):
+            # the cache evicts a counter between the read and the decrement of the flush
+            values = get_many(keys)
+            for key in keys:
+                if key.endswith(f'count:{self.product.pk}'):
+                    counter.cache.delete(key)
+            return values
+
+        with mock.patch.object(counter.cache, 'get_many', side_effect=evict):
+            self.assertEqual(counter.flush(), 2)
+        self.assertEqual(dict(Query.objects.values_list('product_id', 'count')), {self.product.pk: 2, self.other.pk: 1})
+
+    def test_cache_counter_reclaims_generations(self):
+        caches['default'].clear()
+        counter = CacheViewCounter(flush_interval=60, flush_size=100)
+        counter.increment(self.product.pk)
+        counter.flush()
+        counter.increment(self.other.pk)
+        self.assertEqual(counter.flush(), 1)
+        # the first generation was deleted, so later flushes only read the products viewed since
+        self.assertEqual([key for key in caches['default']._cache if ':view_counter:0:' in key], [])
+        self.assertEqual(dict(Query.objects.values_list('product_id', 'count')), {self.product.pk: 1, self.other.pk: 1})
+
+    def test_flush_view_counts_command(self):
+        get_view_counter().increment(self.product.pk)
+        call_command('flush_view_counts', stdout=StringIO())
+        self.assertEqual(Query.objects.get(product=self.product).count, 1)
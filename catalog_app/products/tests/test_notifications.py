@@ -0,0 +1,92 @@
+from datetime import timedelta
+from io import StringIO
+from smtplib import SMTPException
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from products.models import Notification, Product
+from products.notifications import claim_pending, deliver_pending_notifications
+
+
+class FailingEmailBackend(EmailBackend):
+    def send_messages(self, messages):
+        raise SMTPException('Connection unexpectedly closed')
+
+
+class NotificationOutboxTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        get_user_model().objects.create_superuser(username='admin', email='admin@example.com', password='password')
+
+    def setUp(self):
+        self.product = Product.objects.create(name='Product1', price=10.0, description='Test description')
+        self.later = timezone.now() + timedelta(minutes=5)
+
+    def test_save_queues_notification_without_sending(self):
+        self.product.price = 12
+        self.product.save()
+        self.assertEqual(Notification.objects.filter(product=self.product, sent_at=None).count(), 2)
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_changes_are_coalesced_into_one_digest(self):
+        other = Product.objects.create(name='Product2', price=10.0, description='Test description')
+        for price in range(3):
+            self.product.price = price
+            self.product.save()
+
+        sent, failed = deliver_pending_notifications(now=self.later, workers=2, batch_size=1)
+
+        self.assertEqual((sent, failed), (2, 0))
+        self.assertEqual(len(mail.outbox), 2)
+        subjects = sorted(message.subject for message in mail.outbox)
+        self.assertEqual(subjects, ['Product update: Product1 (4 changes)', f'Product update: {other.name}'])
+        self.assertFalse(Notification.objects.filter(sent_at=None).exists())
+
+    def test_notifications_are_claimed_once(self):
+        Notification.objects.create(subject='Import', message='Import finished.')
+        atomic = transaction.atomic
+        first = {}
+
+        def first_worker_claims(*args, **kwargs):
+            # another worker leases the same notifications after this one read their ids
+            if 'digests' not in first:
+                first['digests'] = []  # its own claim enters atomic() too
+                first['digests'] = claim_pending(self.later, 60, 10, 300, 5)
+            return atomic(*args, **kwargs)
+
+        with mock.patch.object(transaction, 'atomic', side_effect=first_worker_claims):
+            second = claim_pending(self.later, 60, 10, 300, 5)
+        self.assertEqual(sorted(len(digest) for digest in first['digests']), [1, 1])
+        self.assertEqual(second, [])
+
+    def test_recent_changes_wait_for_the_window(self):
+        sent, failed = deliver_pending_notifications(window=60)
+        self.assertEqual((sent, failed), (0, 0))
+        self.assertEqual(len(mail.outbox), 0)
+
+    @override_settings(EMAIL_BACKEND='products.tests.test_notifications.FailingEmailBackend')
+    def test_failed_delivery_backs_off(self):
+        with self.assertLogs('products.notifications', 'WARNING'):
+            sent, failed = deliver_pending_notifications(now=self.later, backoff_base=30)
+        self.assertEqual((sent, failed), (0, 1))
+        notification = Notification.objects.get(product=self.product)
+        self.assertEqual(notification.attempts, 1)
+        self.assertIsNone(notification.sent_at)
+        self.assertEqual(notification.next_attempt_at, self.later + timedelta(seconds=30))
+        self.assertIn('Connection unexpectedly closed', notification.last_error)
+
+        self.assertEqual(deliver_pending_notifications(now=self.later + timedelta(seconds=10)), (0, 0))
+
+    def test_send_notifications_command(self):
+        Notification.objects.update(created_at=timezone.now() - timedelta(hours=1))
+        out = StringIO()
+        call_command('send_notifications', stdout=out)
+        self.assertIn('Sent 1 notification digests', out.getvalue())
+        self.assertEqual(len(mail.outbox), 1)
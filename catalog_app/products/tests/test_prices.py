@@ -0,0 +1,149 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from products.importers import import_products
+from products.models import CustomUser, PriceHistory, Product
+from products.prices import price_changes, prices_as_of, record_prices
+
+
+def history(product):
+    return [str(price) for price in product.price_history.order_by('pk').values_list('price', flat=True)]
+
+
+class PriceHistoryTest(TestCase):
+    def setUp(self):
+        self.product = Product.objects.create(sku=1, name='Product', price='1.00', description='Description')
+
+    def test_only_price_changes_are_recorded(self):
+        self.assertEqual(history(self.product), ['1.00'])
+        product = Product.objects.get(pk=self.product.pk)
+        product.name = 'Renamed'
+        product.price = Decimal('1')
+        product.save()
+        product.price = '2.50'
+        with CaptureQueriesContext(connection) as queries:
+            product.save()
+        # compared with the loaded price: no query reads the stored one
+        self.assertFalse([query for query in queries.captured_queries if query['sql'].startswith('SELECT')])
+        product.save()
+        self.assertEqual(history(product), ['1.00', '2.50'])
+
+        product.price = '3.00'
+        product.save(update_fields=['name'])
+        self.assertEqual(history(product), ['1.00', '2.50'])
+        product.refresh_from_db()
+        self.assertEqual(product.price, Decimal('2.50'))
+
+    def test_deferred_prices(self):
+        product = Product.objects.only('name').get(pk=self.product.pk)
+        product.name = 'Renamed'
+        product.save()
+        self.assertEqual(history(product), ['1.00'])
+
+        product = Product.objects.defer('price').get(pk=self.product.pk)
+        product.price = '1.00'
+        product.save()
+        # an assigned price that was never loaded is recorded, even if unchanged
+        self.assertEqual(history(product), ['1.00', '1.00'])
+
+    def test_stock_changes_are_not_recorded(self):
+        self.product.add_inventory(2)
+        self.product.remove_inventory(1)
+        self.assertEqual(history(self.product), ['1.00'])
+
+    def test_imports_record_new_prices_in_bulk(self):
+        other = Product.objects.create(sku=1, name='Other', price='5.00', description='Description')
+        with CaptureQueriesContext(connection) as queries:
+            import_products([
+                (1, {'id': self.product.pk, 'sku': 1, 'name': 'Product', 'price': '1.50', 'description': 'New'}),
+                (2, {'id': other.pk, 'sku': 1, 'name': 'Other', 'price': '5.00', 'description': 'New'}),
+                (3, {'sku': 1, 'name': 'Created', 'price': '2.00', 'description': 'New'}),
+                (4, {'sku': 1, 'name': 'Created', 'price': '3.00', 'description': 'New'}),
+            ], notify=False)
+        inserts = [query for query in queries.captured_queries
+                   if query['sql'].startswith('INSERT INTO "products_pricehistory"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(history(self.product), ['1.00', '1.50'])
+        self.assertEqual(history(other), ['5.00'])
+        created = Product.objects.filter(name='Created').order_by('pk')
+        self.assertEqual([history(product) for product in created], [['2.00'], ['3.00']])
+
+
+class PriceQueryTest(TestCase):
+    def setUp(self):
+        self.start = timezone.now() - timedelta(days=10)
+        self.products = [
+            Product.objects.create(sku=1, name=f'Product {i}', price=1, description='Description') for i in range(3)]
+        PriceHistory.objects.all().delete()
+        for day, prices in enumerate(([1, 10], [2, None], [3, 30])):
+            record_prices([(product.pk, price) for product, price in zip(self.products, prices) if price is not None],
+                          self.start + timedelta(days=day))
+
+    def test_prices_as_of(self):
+        first, second, third = self.products
+        at = self.start + timedelta(days=1, hours=1)
+        self.assertEqual([(row['product'], row['price']) for row in prices_as_of(at, Product.objects.order_by('pk'))],
+                         [(first.pk, '2.00'), (second.pk, '10.00'), (third.pk, None)])
+        self.assertEqual([row['price'] for row in prices_as_of(self.start, Product.objects.order_by('pk'), 1)],
+                         ['1.00'])
+        with self.assertNumQueries(2):
+            prices_as_of(timezone.now(), Product.objects.all())
+
+    def test_price_changes(self):
+        rows = price_changes(self.start + timedelta(days=1), self.start + timedelta(days=3))
+        self.assertEqual([(row['product'], row['price']) for row in rows],
+                         [(self.products[0].pk, Decimal('2')), (self.products[0].pk, Decimal('3')),
+                          (self.products[1].pk, Decimal('30'))])
+        self.assertEqual(len(price_changes(self.start, timezone.now(), self.products[1].pk)), 2)
+
+
+class PriceAPITest(APITestCase):
+    def setUp(self):
+        self.client.force_authenticate(CustomUser.objects.create_superuser(
+            username='admin', email='admin@example.com', password='password'))
+        self.products = [
+            Product.objects.create(sku=1, name=f'Product {i}', price=i + 1, description='Description')
+            for i in range(3)]
+        self.before = timezone.now()
+        self.products[0].price = 5
+        self.products[0].save()
+
+    def test_as_of(self):
+        url = reverse('price_as_of')
+        response = self.client.get(url, {'limit': 2})
+        self.assertEqual([row['price'] for row in response.data['results']], ['5.00', '2.00'])
+        self.assertTrue(response.data['has_more'])
+        response = self.client.get(url, {'limit': 2, 'after': response.data['next']})
+        self.assertEqual([row['price'] for row in response.data['results']], ['3.00'])
+        self.assertFalse(response.data['has_more'])
+
+        response = self.client.get(url, {'at': self.before.isoformat(), 'ids': f'{self.products[0].pk},999'})
+        self.assertEqual([(row['product'], row['price']) for row in response.data['results']],
+                         [(self.products[0].pk, '1.00'), (999, None)])
+        self.assertEqual(self.client.get(url, {'at': 'yesterday'}).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_changes(self):
+        url = reverse('price_changes')
+        response = self.client.get(url, {'limit': 3})
+        self.assertEqual([row['price'] for row in response.data['results']], ['1.00', '2.00', '3.00'])
+        self.assertTrue(response.data['has_more'])
+        response = self.client.get(url, {'after': response.data['next']})
+        self.assertEqual([(row['product'], row['price']) for row in response.data['results']],
+                         [(self.products[0].pk, '5.00')])
+
+        response = self.client.get(url, {'since': self.before.isoformat(), 'product': self.products[1].pk})
+        self.assertEqual(response.data['results'], [])
+        self.assertEqual(self.client.get(url, {'product': 'x'}).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_admins_only(self):
+        self.client.force_authenticate(None)
+        for name in ('price_as_of', 'price_changes'):
+            self.assertEqual(self.client.get(reverse(name)).status_code, status.HTTP_403_FORBIDDEN)
@@ -0,0 +1,107 @@
+import random
+import sqlite3
+import tempfile
+from pathlib import Path
+
+from django.db import connections
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from products.cache import product_cache
+from products.counters import get_view_counter
+from products.models import Brand, CustomUser, Product
+from products.routers import choose_replica, replica_reads
+from products.throttling import get_bucket_store
+
+
+class ChooseReplicaTest(SimpleTestCase):
+    def test_weights(self):
+        rng = random.Random(0)
+        picks = [choose_replica({'a': 3, 'b': 1, 'c': 0}, rng) for _ in range(4000)]
+        self.assertNotIn('c', picks)
+        self.assertAlmostEqual(picks.count('a') / len(picks), 0.75, delta=0.03)
+        self.assertIsNone(choose_replica({}))
+        self.assertIsNone(choose_replica({'a': 0}))
+
+
+@override_settings(REPLICA_ROUTING={'REPLICAS': {'replica': 1}, 'PIN_SECONDS': 5, 'PIN_COOKIE': 'catalog_primary'})
+class ReplicaRoutingTest(TransactionTestCase):
+    """
+    Uses a second SQLite file as the replica; ``replicate()`` copies the primary into it.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = tempfile.TemporaryDirectory()
+        connections.settings['replica'] = {
+            **connections['default'].settings_dict, 'NAME': str(Path(cls.directory.name) / 'replica.sqlite3')}
+
+    @classmethod
+    def tearDownClass(cls):
+        connections['replica'].close()
+        del connections.settings['replica']
+        del connections['replica']
+        cls.directory.cleanup()
+        super().tearDownClass()
+
+    def setUp(self):
+        product_cache.cache.clear()
+        get_bucket_store().clear()
+        # restarts the flush interval, so the views counted by the test stay pending
+        get_view_counter().flush()
+        self.admin = CustomUser.objects.create_superuser(username='admin', email='admin@example.com', password='x')
+        self.replicated = Brand.objects.create(name='Replicated')
+        self.replicate()
+        self.lagging = Brand.objects.create(name='Lagging')
+
+    def replicate(self):
+        connections['default'].ensure_connection()
+        replica = sqlite3.connect(connections.settings['replica']['NAME'])
+        try:
+            connections['default'].connection.backup(replica)
+        finally:
+            replica.close()
+
+    def test_reads_go_to_the_replica(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        response = client.get(reverse('brand_list_create'))
+        self.assertEqual([brand['name'] for brand in response.data['results']], ['Replicated'])
+        url = reverse('brand_retrieve_update_destroy', args=[self.lagging.pk])
+        self.assertEqual(client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+        # other reads stay on the primary
+        self.assertEqual(Brand.objects.count(), 2)
+        with replica_reads():
+            self.assertEqual(Brand.objects.count(), 1)
+
+    def test_product_cache_is_filled_from_the_primary(self):
+        product = Product.objects.create(name='Lagging product', price=10.0, description='Description')
+        url = reverse('product_retrieve_update_destroy', args=[product.pk])
+        response = APIClient().get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['name'], 'Lagging product')
+        self.assertEqual(get_view_counter().drain(), {product.pk: 1})
+
+    def test_writes_pin_the_client_to_the_primary(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        response = client.post(reverse('brand_list_create'), {'name': 'Written'})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.cookies['catalog_primary']['max-age'], 5)
+
+        response = client.get(reverse('brand_list_create'))
+        self.assertEqual(len(response.data['results']), 3)
+        self.assertNotIn('catalog_primary', response.cookies)
+
+        other = APIClient()
+        other.force_authenticate(self.admin)
+        self.assertEqual(len(other.get(reverse('brand_list_create')).data['results']), 1)
+
+    def test_reads_after_a_write_use_the_primary(self):
+        with replica_reads():
+            self.assertEqual(Brand.objects.count(), 1)
+            Brand.objects.create(name='Written')
+            self.assertEqual(Brand.objects.count(), 3)
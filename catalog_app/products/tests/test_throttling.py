@@ -0,0 +1,85 @@
+from unittest import mock
+
+from django.core.cache import caches
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from products.counters import get_view_counter
+from products.models import CustomUser, Product
+from products.throttling import CacheBucketStore, LocalBucketStore, TokenBucketThrottle, get_bucket_store
+
+RATES = {'anon_read': '2/min', 'user_read': '3/min', 'write': '1/min', 'view_count': '1/min'}
+
+
+class BucketStoreTest(SimpleTestCase):
+    def assert_bucket(self, store, clock):
+        with mock.patch(clock, return_value=1000.0):
+            self.assertEqual(store.consume('a', 2, 0.5), (True, 0.0))
+            self.assertEqual(store.consume('a', 2, 0.5), (True, 0.0))
+            self.assertEqual(store.consume('a', 2, 0.5), (False, 2.0))
+            self.assertEqual(store.consume('b', 2, 0.5), (True, 0.0))
+        with mock.patch(clock, return_value=1001.0):
+            self.assertEqual(store.consume('a', 2, 0.5), (False, 1.0))
+        with mock.patch(clock, return_value=1002.0):
+            self.assertEqual(store.consume('a', 2, 0.5), (True, 0.0))
+
+    def test_local_store(self):
+        self.assert_bucket(LocalBucketStore(), 'products.throttling.time.monotonic')
+
+    def test_local_store_is_bounded(self):
+        store = LocalBucketStore(max_buckets=2)
+        for key in 'abc':
+            store.consume(key, 1, 1)
+        self.assertEqual(list(store._buckets), ['b', 'c'])
+
+    def test_cache_store(self):
+        caches['default'].clear()
+        self.assert_bucket(CacheBucketStore(), 'products.throttling.time.time')
+
+
+@mock.patch.object(TokenBucketThrottle, 'THROTTLE_RATES', RATES)
+class ThrottleTest(APITestCase):
+    def setUp(self):
+        get_bucket_store().clear()
+        self.product = Product.objects.create(name='Product1', price=10.0, description='Test description')
+        self.url = reverse('product_retrieve_update_destroy', args=[self.product.pk])
+
+    def tearDown(self):
+        get_view_counter().drain()
+        get_bucket_store().clear()
+
+    def test_anonymous_reads(self):
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response['Retry-After'], '30')
+        # other clients have their own bucket
+        self.assertEqual(self.client.get(self.url, REMOTE_ADDR='10.0.0.2').status_code, status.HTTP_200_OK)
+
+    def test_view_counts_are_throttled(self):
+        self.client.get(self.url)
+        self.client.get(self.url)
+        self.assertEqual(get_view_counter().drain(), {self.product.pk: 1})
+
+    def test_scopes_are_separate(self):
+        user = CustomUser.objects.create_user(username='user', email='user@example.com', password='password')
+        self.client.force_authenticate(user)
+        for _ in range(3):
+            self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+        self.assertEqual(self.client.delete(self.url).status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self.client.delete(self.url).status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    @override_settings(THROTTLING={'ENABLED': False})
+    def test_disabled(self):
+        for _ in range(3):
+            self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+
+    @override_settings(ROOT_URLCONF='catalog_app.asgi_urls')
+    async def test_async_reads(self):
+        statuses = [(await self.async_client.get(self.url)).status_code for _ in range(3)]
+        self.assertEqual(statuses, [status.HTTP_200_OK, status.HTTP_200_OK, status.HTTP_429_TOO_MANY_REQUESTS])
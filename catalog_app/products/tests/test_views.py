@@ -1,8 +1,23 @@
+import csv
+import io
+import json
+from datetime import timedelta
+from unittest import mock
+
+from django.db import connection
+from django.db.models import QuerySet
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APITestCase, APIClient
 
+from products.counters import get_view_counter
 from products.models import CustomUser, Brand, Product, Query
+from products.serializers import BrandSerializer, ProductSerializer
+from products.throttling import get_bucket_store
+from products.views import ProductRetrieveUpdateDestroyAPIView
 
 
 class ProductTests(APITestCase):
@@ -19,6 +34,11 @@ class ProductTests(APITestCase):
         )
         self.product.brand.add(self.brand)
 
+    def tearDown(self):
+        # discard views buffered by anonymous requests so they never outlive the test database
+        get_view_counter().drain()
+        get_bucket_store().clear()
+
     def test_create_product_unauthenticated(self):
         url = reverse('product_list_create')
         data = {
@@ -49,11 +69,50 @@ class ProductTests(APITestCase):
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
-        # test incrementing query count
+        # test incrementing query count once the buffered views are flushed
+        get_view_counter().flush()
         query_count = Query.objects.get(pk=self.product.id).count
         expected_querys = 1
         self.assertEqual(expected_querys, query_count)
 
+    def test_retrieve_product_unauthenticated_does_not_write(self):
+        url = reverse('product_retrieve_update_destroy', args=[self.product.id])
+        get_view_counter().flush()
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(Query.objects.filter(product=self.product).exists())
+
+    def test_retrieve_product_served_from_cache(self):
+        url = reverse('product_retrieve_update_destroy', args=[self.product.id])
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response.data['name'], 'Test Product')
+
+    def test_product_cache_invalidated_on_change(self):
+        url = reverse('product_retrieve_update_destroy', args=[self.product.id])
+        self.client.get(url)
+        self.product.name = 'Renamed Product'
+        self.product.save()
+        other_brand = Brand.objects.create(name='Other Brand')
+        other_brand.products.add(self.product)
+        response = self.client.get(url)
+        self.assertEqual(response.data['name'], 'Renamed Product')
+        self.assertEqual(sorted(response.data['brand']), sorted([self.brand.id, other_brand.id]))
+
+        other_brand.delete()
+        response = self.client.get(url)
+        self.assertEqual(response.data['brand'], [self.brand.id])
+
+    def test_product_cache_stats_admin_only(self):
+        url = reverse('product_cache_stats')
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+        self.client.force_authenticate(self.user)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(response.data), {'hits', 'misses', 'invalidations'})
+
     def test_update_product(self):
         url = reverse('product_retrieve_update_destroy', args=[self.product.id])
         data = {
@@ -72,3 +131,406 @@ class ProductTests(APITestCase):
         self.client.force_authenticate(self.user)
         response = self.client.delete(url)
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+
+class ProductMultiGetTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.brand = Brand.objects.create(name='Brand')
+        cls.products = [
+            Product.objects.create(sku=i, name=f'Product {i}', price=i, description='Description') for i in range(3)]
+        for product in cls.products:
+            product.brand.add(cls.brand)
+
+    def setUp(self):
+        # restarts the flush interval, so the views counted by the test stay pending
+        get_view_counter().flush()
+
+    def tearDown(self):
+        get_view_counter().drain()
+        get_bucket_store().clear()
+
+    def test_ids_keep_their_order_and_report_missing(self):
+        first, second, third = (product.pk for product in self.products)
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('product_list_create'), {'ids': f'{third},999,{first},{third}'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([product['id'] for product in response.data['results']], [third, first])
+        self.assertEqual(response.data['results'][0]['brand'], [self.brand.pk])
+        self.assertEqual(response.data['missing'], [999])
+        self.assertEqual(get_view_counter().drain(), {third: 1, first: 1})
+
+        detail = self.client.get(reverse('product_retrieve_update_destroy', args=[first]))
+        self.assertEqual(response.data['results'][1], detail.data)
+
+    def test_batch_post(self):
+        ids = [product.pk for product in reversed(self.products)]
+        response = self.client.post(reverse('product_batch'), {'ids': ids + [999]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([product['id'] for product in response.data['results']], ids)
+        self.assertEqual(response.data['missing'], [999])
+        self.assertEqual(get_view_counter().drain(), dict.fromkeys(ids, 1))
+
+    def test_authenticated_views_are_not_counted(self):
+        self.client.force_authenticate(CustomUser.objects.create_user(username='user', password='password'))
+        response = self.client.post(reverse('product_batch'), {'ids': [self.products[0].pk]}, format='json')
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(get_view_counter().drain(), {})
+
+    def test_invalid_ids_are_rejected(self):
+        url = reverse('product_list_create')
+        self.assertEqual(self.client.get(url, {'ids': 'a,b'}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(url, {'ids': ''}).status_code, status.HTTP_400_BAD_REQUEST)
+        too_many = list(range(1, 202))
+        response = self.client.post(reverse('product_batch'), {'ids': too_many}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_not_modified(self):
+        url = reverse('product_list_create')
+        params = {'ids': f'{self.products[1].pk},{self.products[0].pk}'}
+        etag = self.client.get(url, params)['ETag']
+        self.assertEqual(self.client.get(url, params, HTTP_IF_NONE_MATCH=etag).status_code,
+                         status.HTTP_304_NOT_MODIFIED)
+        self.products[0].save()
+        self.assertEqual(self.client.get(url, params, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+
+
+class QueryCountScalingTests(APITestCase):
+    """
+    Guards list endpoints against N+1 queries: a page of 25 items must cost as many queries as a page of 1.
+    """
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_superuser(
+            username='testuser', email='test@example.com', password='testpassword')
+        brands = Brand.objects.bulk_create([Brand(name=f'Brand {i}') for i in range(25)])
+        for i in range(25):
+            product = Product.objects.create(sku=i, name=f'Product {i}', price=1, description='Description')
+            product.brand.add(brands[i], brands[(i + 1) % 25])
+        CustomUser.objects.bulk_create([CustomUser(username=f'user{i}') for i in range(25)])
+        self.client.force_authenticate(self.user)
+
+    def assertQueryCountIndependentOfPageSize(self, url):
+        with CaptureQueriesContext(connection) as single_page:
+            response = self.client.get(url, {'page_size': 1})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        with self.assertNumQueries(len(single_page)):
+            response = self.client.get(url, {'page_size': 25})
+        self.assertEqual(len(response.data['results']), 25)
+
+    def test_product_list_query_count(self):
+        self.assertQueryCountIndependentOfPageSize(reverse('product_list_create'))
+
+    def test_brand_list_query_count(self):
+        self.assertQueryCountIndependentOfPageSize(reverse('brand_list_create'))
+        self.assertQueryCountIndependentOfPageSize(reverse('brand_list_create') + '?in_stock_count=true')
+
+    def test_user_list_query_count(self):
+        self.assertQueryCountIndependentOfPageSize(reverse('user-list'))
+
+    def test_product_detail_query_count(self):
+        product = Product.objects.first()
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('product_retrieve_update_destroy', args=[product.id]))
+        self.assertEqual(len(response.data['brand']), 2)
+
+
+class ValuesRepresentationTests(APITestCase):
+    """
+    The product and brand reads are built from ``values()`` rows and rendered by ``FastJSONRenderer``;
+    their bytes must equal the regular serializer output rendered by ``JSONRenderer``.
+    """
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_superuser(
+            username='testuser', email='test@example.com', password='testpassword')
+        brands = [Brand.objects.create(name=name) for name in ('Ñandú', 'Line\u2028break', '"Quoted" \\ brand')]
+        for i in range(12):
+            product = Product.objects.create(sku=i, name=f'Prodüct {i} 😀', price=f'{i}.5',
+                                             description='Tab\tand\nnewline')
+            product.brand.add(brands[2], brands[i % 2])
+        Product.objects.create(name='No brands', price='1000000.00', description='')
+        self.client.force_authenticate(self.user)
+
+    def render(self, data):
+        return JSONRenderer().render(data)
+
+    def test_product_list_matches_serializer(self):
+        response = self.client.get(reverse('product_list_create'), {'page': 2})
+        products = Product.objects.order_by('id')
+        expected = {'count': 13, 'next': None, 'previous': response.data['previous'],
+                    'results': ProductSerializer(products[10:], many=True).data}
+        self.assertEqual(response.content, self.render(expected))
+
+    def test_product_detail_matches_serializer(self):
+        self.client.logout()
+        for product in Product.objects.all():
+            response = self.client.get(reverse('product_retrieve_update_destroy', args=[product.pk]))
+            self.assertEqual(response.content, self.render(ProductSerializer(product).data))
+        get_view_counter().drain()
+
+    def test_brand_list_and_detail_match_serializer(self):
+        response = self.client.get(reverse('brand_list_create'))
+        expected = {'count': 3, 'next': None, 'previous': None,
+                    'results': BrandSerializer(Brand.objects.order_by('id'), many=True).data}
+        self.assertEqual(response.content, self.render(expected))
+        brand = Brand.objects.first()
+        response = self.client.get(reverse('brand_retrieve_update_destroy', args=[brand.pk]))
+        self.assertEqual(response.content, self.render(BrandSerializer(brand).data))
+
+
+class PaginationTests(APITestCase):
+    def setUp(self):
+        Product.objects.bulk_create([
+            Product(sku=i, name=f'Product {i}', price=1, description='Description') for i in range(15)])
+        self.user = CustomUser.objects.create_superuser(
+            username='testuser', email='test@example.com', password='testpassword')
+        self.client.force_authenticate(self.user)
+        self.url = reverse('product_list_create')
+
+    def test_page_number_pagination_is_default(self):
+        response = self.client.get(self.url, {'page': 2})
+        self.assertEqual(response.data['count'], 15)
+        self.assertEqual(len(response.data['results']), 5)
+
+    def test_cursor_pagination(self):
+        response = self.client.get(self.url, {'pagination': 'cursor'})
+        self.assertNotIn('count', response.data)
+        self.assertIsNone(response.data['previous'])
+        first_page = [item['id'] for item in response.data['results']]
+
+        response = self.client.get(response.data['next'])
+        second_page = [item['id'] for item in response.data['results']]
+        self.assertEqual(len(first_page + second_page), 15)
+        self.assertLess(max(first_page), min(second_page))
+        self.assertIsNone(response.data['next'])
+        self.assertIsNotNone(response.data['previous'])
+
+    def test_cursor_pagination_with_accept_version(self):
+        response = self.client.get(self.url, HTTP_ACCEPT='application/json; version=2')
+        self.assertIn('cursor=', response.data['next'])
+        self.assertNotIn('count', response.data)
+
+    def test_cursor_pagination_approximate_count(self):
+        response = self.client.get(self.url, {'pagination': 'cursor', 'count': 'approximate'})
+        self.assertEqual(response.data['approximate_count'], 15)
+
+
+class ConditionalRequestTests(APITestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_superuser(
+            username='testuser', email='test@example.com', password='testpassword')
+        self.brand = Brand.objects.create(name='Test Brand')
+        self.product = Product.objects.create(sku=5, name='Product', price=1, description='Description')
+        self.product.brand.add(self.brand)
+        self.detail_url = reverse('product_retrieve_update_destroy', args=[self.product.id])
+
+    def tearDown(self):
+        get_view_counter().drain()
+        get_bucket_store().clear()
+
+    def test_detail_not_modified(self):
+        response = self.client.get(self.detail_url)
+        etag = response['ETag']
+        self.assertTrue(response.has_header('Last-Modified'))
+        with self.assertNumQueries(1):
+            response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+        response = self.client.get(self.detail_url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_detail_etag_changes_with_product_and_brands(self):
+        etag = self.client.get(self.detail_url)['ETag']
+        Brand.objects.create(name='Other Brand').products.add(self.product)
+        response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(len(response.data['brand']), 2)
+
+    def test_update_requires_matching_etag(self):
+        self.client.force_authenticate(self.user)
+        etag = self.client.get(self.detail_url)['ETag']
+        self.product.add_inventory(1)
+        response = self.client.patch(self.detail_url, {'name': 'Renamed'}, format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.assertEqual(Product.objects.get(pk=self.product.pk).name, 'Product')
+
+        etag = self.client.get(self.detail_url)['ETag']
+        response = self.client.patch(self.detail_url, {'name': 'Renamed'}, format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_conditional_writes_lock_the_row_until_they_commit(self):
+        self.client.force_authenticate(self.user)
+        etag = self.client.get(self.detail_url)['ETag']
+        outer = len(connection.atomic_blocks)
+        blocks = {}
+        select_for_update = QuerySet.select_for_update
+        perform_update = ProductRetrieveUpdateDestroyAPIView.perform_update
+
+        def lock(queryset, **kwargs):
+            blocks['checked'] = list(connection.atomic_blocks)
+            return select_for_update(queryset, **kwargs)
+
+        def write(view, serializer):
+            blocks['written'] = list(connection.atomic_blocks)
+            perform_update(view, serializer)
+
+        with mock.patch.object(QuerySet, 'select_for_update', autospec=True, side_effect=lock), \
+                mock.patch.object(ProductRetrieveUpdateDestroyAPIView, 'perform_update', autospec=True,
+                                  side_effect=write):
+            response = self.client.patch(self.detail_url, {'name': 'Renamed'}, format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # a concurrent write with the same ETag waits for this transaction, then fails If-Match
+        self.assertGreater(len(blocks['checked']), outer)
+        self.assertEqual(blocks['written'][:len(blocks['checked'])], blocks['checked'])
+
+    def test_list_not_modified_until_page_changes(self):
+        self.client.force_authenticate(self.user)
+        url = reverse('product_list_create')
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        Product.objects.create(sku=1, name='New', price=1, description='New')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 2)
+
+        cursor_etag = self.client.get(url, {'pagination': 'cursor'})['ETag']
+        response = self.client.get(url, {'pagination': 'cursor'}, HTTP_IF_NONE_MATCH=cursor_etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_brand_detail_etag(self):
+        self.client.force_authenticate(self.user)
+        url = reverse('brand_retrieve_update_destroy', args=[self.brand.id])
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_304_NOT_MODIFIED)
+        self.brand.name = 'Renamed Brand'
+        self.brand.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+
+
+class StockAdjustmentTests(APITestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_superuser(
+            username='testuser', email='test@example.com', password='testpassword')
+        self.first = Product.objects.create(sku=10, name='First', price=1, description='Description')
+        self.second = Product.objects.create(sku=2, name='Second', price=1, description='Description')
+        self.url = reverse('product_stock_adjust')
+
+    def test_bulk_adjust_reports_failed_lines(self):
+        self.client.force_authenticate(self.user)
+        data = {'lines': [
+            {'product': self.first.id, 'delta': 5},
+            {'product': self.second.id, 'delta': -3},
+            {'product': self.first.id, 'delta': -12},
+            {'product': 999999, 'delta': 1},
+            {'product': self.second.id, 'delta': 4},
+        ]}
+        response = self.client.post(self.url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['applied'], 3)
+        self.assertEqual([line['index'] for line in response.data['failed']], [1, 3])
+
+        self.first.refresh_from_db()
+        self.second.refresh_from_db()
+        self.assertEqual((self.first.sku, self.second.sku), (3, 6))
+
+    def test_bulk_adjust_requires_admin(self):
+        response = self.client.post(self.url, {'lines': [{'product': self.first.id, 'delta': 1}]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class ProductExportTests(APITestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_superuser(
+            username='testuser', email='test@example.com', password='testpassword')
+        self.brand = Brand.objects.create(name='Test Brand')
+        self.products = Product.objects.bulk_create([
+            Product(sku=i, name=f'Product {i}', price='1.50', description='Description') for i in range(5)])
+        self.products[0].brand.add(self.brand)
+        self.url = reverse('product_export')
+        self.client.force_authenticate(self.user)
+
+    def test_export_jsonl_matches_api_representation(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 5)
+        detail = self.client.get(reverse('product_retrieve_update_destroy', args=[self.products[0].id]))
+        self.assertEqual(json.loads(lines[0]), json.loads(detail.content))
+
+    def test_export_csv(self):
+        response = self.client.get(self.url, {'file_format': 'csv'})
+        rows = list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual(rows[0][-1], 'brand')
+        self.assertEqual(rows[1][-1], str(self.brand.id))
+        self.assertEqual(len(rows), 6)
+
+    def test_export_updated_since(self):
+        Product.objects.filter(pk=self.products[1].pk).update(updated_at=timezone.now() + timedelta(days=1))
+        since = (timezone.now() + timedelta(hours=1)).isoformat()
+        response = self.client.get(self.url, {'updated_since': since})
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line)['id'] for line in lines], [self.products[1].id])
+
+    def test_export_rejects_invalid_parameters(self):
+        self.assertEqual(self.client.get(self.url, {'updated_since': 'yesterday'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'file_format': 'xml'}).status_code, 400)
+
+
+class ProductFilterTests(APITestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_superuser(
+            username='testuser', email='test@example.com', password='testpassword')
+        self.brand = Brand.objects.create(name='Test Brand')
+        self.other_brand = Brand.objects.create(name='Other Brand')
+        self.shirt = Product.objects.create(
+            sku=0, name='Cotton shirt', price='20.00', description='A soft shirt made of organic cotton')
+        self.shoes = Product.objects.create(
+            sku=5, name='Running shoes', price='80.00', description='Lightweight trainers')
+        self.socks = Product.objects.create(sku=12, name='Wool socks', price='8.50', description='Warm socks')
+        self.shirt.brand.add(self.brand, self.other_brand)
+        self.shoes.brand.add(self.other_brand)
+        self.url = reverse('product_list_create')
+        self.client.force_authenticate(self.user)
+
+    def get_ids(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [item['id'] for item in response.data['results']]
+
+    def test_filter_by_brand_does_not_duplicate(self):
+        brands = f'{self.brand.id},{self.other_brand.id}'
+        self.assertEqual(self.get_ids(brand=brands), [self.shirt.id, self.shoes.id])
+
+    def test_filter_by_price_and_stock(self):
+        self.assertEqual(self.get_ids(min_price='10', max_price='80'), [self.shirt.id, self.shoes.id])
+        self.assertEqual(self.get_ids(in_stock='true'), [self.shoes.id, self.socks.id])
+        self.assertEqual(self.get_ids(in_stock='false'), [self.shirt.id])
+
+    def test_filter_by_updated_at(self):
+        Product.objects.filter(pk=self.socks.pk).update(updated_at=timezone.now() - timedelta(days=2))
+        yesterday = (timezone.now() - timedelta(days=1)).isoformat()
+        self.assertEqual(self.get_ids(updated_before=yesterday), [self.socks.id])
+        self.assertEqual(self.get_ids(updated_after=yesterday), [self.shirt.id, self.shoes.id])
+
+    def test_ordering_is_whitelisted(self):
+        self.assertEqual(self.get_ids(ordering='-price'), [self.shoes.id, self.shirt.id, self.socks.id])
+        self.assertEqual(self.get_ids(ordering='description'), [self.shirt.id, self.shoes.id, self.socks.id])
+
+    def test_search_uses_index_and_follows_changes(self):
+        self.assertEqual(self.get_ids(search='organic'), [self.shirt.id])
+        self.assertEqual(self.get_ids(search='sock'), [self.socks.id])
+        self.socks.description = 'Organic wool'
+        self.socks.save()
+        self.assertEqual(self.get_ids(search='organic'), [self.shirt.id, self.socks.id])
+        self.shirt.delete()
+        self.assertEqual(self.get_ids(search='organic'), [self.socks.id])
+        self.assertEqual(self.get_ids(search='"*'), [])
+
+    def test_invalid_filters_are_rejected(self):
+        response = self.client.get(self.url, {'min_price': 'cheap'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
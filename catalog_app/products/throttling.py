@@ -0,0 +1,239 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.throttling import SimpleRateThrottle
+
+DEFAULT_THROTTLING = {
+    'ENABLED': True,
+    'BACKEND': 'products.throttling.LocalBucketStore',
+    'MAX_BUCKETS': 100000,
+    'CACHE_ALIAS': 'default',
+}
+
+
+def get_throttle_settings():
+    """
+    Returns the ``THROTTLING`` setting merged over the defaults.
+    """
+    return {**DEFAULT_THROTTLING, **getattr(settings, 'THROTTLING', {})}
+
+
+def refill(tokens, updated, capacity, rate, now):
+    """
+    Returns the tokens of a bucket last updated at ``updated`` after refilling it at ``rate`` per second.
+    """
+    return min(capacity, tokens + (now - updated) * rate)
+
+
+def take(tokens, capacity, rate):
+    """
+    Takes one token from a bucket holding ``tokens``.
+
+    Returns ``(allowed, tokens left, seconds until a token is available)``.
+    """
+    if tokens >= 1:
+        return True, tokens - 1, 0.0
+    return False, tokens, (1 - tokens) / rate
+
+
+class BaseBucketStore:
+    """
+    Base class for the token bucket stores of ``TokenBucketThrottle``.
+
+    A bucket holds up to ``capacity`` tokens and refills at ``rate`` tokens per second; every
+    request takes one token, and a request finding the bucket empty is refused without
+    taking any. Buckets are created full.
+    """
+
+    def consume(self, key, capacity, rate):
+        """
+        Takes a token from the bucket ``key`` and returns ``(allowed, seconds to wait when refused)``.
+        """
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+
+class LocalBucketStore(BaseBucketStore):
+    """
+    Token buckets in process memory, each client limited per process.
+
+    A bucket is two floats updated under a lock, so a check costs no I/O. At most
+    ``max_buckets`` buckets are kept; the least recently used ones are dropped, which
+    only lets their clients start over with a full bucket.
+    """
+
+    def __init__(self, max_buckets=100000, **options):
+        self.max_buckets = max_buckets
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()
+
+    def consume(self, key, capacity, rate):
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                tokens = capacity
+                if len(self._buckets) >= self.max_buckets:
+                    self._buckets.popitem(last=False)
+            else:
+                tokens = refill(bucket[0], bucket[1], capacity, rate, now)
+                self._buckets.move_to_end(key)
+            allowed, tokens, wait = take(tokens, capacity, rate)
+            self._buckets[key] = (tokens, now)
+        return allowed, wait
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class CacheBucketStore(BaseBucketStore):
+    """
+    Token buckets in a Django cache, so a cache shared by all workers limits clients globally.
+
+    Buckets are read and written without a lock: concurrent requests of one client on
+    different workers may both take the last token, which errs on the side of letting
+    requests through. A bucket expires once it would be full again.
+    """
+    key_prefix = 'throttle'
+
+    def __init__(self, cache_alias='default', **options):
+        self.cache = caches[cache_alias]
+
+    def consume(self, key, capacity, rate):
+        key = f'{self.key_prefix}:{key}'
+        now = time.time()
+        bucket = self.cache.get(key)
+        tokens = capacity if bucket is None else refill(bucket[0], bucket[1], capacity, rate, now)
+        allowed, tokens, wait = take(tokens, capacity, rate)
+        if allowed:
+            self.cache.set(key, (tokens, now), timeout=math.ceil((capacity - tokens) / rate))
+        return allowed, wait
+
+    def clear(self):
+        # buckets expire on their own; only the in-process store can be cleared
+        pass
+
+
+_bucket_store = None
+_bucket_store_lock = threading.Lock()
+
+
+def get_bucket_store():
+    """
+    Returns the process-wide token bucket store configured by the ``THROTTLING`` setting.
+    """
+    global _bucket_store
+    if _bucket_store is None:
+        with _bucket_store_lock:
+            if _bucket_store is None:
+                config = get_throttle_settings()
+                _bucket_store = import_string(config['BACKEND'])(
+                    max_buckets=config['MAX_BUCKETS'], cache_alias=config['CACHE_ALIAS'])
+    return _bucket_store
+
+
+def reset_bucket_store():
+    """
+    Discards the configured bucket store so the next call rebuilds it from settings.
+    """
+    global _bucket_store
+    with _bucket_store_lock:
+        _bucket_store = None
+
+
+def is_read(request, view):
+    """
+    Returns True for the safe methods and for the POSTs of views that only read with them
+    (``post_is_read``), like the product batch lookup.
+    """
+    return request.method in SAFE_METHODS or (request.method == 'POST' and getattr(view, 'post_is_read', False))
+
+
+class TokenBucketThrottle(SimpleRateThrottle):
+    """
+    Throttle limiting each client with a token bucket instead of DRF's request history.
+
+    A ``scope`` rate of ``n/period`` in ``DEFAULT_THROTTLE_RATES`` allows bursts of ``n``
+    requests and ``n`` requests per period on average. Refused requests get a 429 with a
+    ``Retry-After`` header of the seconds until the bucket holds a token again. Subclasses
+    return None from ``get_cache_key`` for the requests they do not limit.
+    """
+
+    def allow_request(self, request, view):
+        if self.rate is None or not get_throttle_settings()['ENABLED']:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+        allowed, self.retry_after = get_bucket_store().consume(
+            self.key, self.num_requests, self.num_requests / self.duration)
+        return allowed
+
+    def wait(self):
+        return self.retry_after
+
+
+class AnonReadThrottle(TokenBucketThrottle):
+    """
+    Limits the reads of anonymous clients per IP address.
+    """
+    scope = 'anon_read'
+
+    def get_cache_key(self, request, view):
+        if not is_read(request, view) or request.user.is_authenticated:
+            return None
+        return self.cache_format % {'scope': self.scope, 'ident': self.get_ident(request)}
+
+
+class UserReadThrottle(TokenBucketThrottle):
+    """
+    Limits the reads of authenticated users per user.
+    """
+    scope = 'user_read'
+
+    def get_cache_key(self, request, view):
+        if not is_read(request, view) or not request.user.is_authenticated:
+            return None
+        return self.cache_format % {'scope': self.scope, 'ident': request.user.pk}
+
+
+class WriteThrottle(TokenBucketThrottle):
+    """
+    Limits writes per user, or per IP address for anonymous clients.
+    """
+    scope = 'write'
+
+    def get_cache_key(self, request, view):
+        if is_read(request, view):
+            return None
+        ident = request.user.pk if request.user.is_authenticated else self.get_ident(request)
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
+
+
+class ViewCountThrottle(TokenBucketThrottle):
+    """
+    Limits how many anonymous product views of one IP address are counted in ``products.Query``.
+
+    Not a view throttle: views over the rate are still served, they are just not counted,
+    so a client cannot inflate the view counts within its read allowance.
+    """
+    scope = 'view_count'
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {'scope': self.scope, 'ident': self.get_ident(request)}
+
+
+def should_count_view(request):
+    """
+    Returns True when an anonymous product view of ``request`` is to be recorded in the view counter.
+    """
+    return ViewCountThrottle().allow_request(request, None)
@@ -1,32 +1,195 @@
-from rest_framework import generics, permissions
-from .models import Product, Brand, CustomUser, Query
+from datetime import timedelta
+
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework import generics, permissions, status
+from rest_framework.exceptions import ValidationError
+from rest_framework.generics import get_object_or_404
+from rest_framework.parsers import MultiPartParser
+from rest_framework.renderers import BrowsableAPIRenderer
+from rest_framework.views import APIView
+from .analytics import BUCKET_SECONDS, query_series, top_products
+from .brand_counts import in_stock_products
+from .cache import product_cache
+from .changes import get_change_feed_settings, get_purge_watermark, read_changes
+from .conditional import ConditionalListMixin, ConditionalRetrieveMixin, make_etag
+from .counters import get_view_counter
+from .exporters import CONTENT_TYPES, EXPORTERS
+from .filters import parse_aware_datetime, parse_bool, parse_id_list, ProductFilterBackend, ProductOrderingFilter, \
+    ProductSearchFilter
+from .importers import FORMATS as IMPORT_FORMATS, guess_format, import_products, iter_rows
+from .inventory import apply_stock_adjustments
+from .metrics import registry as metrics_registry
+from .models import Product, Brand, CustomUser
+from .multiget import count_views, load_products
+from .pagination import ListPagination
+from .prices import price_changes, prices_as_of
 from .permissions import AdminProductPermission
-from .serializers import ProductSerializer, BrandSerializer, CustomUserSerializer
-from rest_framework.pagination import PageNumberPagination
+from .renderers import FastJSONRenderer
+from .routers import replica_reads
+from .serializers import ProductSerializer, BrandSerializer, CustomUserSerializer, PriceHistorySerializer, \
+    ProductIdsSerializer, StockAdjustmentSerializer
+from .throttling import should_count_view
 from rest_framework.response import Response
 
 
-class ListPagination(PageNumberPagination):
+class OptimizedQuerySetMixin:
     """
-    Custom pagination class for product, brand, and user lists.
+    Mixin for generic views that loads only the columns and relations the serializer renders.
+    """
+
+    def get_queryset(self):
+        """
+        Returns the view queryset optimized by the serializer's ``setup_eager_loading``.
+        """
+        return self.get_serializer_class().setup_eager_loading(super().get_queryset())
+
+
+class ReplicaReadMixin:
+    """
+    Mixin for views whose GET and HEAD requests read from a replica, see ``products.routers``.
+
+    Clients that wrote in the last ``REPLICA_ROUTING['PIN_SECONDS']`` read from the primary.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return super().dispatch(request, *args, **kwargs)
+        with replica_reads(request):
+            return super().dispatch(request, *args, **kwargs)
+
+
+class ValuesReadMixin:
+    """
+    Mixin for generic views that serves reads from ``values()`` rows and renders them with ``FastJSONRenderer``.
+
+    Lists and details are built by the serializer's ``represent_rows`` and are identical to the
+    regular serializer output; writes still go through the serializer. Reads skip object
+    permission checks, so the view's permissions must not be object-level.
+    """
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
+
+    def get_values_queryset(self):
+        """
+        Returns the filtered view queryset as ``values()`` rows holding the serializer's ``values_fields()``.
+        """
+        return self.filter_queryset(self.get_queryset()).prefetch_related(None).values(*self.get_values_fields())
+
+    def get_values_fields(self):
+        """
+        Returns the fields of the ``values()`` rows, the serializer's ``values_fields()`` by default.
+        """
+        return self.get_serializer_class().values_fields()
+
+    def represent_rows(self, rows):
+        """
+        Returns the representations of ``values()`` rows.
+        """
+        return self.get_serializer_class().represent_rows(rows)
+
+    def get_object_data(self):
+        """
+        Returns the representation of the object looked up from the URL, raising 404 if it does not exist.
+        """
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        row = get_object_or_404(self.get_values_queryset(), **{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        return self.represent_rows([row])[0]
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.get_values_queryset()
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(self.represent_rows(page))
+        return Response(self.represent_rows(queryset))
+
+    def retrieve(self, request, *args, **kwargs):
+        return Response(self.get_object_data())
 
-    page_size: int
-        Default number of items per page.
 
-    page_size_query_param: str
-        The name of the query parameter used to set the size of a page.
+class BrandStockCountMixin:
+    """
+    Mixin for the brand views adding ``in_stock_count``, the number of the brand's products
+    with ``sku > 0``, to reads requested with ``?in_stock_count=true``.
 
-    max_page_size: int
-        Maximum number of items that can be returned per page.
+    The count is a correlated subquery evaluated for the brands of the page only. Stock
+    levels change without touching the brand, so the count is part of the ETag.
     """
-    page_size = 10
-    page_size_query_param = 'page_size'
-    max_page_size = 25
 
+    def wants_in_stock_count(self):
+        value = self.request.query_params.get('in_stock_count')
+        return self.request.method in ('GET', 'HEAD') and bool(value) and parse_bool('in_stock_count', value)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if self.wants_in_stock_count():
+            self.etag_fields = (*self.etag_fields, 'in_stock_count')
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.wants_in_stock_count():
+            queryset = queryset.annotate(in_stock_count=in_stock_products())
+        return queryset
+
+    def get_values_fields(self):
+        fields = super().get_values_fields()
+        return [*fields, 'in_stock_count'] if self.wants_in_stock_count() else fields
+
+    def represent_rows(self, rows):
+        rows = list(rows)
+        representations = super().represent_rows(rows)
+        if self.wants_in_stock_count():
+            for representation, row in zip(representations, rows):
+                representation['in_stock_count'] = row['in_stock_count']
+        return representations
 
-class ProductListCreateAPIView(generics.ListCreateAPIView):
+
+class ProductMultiGetMixin:
+    """
+    Mixin for the product list answering ``?ids=3,1,2`` with ``{'results', 'missing'}``: those
+    products in the requested order and the ids that do not exist, see ``products.multiget``.
+
+    Filters and pagination do not apply to a multi-get. Its ETag covers the found products.
+    Like the product details, and unlike listing, it is open to anonymous clients.
     """
-    API endpoint that allows the creation and listing of products.
+
+    def get_permissions(self):
+        if self.request.method in permissions.SAFE_METHODS and 'ids' in self.request.query_params:
+            return [permissions.AllowAny()]
+        return super().get_permissions()
+
+    def get_requested_ids(self):
+        """
+        Returns the validated ``ids`` query parameter, or None when the request is not a multi-get.
+        """
+        value = self.request.query_params.get('ids')
+        if value is None:
+            return None
+        serializer = ProductIdsSerializer(data={'ids': parse_id_list('ids', value)})
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data['ids']
+
+    def get_current_validators(self):
+        ids = self.get_requested_ids()
+        if ids is None:
+            return super().get_current_validators()
+        rows = {row['id']: row for row in Product.objects.filter(pk__in=ids).values(*self.etag_fields)}
+        return make_etag(self.request.accepted_renderer.format, None,
+                         [self.represent(rows[pk]) for pk in ids if pk in rows]), None
+
+    def list(self, request, *args, **kwargs):
+        ids = self.get_requested_ids()
+        if ids is None:
+            return super().list(request, *args, **kwargs)
+        data = load_products(ids)
+        count_views(request, data)
+        return Response(data)
+
+
+class ProductListCreateAPIView(ReplicaReadMixin, ProductMultiGetMixin, ConditionalListMixin, ValuesReadMixin,
+                               OptimizedQuerySetMixin, generics.ListCreateAPIView):
+    """
+    API endpoint that allows the creation and listing of products, and fetching many of them by id.
 
     queryset: QuerySet
         List of all Product objects sorted by id.
@@ -39,17 +202,35 @@ class ProductListCreateAPIView(generics.ListCreateAPIView):
 
     pagination_class: Pagination
         Class used to paginate the results.
+
+    filter_backends: list
+        Filters by brand, price, stock and update time, full-text search and ordering.
+
+    ordering_fields: list
+        Fields the results can be ordered by with the ``ordering`` query parameter.
+
+    etag_fields: tuple
+        Fields hashed into the ETag of a page, answering ``If-None-Match`` without serializing it.
     """
     queryset = Product.objects.all().order_by('id')
     serializer_class = ProductSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly, AdminProductPermission]
     pagination_class = ListPagination
+    filter_backends = [ProductFilterBackend, ProductSearchFilter, ProductOrderingFilter]
+    ordering_fields = ['id', 'name', 'price', 'sku', 'created_at', 'updated_at']
+    ordering = ['id']
+    etag_fields = ('id', 'updated_at')
 
 
-class ProductRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAPIView):
+class ProductRetrieveUpdateDestroyAPIView(ReplicaReadMixin, ConditionalRetrieveMixin, ValuesReadMixin,
+                                          OptimizedQuerySetMixin, generics.RetrieveUpdateDestroyAPIView):
     """
     API endpoint that allows the retrieval, updating, and deletion of a specific product.
 
+    Responses carry an ETag and ``Last-Modified`` derived from ``updated_at``. ``If-None-Match``
+    and ``If-Modified-Since`` are answered with 304 before the product is loaded, and ``If-Match``
+    makes PUT, PATCH and DELETE fail with 412 when the product changed in the meantime.
+
     queryset: QuerySet
         List of all Product objects.
 
@@ -58,34 +239,205 @@ class ProductRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAPIView)
 
     permission_classes: list
         List of permission classes that authenticate and authorize access to this view.
+
+    etag_fields: tuple
+        Fields hashed into the ETag.
+
+    last_modified_field: str
+        Field sent as ``Last-Modified``.
     """
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    etag_fields = ('id', 'updated_at')
+    last_modified_field = 'updated_at'
 
     def retrieve(self, request, *args, **kwargs):
         """
         Retrieves the details of a specific product.
 
-        If the user is not authenticated, creates or retrieves a Query object for this product and increments the number of queries.
+        The serialized payload is served from the product cache and only built from the database on a miss.
+        If the user is not authenticated, records a view for this product in the view counter, which
+        flushes the buffered counts to the Query table in batches. Views over the client's
+        ``view_count`` rate are served but not counted.
+        """
+        pk = self.kwargs[self.lookup_url_kwarg or self.lookup_field]
+        payload = product_cache.get_or_set(pk, self.get_object_data)
+
+        # check if the user is authenticated before counting the view
+        if not self.request.user.is_authenticated and should_count_view(request):
+            get_view_counter().increment(pk)
+
+        return Response(payload)
+
+
+class ProductBatchAPIView(APIView):
+    """
+    API endpoint returning many products by id, for id lists too long for ``?ids=``.
+
+    Expects ``{"ids": [<id>, ...]}`` (up to 200) and responds like ``GET /api/v1/products/?ids=``.
+    The POST only reads, so it is throttled as a read and served from a replica.
+
+    permission_classes: list
+        List of permission classes that authenticate and authorize access to this view.
+
+    post_is_read: bool
+        Throttles the POST with the read scopes.
+    """
+    permission_classes = [permissions.AllowAny]
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
+    post_is_read = True
+
+    def post(self, request, *args, **kwargs):
+        """
+        Returns the requested products in order and the ids that do not exist.
+        """
+        serializer = ProductIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        with replica_reads(request):
+            data = load_products(serializer.validated_data['ids'])
+        count_views(request, data)
+        return Response(data)
+
+
+class ProductStockAdjustAPIView(APIView):
+    """
+    API endpoint that applies many stock deltas to products in one transaction.
+
+    Expects ``{"lines": [{"product": <id>, "delta": <int>}, ...]}`` and responds with the number
+    of applied lines and the lines that failed, identified by their index in the request.
+
+    permission_classes: list
+        List of permission classes that authenticate and authorize access to this view.
+    """
+    permission_classes = [permissions.IsAuthenticated, AdminProductPermission]
+
+    def post(self, request, *args, **kwargs):
+        """
+        Applies the stock adjustments in the request body.
+        """
+        serializer = StockAdjustmentSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        lines = [(line['product'], line['delta']) for line in serializer.validated_data['lines']]
+        applied, failed = apply_stock_adjustments(lines)
+        return Response({'applied': applied, 'failed': failed})
+
+
+class ProductImportAPIView(APIView):
+    """
+    API endpoint that creates or overwrites products from an uploaded CSV or JSON Lines file.
+
+    The file is sent as the ``file`` field of a multipart form. Its format is taken from the
+    ``file_format`` field (``csv`` or ``jsonl``) or guessed from the file name.
+
+    permission_classes: list
+        List of permission classes that authenticate and authorize access to this view.
+
+    parser_classes: list
+        List of parser classes used to read the request body.
+    """
+    permission_classes = [permissions.IsAuthenticated, AdminProductPermission]
+    parser_classes = [MultiPartParser]
+
+    def post(self, request, *args, **kwargs):
+        """
+        Streams the uploaded file through the bulk importer and returns its summary.
+        """
+        upload = request.FILES.get('file')
+        if upload is None:
+            raise ValidationError({'file': ['No file was submitted.']})
+        file_format = request.data.get('file_format') or guess_format(upload.name)
+        if file_format not in IMPORT_FORMATS:
+            raise ValidationError({'file_format': [f'Must be one of: {", ".join(IMPORT_FORMATS)}.']})
+        result = import_products(iter_rows(upload.file, file_format))
+        return Response(result.as_dict(), status=status.HTTP_200_OK)
+
+
+class ProductExportAPIView(APIView):
+    """
+    API endpoint that streams the whole catalog as JSON Lines or CSV.
+
+    ``file_format`` selects ``jsonl`` (default) or ``csv``. ``updated_since`` (ISO 8601) limits the
+    export to products changed since then; the ``X-Export-Started-At`` response header holds the
+    value to use for the next incremental pull.
+
+    permission_classes: list
+        List of permission classes that authenticate and authorize access to this view.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        """
+        Streams the products matching the query parameters.
         """
-        instance = self.get_object()
+        started_at = timezone.now()
+        file_format = request.query_params.get('file_format', 'jsonl')
+        if file_format not in EXPORTERS:
+            raise ValidationError({'file_format': [f'Must be one of: {", ".join(EXPORTERS)}.']})
+
+        queryset = Product.objects.all()
+        updated_since = request.query_params.get('updated_since')
+        if updated_since:
+            since = parse_datetime(updated_since)
+            if since is None:
+                raise ValidationError({'updated_since': ['Must be an ISO 8601 datetime.']})
+            if timezone.is_naive(since):
+                since = timezone.make_aware(since)
+            queryset = queryset.filter(updated_at__gte=since)
+
+        response = StreamingHttpResponse(EXPORTERS[file_format](queryset), content_type=CONTENT_TYPES[file_format])
+        response['Content-Disposition'] = f'attachment; filename="products.{file_format}"'
+        response['X-Export-Started-At'] = started_at.isoformat()
+        return response
+
+
+def parse_keyset(params, default_limit, max_limit):
+    """
+    Returns the ``after`` position and the ``limit`` of a keyset-paginated endpoint.
 
-        # check if the user is authenticated before creating/querying for a Query object
-        if not self.request.user.is_authenticated:
+    ``limit`` is capped at ``max_limit``; 0 or no limit means ``default_limit``.
+    """
+    values = {}
+    for name, default in (('after', 0), ('limit', default_limit)):
+        value = params.get(name, str(default))
+        if not value.isdigit():
+            raise ValidationError({name: ['Must be a non-negative integer.']})
+        values[name] = int(value)
+    return values['after'], min(values['limit'], max_limit) or default_limit
 
-            # Get or create the Query object for this product
-            query, created = Query.objects.get_or_create(product=instance)
 
-            # Increment the number of queries for this product
-            query.count += 1
-            query.save()
+class ChangeFeedAPIView(APIView):
+    """
+    API endpoint that lists the product and brand changes following a sequence number, for mirrors.
 
-        serializer = self.get_serializer(instance)
-        return Response(serializer.data)
+    ``after`` is the ``next`` value of the previous response, 0 for a full sync into an empty
+    mirror, and ``limit`` caps the number of changes examined. Upserts carry the current
+    representation of the object and deletes none. Mirrors that synced before the tombstones
+    purged by ``compact_changes`` get a 410 and must sync again from 0.
 
+    permission_classes: list
+        List of permission classes that authenticate and authorize access to this view.
+    """
+    permission_classes = [permissions.IsAuthenticated]
 
-class BrandRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAPIView):
+    def get(self, request, *args, **kwargs):
+        """
+        Returns a batch of changes as ``{'changes': [...], 'next': seq, 'has_more': bool}``.
+        """
+        config = get_change_feed_settings()
+        after, limit = parse_keyset(request.query_params, config['BATCH_SIZE'], config['MAX_BATCH_SIZE'])
+
+        watermark = get_purge_watermark()
+        if 0 < after < watermark:
+            return Response({
+                'detail': 'Deletes after this sequence number were purged; sync again from 0.',
+                'purged_until': watermark,
+            }, status=status.HTTP_410_GONE)
+        return Response(read_changes(after, limit))
+
+
+class BrandRetrieveUpdateDestroyAPIView(ReplicaReadMixin, BrandStockCountMixin, ConditionalRetrieveMixin,
+                                        ValuesReadMixin, OptimizedQuerySetMixin, generics.RetrieveUpdateDestroyAPIView):
     """
         API endpoint that allows the retrieval, updating, and deletion of a specific brand.
 
@@ -97,13 +449,19 @@ class BrandRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAPIView):
 
         permission_classes: list
             List of permission classes that authenticate and authorize access to this view.
+
+        etag_fields: tuple
+            Fields hashed into the ETag; brands have no update timestamp, so all of them.
+            ``in_stock_count`` is added when requested.
         """
     queryset = Brand.objects.all()
     serializer_class = BrandSerializer
     permission_classes = [permissions.IsAdminUser]
+    etag_fields = ('id', 'name', 'product_count')
 
 
-class BrandListCreateAPIView(generics.ListCreateAPIView):
+class BrandListCreateAPIView(ReplicaReadMixin, BrandStockCountMixin, ConditionalListMixin, ValuesReadMixin,
+                             OptimizedQuerySetMixin, generics.ListCreateAPIView):
     """
     API endpoint that allows the creation and listing of brands.
 
@@ -118,14 +476,18 @@ class BrandListCreateAPIView(generics.ListCreateAPIView):
 
     pagination_class: Pagination
         Class used to paginate the results.
+
+    etag_fields: tuple
+        Fields hashed into the ETag of a page; ``in_stock_count`` is added when requested.
     """
     queryset = Brand.objects.all().order_by('id')
     serializer_class = BrandSerializer
     permission_classes = [permissions.IsAdminUser]
     pagination_class = ListPagination
+    etag_fields = ('id', 'name', 'product_count')
 
 
-class CustomUserListCreateAPIView(generics.ListCreateAPIView):
+class CustomUserListCreateAPIView(OptimizedQuerySetMixin, generics.ListCreateAPIView):
     """
     API endpoint that allows the creation and listing of users.
     """
@@ -135,10 +497,227 @@ class CustomUserListCreateAPIView(generics.ListCreateAPIView):
     pagination_class = ListPagination
 
 
-class CustomUserRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAPIView):
+class CustomUserRetrieveUpdateDestroyAPIView(OptimizedQuerySetMixin, generics.RetrieveUpdateDestroyAPIView):
     """
     API endpoint that allows the retrieval, updating, and deletion of a specific user.
     """
     queryset = CustomUser.objects.all()
     serializer_class = CustomUserSerializer
     permission_classes = [permissions.IsAdminUser]
+
+
+class ProductCacheStatsAPIView(APIView):
+    """
+    API endpoint that exposes the hit, miss and invalidation counters of the product cache.
+
+    permission_classes: list
+        List of permission classes that authenticate and authorize access to this view.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        """
+        Returns the product cache counters of the process serving the request.
+        """
+        return Response(product_cache.stats())
+
+
+class MetricsAPIView(APIView):
+    """
+    API endpoint that exposes the request metrics of the serving process in the Prometheus text format.
+
+    permission_classes: list
+        List of permission classes that authenticate and authorize access to this view.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        """
+        Returns the per-route latency, query and serialization histograms and the response counters.
+        """
+        return HttpResponse(metrics_registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+class QueryReportMixin:
+    """
+    Parses the time window shared by the query analytics and price history reports.
+
+    ``until`` (ISO 8601, default now) ends the window and ``since`` starts it; without
+    ``since`` the window is ``default_period`` long.
+    """
+    default_period = timedelta(days=1)
+
+    def get_window(self, request, default_period=None):
+        params = request.query_params
+        until = parse_aware_datetime('until', params['until']) if params.get('until') else timezone.now()
+        if params.get('since'):
+            since = parse_aware_datetime('since', params['since'])
+        else:
+            since = until - (default_period or self.default_period)
+        if since >= until:
+            raise ValidationError({'since': ['Must be before until.']})
+        return since, until
+
+
+class QueryTopProductsAPIView(QueryReportMixin, APIView):
+    """
+    API endpoint that lists the products most queried by anonymous users in a time window.
+
+    The window is given by ``since``/``until`` or by ``period`` (``hour``, ``day``, ``week`` or
+    ``month``, ending now). Counts are summed from the precomputed day, hour and minute buckets.
+
+    permission_classes: list
+        List of permission classes that authenticate and authorize access to this view.
+
+    periods: dict
+        Length of the windows selectable with the ``period`` query parameter.
+
+    max_limit: int
+        Maximum number of products returned.
+    """
+    permission_classes = [permissions.IsAdminUser]
+    periods = {
+        'hour': timedelta(hours=1),
+        'day': timedelta(days=1),
+        'week': timedelta(days=7),
+        'month': timedelta(days=30),
+    }
+    max_limit = 100
+
+    def get(self, request, *args, **kwargs):
+        """
+        Returns the top products of the requested window with their names and query counts.
+        """
+        period = request.query_params.get('period', 'day')
+        if period not in self.periods:
+            raise ValidationError({'period': [f'Must be one of: {", ".join(self.periods)}.']})
+        try:
+            limit = min(int(request.query_params.get('limit', 10)), self.max_limit)
+        except ValueError:
+            raise ValidationError({'limit': ['A valid integer is required.']})
+        since, until = self.get_window(request, self.periods[period])
+        top = top_products(since, until, limit=max(limit, 1))
+        names = dict(Product.objects.filter(pk__in=[row['product'] for row in top]).values_list('pk', 'name'))
+        return Response({
+            'since': since.isoformat(),
+            'until': until.isoformat(),
+            'results': [
+                {'product': row['product'], 'name': names.get(row['product']), 'count': row['total']} for row in top
+            ],
+        })
+
+
+class QuerySeriesAPIView(QueryReportMixin, APIView):
+    """
+    API endpoint that returns the anonymous queries per minute, hour or day in a time window.
+
+    ``resolution`` selects the bucket size (``hour`` by default) and ``product`` restricts the
+    series to one product; without it the queries of all products are added up.
+
+    permission_classes: list
+        List of permission classes that authenticate and authorize access to this view.
+
+    max_points: int
+        Maximum number of buckets a series may span.
+    """
+    permission_classes = [permissions.IsAdminUser]
+    max_points = 1500
+
+    def get(self, request, *args, **kwargs):
+        """
+        Returns one point per bucket of the requested window, zeros included.
+        """
+        resolution = request.query_params.get('resolution', 'hour')
+        if resolution not in BUCKET_SECONDS:
+            raise ValidationError({'resolution': [f'Must be one of: {", ".join(BUCKET_SECONDS)}.']})
+        product_id = request.query_params.get('product')
+        if product_id is not None and not product_id.isdigit():
+            raise ValidationError({'product': ['A valid integer is required.']})
+        since, until = self.get_window(request, timedelta(seconds=BUCKET_SECONDS[resolution] * 24))
+        if (until - since).total_seconds() / BUCKET_SECONDS[resolution] > self.max_points:
+            raise ValidationError({'since': [f'The window spans more than {self.max_points} buckets.']})
+        points = query_series(since, until, resolution, product_id=int(product_id) if product_id else None)
+        return Response({
+            'product': int(product_id) if product_id else None,
+            'resolution': resolution,
+            'results': [{'start': start.isoformat(), 'count': count} for start, count in points],
+        })
+
+
+class PriceAsOfAPIView(APIView):
+    """
+    API endpoint that returns the prices products had at a point in time.
+
+    ``at`` (ISO 8601, default now) is the point in time. ``ids`` selects up to 200 products;
+    otherwise the catalog is listed by product id, ``limit`` products after the id ``after``.
+    Products whose history starts later get a null price.
+
+    permission_classes: list
+        List of permission classes that authenticate and authorize access to this view.
+
+    max_limit: int
+        Maximum number of products listed at once.
+    """
+    permission_classes = [permissions.IsAdminUser]
+    max_limit = 1000
+
+    def get(self, request, *args, **kwargs):
+        """
+        Returns ``{'at', 'results'}``, plus ``next`` and ``has_more`` when listing the catalog.
+        """
+        params = request.query_params
+        at = parse_aware_datetime('at', params['at']) if params.get('at') else timezone.now()
+        if 'ids' in params:
+            serializer = ProductIdsSerializer(data={'ids': parse_id_list('ids', params['ids'])})
+            serializer.is_valid(raise_exception=True)
+            ids = serializer.validated_data['ids']
+            found = {row['product']: row for row in prices_as_of(at, Product.objects.filter(pk__in=ids))}
+            results = [found.get(pk) or {'id': None, 'product': pk, 'price': None, 'changed_at': None} for pk in ids]
+            return Response({'at': at.isoformat(), 'results': results})
+
+        after, limit = parse_keyset(params, 100, self.max_limit)
+        results = prices_as_of(at, Product.objects.filter(pk__gt=after).order_by('pk'), limit + 1)
+        return Response({
+            'at': at.isoformat(),
+            'results': results[:limit],
+            'next': results[:limit][-1]['product'] if results else after,
+            'has_more': len(results) > limit,
+        })
+
+
+class PriceChangesAPIView(QueryReportMixin, APIView):
+    """
+    API endpoint that lists the price changes recorded in a time window, in the order they were recorded.
+
+    The window is given by ``since``/``until`` (one day ending now by default) and ``product``
+    restricts it to one product. Changes are returned ``limit`` at a time after the history
+    id ``after``.
+
+    permission_classes: list
+        List of permission classes that authenticate and authorize access to this view.
+
+    max_limit: int
+        Maximum number of changes returned at once.
+    """
+    permission_classes = [permissions.IsAdminUser]
+    max_limit = 1000
+
+    def get(self, request, *args, **kwargs):
+        """
+        Returns ``{'since', 'until', 'results', 'next', 'has_more'}``.
+        """
+        since, until = self.get_window(request)
+        product_id = request.query_params.get('product')
+        if product_id is not None and not product_id.isdigit():
+            raise ValidationError({'product': ['A valid integer is required.']})
+        after, limit = parse_keyset(request.query_params, 100, self.max_limit)
+        changes = price_changes(since, until, int(product_id) if product_id else None)
+        rows = list(changes.filter(pk__gt=after)[:limit + 1])
+        results = PriceHistorySerializer.represent_rows(rows[:limit])
+        return Response({
+            'since': since.isoformat(),
+            'until': until.isoformat(),
+            'results': results,
+            'next': results[-1]['id'] if results else after,
+            'has_more': len(rows) > limit,
+        })